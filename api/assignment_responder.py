@@ -4,35 +4,48 @@
 
 from datetime import datetime, timedelta
 from importlib import import_module, reload
+import atexit
+import base64
 import inspect
 import json
-from multiprocessing import Process
 import os
 import platform
 import re
 import sys
+import zlib
 from time import mktime, time, sleep, strptime
+from urllib.parse import urlencode
 import elasticsearch
 from flask import (Flask, g, make_response, redirect, render_template, request,
-                   send_file, jsonify, Response)
-from flask.json import JSONEncoder
+                   send_file, jsonify, Response, stream_with_context)
 from flask_cors import CORS
 from flask_swagger import swagger
 import jwt
-from kafka import KafkaProducer
-from kafka.errors import KafkaError
 import pymysql.cursors
 import pymysql.err
 import requests
 
 import assignment_utilities
+from assignment_stats import refresh_assignment_stats
+import cv_term_cache
+import exports
+import response_shaping
+import serializers
+import task_keys
 from assignment_utilities import (InvalidUsage, call_responder, check_permission, check_project,
                                   generate_sql, get_assignment_by_name_or_id,
                                   get_project_by_name_or_id, get_task_by_id,
                                   get_tasks_by_assignment_id, get_user_by_name, get_workday,
+                                  invalidate_permissions, load_task_properties,
                                   neuprint_custom_query, random_string, return_tasks_json,
-                                  sql_error, update_property,
-                                  validate_user, working_duration)
+                                  sql_error, update_property, validate_user, working_duration)
+from cv_term_cache import get_key_type_id, get_protocols, valid_cv_term
+from db_pool import ConnectionPool, PoolExhausted
+from jobs import (JobQueue, end_stream_job, get_job, record_stream_progress, retry_job,
+                  start_stream_job, submit_job)
+from kafka_publisher import KafkaPublisher
+from serializers import CustomJSONEncoder
+from task_counts import move_tasks
 
 # pylint: disable=W0611
 from cell_type_validation import Cell_type_validation
@@ -41,11 +54,23 @@ from orphan_link import Orphan_link
 from cleave import Cleave
 from todo import Todo
 from focused_merge import Focused_merge
-from tasks import create_tasks_from_json, generate_tasks
+from neuprint_query import count_neurons, neuron_cypher, neuron_query, stream_tasks
+from tasks import create_tasks_from_json, generate_task_batches, generate_tasks
 
 # SQL statements
 READ = {
     'ASSIGNMENT': "SELECT * FROM assignment_vw WHERE id=%s",
+    'ASSIGNMENT_KEYS': "SELECT a.id,%s AS sort_key FROM assignment a JOIN project p ON "
+                       + "(p.id=a.project_id) JOIN user u ON (u.name=a.user) LEFT OUTER JOIN "
+                       + "cv_term pp ON (pp.id=p.protocol_id) JOIN assignment_stats s ON "
+                       + "(s.assignment_id=a.id AND s.tasks>0) WHERE 1=1%s ORDER BY sort_key %s,"
+                       + "a.id %s LIMIT %%s",
+    'ASSIGNMENT_PAGE': "SELECT a.id,a.user,CONCAT(u.last,', ',u.first) AS proofreader,"
+                       + "p.name AS project,pp.name AS protocol,a.name AS assignment,"
+                       + "a.create_date,a.start_date,a.completion_date,s.task_disposition,s.tasks "
+                       + "FROM assignment a JOIN project p ON (p.id=a.project_id) JOIN user u ON "
+                       + "(u.name=a.user) LEFT OUTER JOIN cv_term pp ON (pp.id=p.protocol_id) "
+                       + "JOIN assignment_stats s ON (s.assignment_id=a.id) WHERE a.id IN (%s)",
     'ASSIGNMENTN': "SELECT a.*,CONCAT(first,' ',last) AS user2 FROM assignment_vw a "
                    + "JOIN user u ON (u.name=a.user) WHERE a.name=%s",
     'CVREL': "SELECT subject,relationship,object FROM cv_relationship_vw "
@@ -68,24 +93,48 @@ READ = {
                             + "AND start_date IS NULL ORDER BY project,create_date",
     'ELIGIBLE_TODO': "SELECT * FROM todo_task_vw WHERE start_date IS NULL ORDER BY "
                      + "FIELD(priority,'high','medium','low'),todo_type",
+    'JOBS': "SELECT id,job_type,status,total,progress,rows_inserted,attempts,max_attempts,"
+            + "error,result,user,worker,create_date,start_date,heartbeat_date,completion_date "
+            + "FROM job",
     'GET_ASSOCIATION': "SELECT object FROM cv_term_relationship_vw WHERE "
                        + "subject=%s AND relationship='associated_with'",
-    'PROJECTA': "SELECT t.user,CONCAT(first,' ',last) AS proofreader,assignment,t.disposition,"
-                + "COUNT(1) AS num,a.start_date,a.completion_date,a.duration,"
-                + "TIMEDIFF(NOW(),a.start_date) AS elapsed FROM task_vw t "
-                + "JOIN user u ON (u.name=t.user) JOIN assignment_vw a ON (t.assignment_id=a.id) "
-                + "WHERE t.project='%s' AND assignment_id IS NOT NULL GROUP BY 1,2,3,4,6,7,8,9",
-    'PROJECTUA': "SELECT COUNT(1) AS num FROM task_vw WHERE project='%s' AND assignment_id IS NULL",
+    'PROJECTA': "SELECT a.user,CONCAT(first,' ',last) AS proofreader,a.name AS assignment,"
+                + "NULLIF(s.task_disposition,'NULL') AS disposition,s.tasks AS num,a.start_date,"
+                + "a.completion_date,SEC_TO_TIME(a.duration) AS duration,"
+                + "TIMEDIFF(NOW(),a.start_date) AS elapsed FROM assignment a "
+                + "JOIN project p ON (p.id=a.project_id) JOIN user u ON (u.name=a.user) "
+                + "JOIN assignment_stats s ON (s.assignment_id=a.id AND s.tasks>0) "
+                + "WHERE p.name=%s",
+    'PROJECTUA': "SELECT CAST(IFNULL(SUM(num),0) AS SIGNED) AS num FROM project_task_count ptc "
+                 + "JOIN project p ON (p.id=ptc.project_id) WHERE p.name=%s AND assigned=0",
+    'PROJECT_DISPOSITIONS': "SELECT disposition,CAST(SUM(num) AS SIGNED) AS c FROM "
+                            + "project_task_count WHERE project_id=%s AND assigned=1 "
+                            + "GROUP BY 1 HAVING c>0",
+    'PROJECT_INCOMPLETE': "SELECT CAST(IFNULL(SUM(IF(completed=0,num,0)),0) AS SIGNED) AS c,"
+                          + "COUNT(1) AS counters FROM project_task_count ptc "
+                          + "JOIN project p ON (p.id=ptc.project_id) WHERE p.name=%s",
+    'PROJECT_INCOMPLETE_TASKS': "SELECT COUNT(1) AS c FROM task t JOIN project p ON "
+                                + "(p.id=t.project_id) WHERE p.name=%s AND "
+                                + "t.completion_date IS NULL",
     'PSUMMARY': "SELECT t.protocol,p.project_group,t.project,p.active,COUNT(1) AS num,"
                 + "p.disposition AS disposition,t.priority,p.create_date FROM task_vw t "
                 + "JOIN project_vw p ON (p.id=t.project_id) "
                 + "GROUP BY t.project,p.project_group,t.protocol "
                 + "ORDER BY t.priority,t.protocol,p.create_date,p.project_group,t.project",
-    'DVID_PROJECT_TASKS': "SELECT t.id,tp1.value AS result,tp2.value AS user FROM "
-                          + "task_property_vw tp1 JOIN task_vw t ON (t.id=tp1.task_id "
-                          + "AND tp1.type='dvid_result') JOIN task_property_vw tp2 "
-                          + "ON (t.id=tp2.task_id AND tp2.type='dvid_user') "
-                          + "WHERE project=%s ORDER BY 1",
+    'DVID_ASSIGNMENT_TASKS': "SELECT t.id,tp1.value AS result,tp2.value AS user FROM task t "
+                             + "JOIN assignment a ON (a.id=t.assignment_id) "
+                             + "JOIN task_property tp1 ON (tp1.task_id=t.id) JOIN cv_term c1 ON "
+                             + "(c1.id=tp1.type_id AND c1.name='dvid_result') "
+                             + "JOIN task_property tp2 ON (tp2.task_id=t.id) JOIN cv_term c2 ON "
+                             + "(c2.id=tp2.type_id AND c2.name='dvid_user') "
+                             + "WHERE a.name=%s ORDER BY t.id",
+    'DVID_PROJECT_TASKS': "SELECT t.id,tp1.value AS result,tp2.value AS user FROM task t "
+                          + "JOIN project p ON (p.id=t.project_id) "
+                          + "JOIN task_property tp1 ON (tp1.task_id=t.id) JOIN cv_term c1 ON "
+                          + "(c1.id=tp1.type_id AND c1.name='dvid_result') "
+                          + "JOIN task_property tp2 ON (tp2.task_id=t.id) JOIN cv_term c2 ON "
+                          + "(c2.id=tp2.type_id AND c2.name='dvid_user') "
+                          + "WHERE p.name=%s ORDER BY t.id",
     'TASK': "SELECT * FROM task_vw WHERE id=%s",
     'TASKS': "SELECT id,project,assignment,protocol,priority,start_date,completion_date,"
              + "disposition,SEC_TO_TIME(duration) AS duration FROM task_vw WHERE user=%s "
@@ -95,59 +144,47 @@ READ = {
                  + "disposition,SEC_TO_TIME(duration) AS duration FROM task_vw WHERE "
                  + "disposition=%s AND assignment IS NOT NULL "
                  + "ORDER BY start_date,priority,protocol,project,assignment,id",
-    'TASK_EXISTS': "SELECT * FROM task_vw WHERE project_id=%s AND key_type=%s AND key_text=%s",
-    'UNASSIGNED_TASKS': "SELECT id,name,key_type_id,key_text FROM task WHERE project_id=%s AND "
-                        + "assignment_id IS NULL ORDER BY id",
+    'UNASSIGNED_TASKS': "SELECT id,name,project_id,assignment_id,key_type_id,key_text,"
+                        + "disposition,completion_date FROM task WHERE project_id=%s AND "
+                        + "assignment_id IS NULL ORDER BY id LIMIT %s FOR UPDATE",
     'UPSUMMARY': "SELECT t.protocol,p.project_group,t.project,p.active,COUNT(1) AS num,t.priority "
                  + "FROM task_vw t JOIN project_vw p ON (p.id=t.project_id) WHERE "
                  + "assignment_id IS NULL GROUP BY t.project,p.project_group,t.protocol,t.priority "
                  + "ORDER BY t.priority,t.protocol,p.project_group,t.project",
 }
 WRITE = {
-    'ASSIGN_TASK': "UPDATE task SET assignment_id=%s,user=%s WHERE assignment_id IS NULL AND id=%s",
+    'ASSIGN_TASKS': "UPDATE task SET assignment_id=%%s,user=%%s WHERE assignment_id IS NULL "
+                    + "AND id IN (%s)",
     'COMPLETE_TASK': "UPDATE task SET completion_date=FROM_UNIXTIME(%s),disposition=%s,"
                      + "duration=%s,working_duration=%s WHERE id=%s AND completion_date IS NULL",
     'INSERT_ASSIGNMENT': "INSERT INTO assignment (name,project_id,user) VALUES(%s,"
                          + "%s,%s)",
-    'INSERT_PROJECT': "INSERT INTO project (name,protocol_id,priority) VALUES(%s,"
-                      + "getCvTermId('protocol',%s,NULL),%s)",
+    'INSERT_PROJECT': "INSERT INTO project (name,protocol_id,priority) VALUES(%s,%s,%s)",
     'INSERT_CV': "INSERT INTO cv (name,definition,display_name,version,"
                  + "is_current) VALUES (%s,%s,%s,%s,%s)",
     'INSERT_CVTERM': "INSERT INTO cv_term (cv_id,name,definition,display_name"
                      + ",is_current,data_type) VALUES (getCvId(%s,''),%s,%s,"
                      + "%s,%s,%s)",
+    'INSERT_OUTBOX': "INSERT INTO outbox (topic,message) VALUES (%s,%s)",
     'INSERT_USER': "INSERT INTO user (name,first,last,janelia_id,email,organization) "
                    + "VALUES (%s,%s,%s,%s,%s,%s)",
     'START_TASK': "UPDATE task SET start_date=NOW(),disposition=%s,user=%s WHERE id=%s "
                   + "AND start_date IS NULL",
     'TASK_AUDIT': "INSERT INTO task_audit (task_id,project_id,assignment_id,key_type_id,key_text,"
-                  + "disposition,note,user) VALUES (%s,%s,%s,getCvTermId('key',%s,NULL),"
-                  + "%s,%s,%s,%s)",
+                  + "disposition,note,user) VALUES (%s,%s,%s,%s,%s,%s,%s,%s)",
 }
+# Sort keys for the assignment list (strings, so they can be used in a cursor)
+ASSIGNMENT_SORT = {'proofreader': "CONCAT(u.last,', ',u.first)",
+                   'project': "p.name",
+                   'protocol': "IFNULL(pp.name,'')",
+                   'assignment': "a.name",
+                   'create_date': "CAST(a.create_date AS CHAR)",
+                   'start_date': "IFNULL(CAST(a.start_date AS CHAR),'')",
+                   'completion_date': "IFNULL(CAST(a.completion_date AS CHAR),'')"}
 
 
 # pylint: disable=C0302,C0103,W0703
 
-class CustomJSONEncoder(JSONEncoder):
-    ''' Define a custom JSON encoder
-    '''
-    def default(self, obj):   # pylint: disable=E0202, W0221
-        try:
-            if isinstance(obj, datetime):
-                return obj.strftime('%a, %-d %b %Y %H:%M:%S')
-            if isinstance(obj, timedelta):
-                seconds = obj.total_seconds()
-                hours = seconds // 3600
-                minutes = (seconds % 3600) // 60
-                seconds = seconds % 60
-                return "%02d:%02d:%.2f" % (hours, minutes, seconds)
-            iterable = iter(obj)
-        except TypeError:
-            pass
-        else:
-            return list(iterable)
-        return JSONEncoder.default(self, obj)
-
 __version__ = '0.20.2'
 app = Flask(__name__, template_folder='templates')
 app.json_encoder = CustomJSONEncoder
@@ -156,13 +193,11 @@ app.config.from_pyfile("config.cfg")
 app.config['JSON_SORT_KEYS'] = False
 SERVER = dict()
 CORS(app, supports_credentials=True)
+POOL = ConnectionPool(app.config, size=app.config['MYSQL_POOL_SIZE'],
+                      timeout=app.config['MYSQL_POOL_TIMEOUT'],
+                      check_seconds=app.config['MYSQL_POOL_CHECK_SECONDS'])
 try:
-    CONN = pymysql.connect(host=app.config['MYSQL_DATABASE_HOST'],
-                           user=app.config['MYSQL_DATABASE_USER'],
-                           password=app.config['MYSQL_DATABASE_PASSWORD'],
-                           db=app.config['MYSQL_DATABASE_DB'],
-                           cursorclass=pymysql.cursors.DictCursor)
-    CURSOR = CONN.cursor()
+    POOL.checkin(POOL.checkout())
 except Exception as err:
     ttemplate = "An exception of type {0} occurred. Arguments:\n{1!r}"
     tmessage = ttemplate.format(type(err).__name__, err.args)
@@ -172,7 +207,7 @@ app.config['STARTTIME'] = time()
 app.config['STARTDT'] = datetime.now()
 app.config['LAST_TRANSACTION'] = time()
 IDCOLUMN = 0
-START_TIME = ESEARCH = PRODUCER = ''
+START_TIME = ESEARCH = PUBLISHER = ''
 
 
 # *****************************************************************************
@@ -186,9 +221,14 @@ def before_request():
         If needed, initilize global variables.
     '''
     # pylint: disable=W0603
-    global START_TIME, ESEARCH, SERVER, PRODUCER
-    g.db = CONN
-    g.c = CURSOR
+    global START_TIME, ESEARCH, SERVER, PUBLISHER
+    try:
+        g.db = POOL.checkout()
+    except PoolExhausted as err:
+        raise InvalidUsage(str(err), 503)
+    except Exception as err:
+        raise InvalidUsage(sql_error(err), 500)
+    g.c = g.db.cursor()
     if not SERVER:
         try:
             data = call_responder('config', 'config/rest_services')
@@ -205,18 +245,22 @@ def before_request():
             temp = "{2}: An exception of type {0} occurred. Arguments:\n{1!r}"
             mess = temp.format(type(err).__name__, err.args, inspect.stack()[0][3])
             raise InvalidUsage(mess, 500)
-        PRODUCER = KafkaProducer(bootstrap_servers=SERVER['Kafka']['broker_list'])
+        PUBLISHER = KafkaPublisher(SERVER['Kafka']['broker_list'],
+                                   queue_size=app.config['KAFKA_QUEUE_SIZE'],
+                                   linger_ms=app.config['KAFKA_LINGER_MS'],
+                                   batch_size=app.config['KAFKA_BATCH_SIZE'],
+                                   spill_dir=app.config['KAFKA_SPILL_DIR'])
+        atexit.register(PUBLISHER.close)
+        if app.config['JOB_WORKERS']:
+            JOBS.start()
         assignment_utilities.BEARER = assignment_utilities.CONFIG['neuprint']['bearer']
-        try:
-            g.c.execute("SELECT cv_term,display_name FROM cv_term_vw WHERE "
-                        + "cv='protocol' ORDER BY 2")
-            rows = g.c.fetchall()
-        except Exception as err: # pragma: no cover
-            temp = "{2}: An exception of type {0} occurred. Arguments:\n{1!r}"
-            mess = temp.format(type(err).__name__, err.args, inspect.stack()[0][3])
-            raise InvalidUsage(mess, 500)
-        for row in rows:
-            app.config['PROTOCOLS'][row['cv_term']] = row['display_name']
+        cv_term_cache.TTL = app.config['CV_CACHE_TTL']
+        exports.EXPORT_DIR = app.config['EXPORT_DIR']
+        exports.MAX_BYTES = app.config['EXPORT_CACHE_MB'] * 1024 * 1024
+        exports.TTL = app.config['EXPORT_TTL']
+        response_shaping.DEFAULT_LEVEL = app.config['RESPONSE_VERBOSITY']
+        response_shaping.ECHO_BYTES = app.config['RESPONSE_ECHO_BYTES']
+        assignment_utilities.PERMISSION_TTL = app.config['PERMISSION_CACHE_TTL']
     START_TIME = time()
     app.config['COUNTER'] += 1
     endpoint = request.endpoint if request.endpoint else '(Unknown)'
@@ -227,6 +271,55 @@ def before_request():
     return None
 
 
+@app.teardown_request
+def teardown_request(_):
+    ''' Return this request's database connection to the pool
+    '''
+    conn = g.pop('db', None)
+    if conn is None:
+        return
+    cursor = g.pop('c', None)
+    if cursor:
+        cursor.close()
+    POOL.checkin(conn)
+
+
+# *****************************************************************************
+# * Background jobs                                                           *
+# *****************************************************************************
+def create_tasks_job(payload, result, progress):
+    ''' Job handler: create tasks from an uploaded task list
+        Keyword arguments:
+          payload: job parameters
+          result: result dictionary
+          progress: progress function
+    '''
+    create_tasks_from_json(payload['ipd'], payload['project_id'], payload['key_type'],
+                           payload['task_insert_props'], payload['assignment_id'], result,
+                           payload['user'], progress)
+
+
+def generate_tasks_job(payload, result, progress):
+    ''' Job handler: create tasks for a project generated from NeuPrint
+        Keyword arguments:
+          payload: job parameters
+          result: result dictionary
+          progress: progress function
+    '''
+    result['rest']['inserted_id'] = payload['project_id']
+    if 'neuprint' in payload:
+        generate_task_batches(result, payload['key_type'], payload['task_insert_props'],
+                              neuprint_batches(payload['neuprint']), progress)
+    else:
+        result['tasks'] = payload['tasks']
+        generate_tasks(result, payload['key_type'], payload['task_insert_props'], progress)
+
+
+JOBS = JobQueue(app, {'create_tasks_from_json': create_tasks_job,
+                      'generate_tasks': generate_tasks_job},
+                workers=app.config['JOB_WORKERS'], stale_seconds=app.config['JOB_STALE_SECONDS'])
+
+
 # ******************************************************************************
 # * Utility functions                                                          *
 # ******************************************************************************
@@ -263,6 +356,10 @@ def initialize_result():
                        'elapsed_time': '',
                        'row_count': 0,
                        'pid': os.getpid()}}
+    try:
+        g.verbose = response_shaping.get_level(request.args.get('_verbose'))
+    except ValueError as err:
+        raise InvalidUsage(str(err))
     if 'Authorization' in request.headers:
         token = re.sub(r'Bearer\s+', '', request.headers['Authorization'])
         dtok = dict()
@@ -281,24 +378,27 @@ def initialize_result():
         app.config['USERS'][authuser] = app.config['USERS'].get(authuser, 0) + 1
     elif request.method in ['DELETE', 'POST'] or request.endpoint in app.config['REQUIRE_AUTH']:
         raise InvalidUsage('You must authorize to use this endpoint', 401)
-    if app.config['LAST_TRANSACTION'] and time() - app.config['LAST_TRANSACTION'] \
-       >= app.config['RECONNECT_SECONDS']:
-        print("Seconds since last transaction: %d" % (time() - app.config['LAST_TRANSACTION']))
-        g.db.ping()
     app.config['LAST_TRANSACTION'] = time()
     return result
 
 
-def execute_sql(result, sql, container, query=False):
-    ''' Build and execute a SQL statement.
+def execute_sql(result, sql, container, query=False, rows_hook=None, stream=False): # pylint: disable=R0913
+    ''' Build and execute a SQL statement. For a paged query (_page_size or
+        _after), the ID to pass as _after for the next page is returned as
+        "next". If stream is true and the request has _format=ndjson, rows
+        are streamed instead (see stream_sql).
         Keyword arguments:
           result: result dictionary
           sql: base SQL statement
           container: name of dictionary in result disctionary to return rows
           query: uses "id" column if true
+          rows_hook: function called with each list of rows before it is returned
+          stream: the endpoint returns the rows as is, so they may be streamed
     '''
     # pylint: disable=W0603
     global IDCOLUMN
+    if stream and request.args.get('_format') == 'ndjson':
+        return stream_sql(result, sql, query, rows_hook)
     sql, bind, IDCOLUMN = generate_sql(request, result, sql, query)
     if app.config['DEBUG']: # pragma: no cover
         if bind:
@@ -314,7 +414,13 @@ def execute_sql(result, sql, container, query=False):
     except Exception as err:
         raise InvalidUsage(sql_error(err), 500)
     result[container] = []
+    page_size = result['rest'].get('page_size')
+    if page_size and len(rows) > page_size:
+        rows = rows[:page_size]
+        result['rest']['next'] = rows[-1]['id']
     if rows:
+        if rows_hook:
+            rows_hook(rows)
         result[container] = rows
         result['rest']['row_count'] = len(rows)
         result['rest']['sql_statement'] = g.c.mogrify(sql, bind)
@@ -322,6 +428,72 @@ def execute_sql(result, sql, container, query=False):
     raise InvalidUsage("No rows returned for query %s" % (sql,), 404)
 
 
+def fetch_page(result, sql, query, after, page_size):
+    ''' Fetch one page (plus one row, if there is another page) of a query
+        Keyword arguments:
+          result: result dictionary
+          sql: base SQL statement
+          query: uses "id" column if true
+          after: ID to start after
+          page_size: rows per page
+        Returns:
+          list of rows
+    '''
+    stmt, bind, _ = generate_sql(request, result, sql, query, after, page_size)
+    try:
+        g.c.execute(stmt, bind)
+        return list(g.c.fetchall())
+    except Exception as err:
+        raise InvalidUsage(sql_error(err), 500)
+
+
+def stream_sql(result, sql, query=False, rows_hook=None):
+    ''' Stream query results as newline-delimited JSON (one row per line).
+        Rows are read in pages by ID, so the request's cursor is free for
+        rows_hook between pages. If _page_size (or _limit) is specified, at
+        most that many rows are streamed. The last line is {"rest": {...}}
+        with the row count and the "next" ID (if there are more rows).
+        Keyword arguments:
+          result: result dictionary
+          sql: base SQL statement
+          query: uses "id" column if true
+          rows_hook: function called with each page of rows before it is sent
+        Returns:
+          1 (the response is stored in result['stream'])
+    '''
+    if '_offset' in request.args:
+        raise InvalidUsage("_offset can't be used with _format=ndjson (use _after)")
+    total = request.args.get('_page_size') or request.args.get('_limit')
+    total = int(total) if total and total.isdigit() else None
+    batch = app.config['STREAM_BATCH_SIZE']
+    size = min(batch, total) if total else batch
+    rows = fetch_page(result, sql, query, request.args.get('_after'), size)
+    if not rows:
+        raise InvalidUsage("No rows returned for query %s" % (sql,), 404)
+    rest = {'row_count': 0, 'next': None}
+
+    def generate(rows, size):
+        while rows:
+            more = len(rows) > size
+            rows = rows[:size]
+            if rows_hook:
+                rows_hook(rows)
+            for row in rows:
+                yield json.dumps(row, cls=CustomJSONEncoder) + "\n"
+            rest['row_count'] += len(rows)
+            after = rows[-1]['id']
+            if not more:
+                break
+            if total and rest['row_count'] >= total:
+                rest['next'] = after
+                break
+            size = min(batch, total - rest['row_count']) if total else batch
+            rows = fetch_page(result, sql, query, after, size)
+        yield json.dumps({'rest': rest}) + "\n"
+    result['stream'] = stream_response(generate(rows, size), mimetype='application/x-ndjson')
+    return 1
+
+
 def show_columns(result, table):
     ''' Return the columns in a given table/view
         Keyword arguments:
@@ -413,10 +585,113 @@ def generate_response(result):
         Returns:
           JSON response
     '''
+    if 'stream' in result:
+        return result['stream']
+    # The body is only needed (and has only been read) if the payload was echoed
+    raw = request.get_data() if 'json' in result['rest'] or 'form' in result['rest'] else None
+    level = getattr(g, 'verbose', response_shaping.DEFAULT_LEVEL)
+    response_shaping.shape_rest(result['rest'], level, raw)
+    response_shaping.shape_tasks(result, level)
     result['rest']['elapsed_time'] = str(timedelta(seconds=(time() - START_TIME)))
+    if app.config['JSON_SERIALIZER'] == 'fast':
+        return app.response_class(serializers.serialize(result),
+                                  mimetype=app.config['JSONIFY_MIMETYPE'])
     return jsonify(**result)
 
 
+def tsv_line(values):
+    ''' Format one line of a TSV file
+        Keyword arguments:
+          values: list of column values
+        Returns:
+          TSV line
+    '''
+    return "\t".join([str(val) for val in values]) + "\n"
+
+
+def open_stream(sql, bind=None):
+    ''' Run a query on an unbuffered (server-side) cursor, so rows are read
+        from the server as they are used. The request's cursor (g.c) can't be
+        used until the stream cursor is closed.
+        Keyword arguments:
+          sql: SQL statement
+          bind: bind values
+        Returns:
+          cursor, first row (None if there are no rows)
+    '''
+    cursor = g.db.cursor(pymysql.cursors.SSDictCursor)
+    try:
+        cursor.execute(sql, bind)
+        first = cursor.fetchone()
+    except Exception:
+        cursor.close()
+        raise
+    return cursor, first
+
+
+def stream_rows(cursor, first, columns, batch=1000):
+    ''' Generate TSV lines from an unbuffered cursor
+        Keyword arguments:
+          cursor: cursor from open_stream
+          first: first row from open_stream
+          columns: columns to output
+          batch: rows per fetch
+    '''
+    try:
+        if first:
+            yield tsv_line([first[col] for col in columns])
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                break
+            for row in rows:
+                yield tsv_line([row[col] for col in columns])
+    finally:
+        cursor.close()
+
+
+def stream_response(lines, fname=None, mimetype='text/tab-separated-values', chunk=65536):
+    ''' Stream generated lines to the client in chunks. The output is
+        gzipped if the client accepts it.
+        Keyword arguments:
+          lines: line generator
+          fname: download file name
+          mimetype: MIME type
+          chunk: bytes per chunk
+        Returns:
+          streaming response
+    '''
+    compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+
+    def generate():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        buffer = []
+        size = 0
+        for line in lines:
+            buffer.append(line)
+            size += len(line)
+            if size >= chunk:
+                data = ''.join(buffer).encode('utf-8')
+                buffer = []
+                size = 0
+                data = compressor.compress(data) if compressor else data
+                if data:
+                    yield data
+        data = ''.join(buffer).encode('utf-8')
+        if compressor:
+            data = compressor.compress(data) + compressor.flush()
+        if data:
+            yield data
+
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Vary'] = 'Accept-Encoding'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    if fname:
+        response.headers['Content-Disposition'] = 'attachment; filename=%s' % (fname)
+    return response
+
+
 def receive_payload(result):
     ''' Get a request payload (form or JSON).
         Keyword arguments:
@@ -429,7 +704,7 @@ def receive_payload(result):
         return pay
     try:
         if request.form:
-            result['rest']['form'] = request.form
+            result['rest']['form'] = request.form.to_dict()
             for i in request.form:
                 pay[i] = request.form[i]
         elif request.json:
@@ -442,20 +717,6 @@ def receive_payload(result):
     return pay
 
 
-def filter_greater_than(project, row, filt):
-    ''' Filter NeuPrint record by body size and/or synapses
-        Keyword arguments:
-          project: project instance
-          row: NeuPrint record
-          filt: size cutoff
-    '''
-    for parm in project.allowable_filters:
-        if parm in filt:
-            if int(row[parm]) < int(filt[parm]):
-                return 0
-    return 1
-
-
 def check_missing_parms(ipd, required):
     ''' Check for missing parameters
         Keyword arguments:
@@ -470,62 +731,42 @@ def check_missing_parms(ipd, required):
         raise InvalidUsage('Missing arguments: ' + missing)
 
 
-def valid_cv_term(cv, cv_term):
-    ''' Determine if a CV term is valid for a given CV
-        Keyword arguments:
-          cv: CV
-          cv_term: CV term
-    '''
-    if cv not in app.config['VALID_TERMS']:
-        g.c.execute("SELECT cv_term FROM cv_term_vw WHERE cv=%s", (cv))
-        cv_terms = g.c.fetchall()
-        app.config['VALID_TERMS'][cv] = []
-        for term in cv_terms:
-            app.config['VALID_TERMS'][cv].append(term['cv_term'])
-    return 1 if cv_term in app.config['VALID_TERMS'][cv] else 0
-
-
 def query_neuprint(projectins, result, ipd):
-    ''' Build and execute NeuPrint Cypher query and add tasks to result['tasks']
+    ''' Build the NeuPrint neuron query for a project and count its neurons.
+        The query is stored in result['neuprint']; tasks are read from
+        NeuPrint a page at a time when they are inserted.
         Keyword arguments:
           projectins: project instance
           result: result dictionary
           ipd: request payload
     '''
     try:
-        response = projectins.cypher(result, ipd, app.config['NEUPRINT_SOURCE'])
+        query = neuron_query(projectins, ipd, app.config['NEUPRINT_SOURCE'])
+        result['rest']['cypher'] = neuron_cypher(query)
+        query['count'] = count_neurons(query)
     except AssertionError as err:
         raise InvalidUsage(err.args[0])
+    except InvalidUsage:
+        raise
     except Exception as err:
         temp = "{2}: An exception of type {0} occurred. Arguments:\n{1!r}"
         mess = temp.format(type(err).__name__, err.args, inspect.stack()[0][3])
         raise InvalidUsage(mess, 500)
-    if not response['data']:
+    if not query['count']:
         raise InvalidUsage('No neurons found', 404)
-    nlist = []
     if app.config['DEBUG']:
-        print("Filtering %s potential tasks" % (len(response['data'])))
-    for row in response['data']:
-        ndat = row[0]
-        if not filter_greater_than(projectins, ndat, ipd):
-            continue
-        status = ''
-        if 'status' in ndat:
-            status = ndat['status']
-        timestamp = ''
-        if 'timestamp' in ndat:
-            timestamp = ndat['timeStamp']
-        this_dict = {"post": ndat['post'],
-                     "pre": ndat['pre'],
-                     "size": ndat['size'],
-                     "status": status,
-                     "timestamp": timestamp}
-        if 'clusterName' in ndat:
-            this_dict['cluster_name'] = ndat['clusterName']
-        this_dict[projectins.unit] = ndat[projectins.cypher_unit]
-        nlist.append(this_dict)
-    result['tasks'] = sorted(nlist, key=lambda i: i['timestamp'])
-    print("%s tasks(s) remain after filtering" % (len(result['tasks'])))
+        print("%s neuron(s) found" % (query['count']))
+    result['neuprint'] = query
+
+
+def neuprint_batches(query):
+    ''' Read the tasks for a NeuPrint neuron query in batches
+        Keyword arguments:
+          query: query dictionary (from query_neuprint)
+        Returns:
+          batch generator
+    '''
+    return stream_tasks(query, app.config['NEUPRINT_PAGE_SIZE'], app.config['NEUPRINT_WORKERS'])
 
 
 def insert_project(ipd, result):
@@ -538,7 +779,8 @@ def insert_project(ipd, result):
     if ipd['project_name'].isdigit():
         raise InvalidUsage("Project name must have at least one alphabetic character")
     try:
-        bind = (ipd['project_name'], ipd['protocol'], ipd['priority'])
+        bind = (ipd['project_name'], cv_term_cache.get_cv_term_id('protocol', ipd['protocol']),
+                ipd['priority'])
         g.c.execute(WRITE['INSERT_PROJECT'], bind)
         result['rest']['row_count'] = g.c.rowcount
         result['rest']['inserted_id'] = g.c.lastrowid
@@ -568,20 +810,19 @@ def generate_project(protocol, result):
     # Instattiate project
     constructor = globals()[protocol.capitalize()]
     projectins = constructor()
-    # Create tasks in memory
+    # Create tasks in memory (or, for NeuPrint, a query that will generate them)
     method = projectins.task_populate_method
     globals()[method](projectins, result, ipd)
-    if not result['tasks']:
+    total = result['neuprint']['count'] if 'neuprint' in result else len(result['tasks'])
+    if not total:
         return 1
     # We have tasks! Create a project (unless it already exists).
     project = get_project_by_name_or_id(ipd['project_name'])
     if project and not ('append' in ipd and ipd['append']):
         return 0
-    existing_project = False
     if project:
         ipd['project_name'] = project['name']
         result['rest']['inserted_id'] = project['id']
-        existing_project = True
         print("Project %s (ID %s) already exists" % (project['name'], project['id']))
     else:
         ipd['priority'] = ipd['priority'] if 'priority' in ipd else 10
@@ -596,14 +837,22 @@ def generate_project(protocol, result):
     update_property(result['rest']['inserted_id'], 'project', 'filter', json.dumps(ipd))
     result['rest']['row_count'] += g.c.rowcount
     # Insert tasks into the database
-    if len(result['tasks']) > app.config['FOREGROUND_TASK_LIMIT']:
+    if total > app.config['FOREGROUND_TASK_LIMIT']:
+        payload = {'project_id': result['rest']['inserted_id'], 'key_type': projectins.unit,
+                   'task_insert_props': projectins.task_insert_props}
+        if 'neuprint' in result:
+            payload['neuprint'] = result['neuprint']
+        else:
+            payload['tasks'] = result['tasks']
+        result['rest']['job_id'] = submit_job('generate_tasks', payload, result['rest']['user'],
+                                              total)
         g.db.commit()
-        pro = Process(target=generate_tasks, args=(result, projectins.unit,
-                                                   projectins.task_insert_props, existing_project))
-        pro.start()
         result['rest']['tasks_inserted'] = -1
     else:
-        generate_tasks(result, projectins.unit, projectins.task_insert_props, existing_project)
+        if 'neuprint' in result:
+            result['tasks'] = [task for batch in neuprint_batches(result['neuprint'])
+                               for task in batch]
+        generate_tasks(result, projectins.unit, projectins.task_insert_props)
     return 1
 
 
@@ -616,7 +865,7 @@ def get_project_properties(project):
     active = "<span style='color:%s'>%s</span>" \
              % (('lime', 'YES') if project['active'] else ('red', 'NO'))
     pprops.append(['Active:', active])
-    pprops.append(['Protocol:', app.config['PROTOCOLS'][project['protocol']]])
+    pprops.append(['Protocol:', get_protocols()[project['protocol']]])
     pprops.append(['Priority:', project['priority']])
     try:
         g.c.execute("SELECT type_display,value FROM project_property_vw WHERE name=%s"
@@ -669,8 +918,7 @@ def generate_disposition_block(pid, num_assigned, num_unassigned):
     '''
     disposition_block = ''
     try:
-        g.c.execute("SELECT disposition,COUNT(1) AS c FROM task_vw WHERE project_id=%s "
-                    + "AND assignment IS NOT NULL GROUP BY 1", pid)
+        g.c.execute(READ['PROJECT_DISPOSITIONS'], (pid,))
         atasks = g.c.fetchall()
     except Exception as err:
         raise InvalidUsage(sql_error(err), 500)
@@ -809,15 +1057,15 @@ def change_project_priority(result, name_or_id, priority):
 
 
 def get_unassigned_project_tasks(ipd, project_id, num_tasks):
-    ''' Get a list of unassigned tasks for a project
+    ''' Get (and lock) up to num_tasks unassigned tasks for a project
         Keyword arguments:
           ipd: request payload
           project_id: project ID
           num_tasks: number of tasks to assign
     '''
     try:
-        print(READ['UNASSIGNED_TASKS'] % (project_id))
-        g.c.execute(READ['UNASSIGNED_TASKS'], (project_id))
+        print(READ['UNASSIGNED_TASKS'] % (project_id, num_tasks))
+        g.c.execute(READ['UNASSIGNED_TASKS'], (project_id, num_tasks))
         tasks = g.c.fetchall()
     except Exception as err:
         raise InvalidUsage(sql_error(err), 500)
@@ -834,46 +1082,108 @@ def project_summary_query(ipd):
         Keyword arguments:
           ipd: request payload
         Returns:
-          SQL query
+          SQL query, bind list
     '''
     sql = READ['PSUMMARY']
     clause = []
+    bind = []
     if 'protocol' in ipd and ipd['protocol']:
-        protocol_str = json.dumps(ipd['protocol']).strip('[]')
-        clause.append(" t.protocol IN (%s)" % protocol_str)
+        protocols = ipd['protocol'] if isinstance(ipd['protocol'], list) else [ipd['protocol']]
+        clause.append(" t.protocol IN (%s)" % ','.join(['%s'] * len(protocols)))
+        bind.extend(protocols)
     if 'start_date' in ipd and ipd['start_date']:
-        clause.append(" DATE(p.create_date) >= '%s'" % ipd['start_date'])
+        clause.append(" DATE(p.create_date) >= %s")
+        bind.append(ipd['start_date'])
     if 'stop_date' in ipd and ipd['stop_date']:
-        clause.append(" DATE(p.create_date) <= '%s'" % ipd['stop_date'])
+        clause.append(" DATE(p.create_date) <= %s")
+        bind.append(ipd['stop_date'])
     if clause:
         where = ' AND '.join(clause)
         sql = sql.replace('GROUP BY', 'WHERE ' + where + ' GROUP BY')
-    return sql
+    return sql, bind
 
 
-def assignment_query(ipd):
-    ''' Build an assignment query
+def assignment_filter(ipd):
+    ''' Build the WHERE clause for an assignment list query
         Keyword arguments:
-          ipd: request payload
+          ipd: request payload (protocol and proofreader may be lists)
         Returns:
-          SQL query
-    '''
-    sql = "SELECT * from project_stats_vw"
-    clause = []
-    if 'protocol' in ipd and ipd['protocol']:
-        protocol_str = json.dumps(ipd['protocol']).strip('[]')
-        clause.append(" protocol IN (%s)" % protocol_str)
-    if 'proofreader' in ipd and ipd['proofreader']:
-        proofreader_str = json.dumps(ipd['proofreader']).strip('[]')
-        clause.append(" user IN (%s)" % proofreader_str)
+          SQL clause, bind list
+    '''
+    clause = ''
+    bind = []
+    for parm, column in [('protocol', 'pp.name'), ('proofreader', 'a.user')]:
+        if parm in ipd and ipd[parm]:
+            values = ipd[parm] if isinstance(ipd[parm], list) else ipd[parm].split(',')
+            clause += " AND %s IN (%s)" % (column, ','.join(['%s'] * len(values)))
+            bind.extend(values)
     if 'start_date' in ipd and ipd['start_date']:
-        clause.append(" DATE(create_date) >= '%s'" % ipd['start_date'])
+        clause += " AND a.create_date >= %s"
+        bind.append(str(ipd['start_date']))
     if 'stop_date' in ipd and ipd['stop_date']:
-        clause.append(" DATE(create_date) <= '%s'" % ipd['stop_date'])
-    if clause:
-        sql += ' AND '.join(clause)
-        sql = sql.replace('project_stats_vw', 'project_stats_vw WHERE ')
-    return sql
+        clause += " AND a.create_date < DATE_ADD(%s,INTERVAL 1 DAY)"
+        bind.append(str(ipd['stop_date']))
+    return clause, bind
+
+
+def assignment_page(ipd, sort='proofreader', order='asc', after=None, page_size=100):
+    ''' Get one page of the assignment list. The page is located by (sort
+        key, assignment ID), so pages don't shift when assignments are added.
+        Sort keys are expressions over joined tables, so each page still
+        sorts the filtered assignments (filters keep that set small); task
+        counts come from assignment_stats.
+        Keyword arguments:
+          ipd: request payload (filters)
+          sort: sort column
+          order: asc or desc
+          after: cursor returned with the previous page
+          page_size: number of assignments
+        Returns:
+          list of assignments, cursor for the next page (None if this is the last page)
+    '''
+    if sort not in ASSIGNMENT_SORT:
+        raise InvalidUsage("Assignments can't be sorted by %s" % sort)
+    if order not in ('asc', 'desc'):
+        raise InvalidUsage("Order must be asc or desc")
+    if not 1 <= page_size <= 1000:
+        raise InvalidUsage("page_size must be between 1 and 1000")
+    sort_key = ASSIGNMENT_SORT[sort]
+    clause, bind = assignment_filter(ipd)
+    if after:
+        try:
+            last_key, last_id = json.loads(base64.urlsafe_b64decode(after.encode()).decode())
+        except Exception:
+            raise InvalidUsage("Invalid cursor %s" % after)
+        comp = '>' if order == 'asc' else '<'
+        clause += " AND (%s %s %%s OR (%s=%%s AND a.id %s %%s))" \
+                  % (sort_key, comp, sort_key, comp)
+        bind.extend([last_key, last_key, last_id])
+    sql = READ['ASSIGNMENT_KEYS'] % (sort_key, clause, order, order)
+    try:
+        g.c.execute(sql, bind + [page_size + 1])
+        keys = g.c.fetchall()
+    except Exception as err:
+        raise InvalidUsage(sql_error(err), 500)
+    cursor = None
+    if len(keys) > page_size:
+        keys = keys[:page_size]
+        cursor = base64.urlsafe_b64encode(json.dumps([keys[-1]['sort_key'],
+                                                      keys[-1]['id']]).encode()).decode()
+    if not keys:
+        return [], cursor
+    try:
+        g.c.execute(READ['ASSIGNMENT_PAGE'] % ','.join(['%s'] * len(keys)),
+                    [key['id'] for key in keys])
+        rows = {row['id']: row for row in g.c.fetchall()}
+    except Exception as err:
+        raise InvalidUsage(sql_error(err), 500)
+    protocols = get_protocols()
+    assignments = []
+    for key in keys:
+        row = rows[key['id']]
+        row['protocol'] = protocols.get(row['protocol'], row['protocol'])
+        assignments.append(row)
+    return assignments, cursor
 
 
 def get_incomplete_assignment_tasks(assignment_id):
@@ -883,8 +1193,7 @@ def get_incomplete_assignment_tasks(assignment_id):
     '''
     try:
         stmt = "SELECT id FROM task WHERE assignment_id=%s AND completion_date IS NULL"
-        print(stmt % (assignment_id))
-        g.c.execute(stmt, (assignment_id))
+        g.c.execute(stmt, (assignment_id,))
         return g.c.fetchall()
     except Exception as err:
         raise InvalidUsage(sql_error(err), 500)
@@ -1015,7 +1324,7 @@ def protocol_select_list(result):
     for row in result['temp']:
         if bool(row['cv_term'] in sys.modules):
             protocols += '<option value="%s" SELECTED>%s</option>' \
-                % (row['cv_term'], app.config['PROTOCOLS'][row['cv_term']])
+                % (row['cv_term'], get_protocols()[row['cv_term']])
     return protocols
 
 
@@ -1170,7 +1479,7 @@ def get_user_metrics(mtype, uname, user_org='user'):
         content = content % (mtype.capitalize(), mtype, )
         for row in rows:
             row['a'] = row['a'] if row['a'] else '-'
-            content += template % (app.config['PROTOCOLS'][row['protocol']], \
+            content += template % (get_protocols()[row['protocol']], \
                                    row['disposition'], row['c'], row['a'])
         content += '</tbody></table>'
     return content
@@ -1212,26 +1521,29 @@ def generate_assignment(ipd, result):
         if parm in ipd:
             update_property(result['rest']['inserted_id'], 'assignment', parm, ipd[parm])
             result['rest']['row_count'] += g.c.rowcount
-    updated = 0
-    if len(tasks) < num_tasks:
-        num_tasks = len(tasks)
+    num_tasks = len(tasks)
     print("Assigned %s to %s" % (ipd['name'], assignment_user))
-    for task in tasks:
-        try:
-            bind = (result['rest']['inserted_id'], assignment_user, task['id'])
-            g.c.execute(WRITE['ASSIGN_TASK'], bind)
-            result['rest']['row_count'] += g.c.rowcount
-            updated += 1
-            publish_cdc(result, {"table": "assignment", "operation": "update"})
-            bind = (task['id'], project['id'], result['rest']['inserted_id'], projectins.unit,
-                    task['key_text'], 'Assigned', None, assignment_user)
-            g.c.execute(WRITE['TASK_AUDIT'], bind)
-            if updated >= num_tasks:
-                break
-        except Exception as err:
-            raise InvalidUsage(sql_error(err), 500)
+    try:
+        sql = WRITE['ASSIGN_TASKS'] % ','.join(['%s'] * num_tasks)
+        bind = [result['rest']['inserted_id'], assignment_user] + [task['id'] for task in tasks]
+        g.c.execute(sql, bind)
+        updated = g.c.rowcount
+        result['rest']['row_count'] += updated
+        publish_cdc(result, {"table": "assignment", "operation": "update",
+                             "assignment_id": result['rest']['inserted_id'], "tasks": updated})
+        move_tasks(g.c, tasks, assignment_id=result['rest']['inserted_id'])
+        refresh_assignment_stats(g.c, [result['rest']['inserted_id']])
+    except Exception as err:
+        raise InvalidUsage(sql_error(err), 500)
     if updated != num_tasks:
         raise InvalidUsage("Could not assign tasks for project %s" % ipd['project_name'], 500)
+    key_type_id = get_key_type_id(projectins.unit)
+    audit_list = [(task['id'], project['id'], result['rest']['inserted_id'], key_type_id,
+                   task['key_text'], 'Assigned', None, assignment_user) for task in tasks]
+    try:
+        g.c.executemany(WRITE['TASK_AUDIT'], audit_list)
+    except Exception as err:
+        raise InvalidUsage(sql_error(err), 500)
     result['rest']['assigned_tasks'] = updated
     if 'start' in ipd and ipd['start']:
         ipd['id'] = str(result['rest']['inserted_id'])
@@ -1286,10 +1598,13 @@ def update_project_disposition(project_name, disposition='Complete'):
           project_name: project name
           disposition: disposition [Complete]
     '''
-    g.c.execute("SELECT COUNT(1) AS c FROM task_vw WHERE project=%s AND completion_date IS NULL",
-                project_name)
+    g.c.execute(READ['PROJECT_INCOMPLETE'], (project_name,))
     row = g.c.fetchone()
-    if not row['c']:
+    if not row['counters']:
+        # No counters for this project (they haven't been built): count its tasks
+        g.c.execute(READ['PROJECT_INCOMPLETE_TASKS'], (project_name,))
+        row = g.c.fetchone()
+    if row['c'] <= 0:
         try:
             g.c.execute("UPDATE project SET disposition=%s WHERE "
                         + "name=%s", (disposition, project_name,))
@@ -1343,74 +1658,60 @@ def complete_assignment(ipd, result, assignment, incomplete_okay=False):
     publish_kafka('assignment_complete', result, message)
 
 
-def build_assignment_table(user, ipd): # pylint: disable=R0914
-    ''' Get a list of all assignments and return as a table.
-        Also return a dictionary of proofreaders and protocols.
+def proofreader_select_list(user):
+    ''' Return proofreaders as options for a <select>. Users without admin or
+        view permission only see themselves.
         Keyword arguments:
-          user: proofreader
-          start: start date
-          stop: stop date
+          user: calling user
         Returns:
-          Dictionary of proofreaders
-          Assignments HTML
+          Proofreader options HTML
     '''
     proofreaders = ''
     try:
         g.c.execute("SELECT name,CONCAT(last,', ',first) AS proofreader FROM user ORDER BY 2")
         rows = g.c.fetchall()
     except Exception as err:
-        return render_template('error.html', urlroot=request.url_root,
-                               title='SQL error', message=sql_error(err))
+        raise InvalidUsage(sql_error(err), 500)
     permission = check_permission(user, ['admin', 'view'])
     for row in rows:
         if permission or row['name'] == user:
             proofreaders += '<option value="%s">%s</option>' \
                 % (row['name'], row['proofreader'])
-    if not permission:
-        ipd['proofreader'] = user
-    sql = assignment_query(ipd)
-    try:
-        g.c.execute(sql)
-        rows = g.c.fetchall()
-    except Exception as err:
-        return render_template('error.html', urlroot=request.url_root,
-                               title='SQL error', message=sql_error(err))
-    if rows:
-        header = ['Proofreader', 'Project', 'Protocol', 'Assignment', 'Started', 'Completed',
-                  'Task disposition', 'Task count', 'Export']
-        assignments = '''
-        <table id="assignments" class="tablesorter standard">
-        <thead>
-        <tr><th>
-        '''
-        assignments += '</th><th>'.join(header) + '</th></tr></thead><tbody>'
-        template = '<tr class="%s">' + ''.join("<td>%s</td>")*6 \
-                   + ''.join('<td style="text-align: center">%s</td>')*3 + "</tr>"
-        del header[-1]
-        fileoutput = ''
-        ftemplate = "\t".join(["%s"]*8) + "\n"
-        for row in rows:
-            rclass = 'complete' if row['task_disposition'] == 'Complete' else 'open'
-            if not row['task_disposition']:
-                rclass = 'notstarted'
-            proj = '<a href="/project/%s">%s</a>' % (row['project'], row['project'])
-            assn = '<a href="/assignment/%s">%s</a>' % (row['assignment'], row['assignment'])
-            this_protocol = app.config['PROTOCOLS'][row['protocol']]
-            link = '<a class="text-info" href="/assignment/json/%s" ' \
-                   % (row['assignment']) + '>JSON</a>'
-            assignments += template % (rclass, row['proofreader'], proj, this_protocol,
-                                       assn, row['start_date'], row['completion_date'],
-                                       row['task_disposition'], row['tasks'], link)
-            fileoutput += ftemplate % (row['proofreader'], row['project'], this_protocol,
-                                       row['assignment'], row['start_date'], row['completion_date'],
-                                       row['task_disposition'], row['tasks'])
-        assignments += "</tbody></table>"
-        downloadable = create_downloadable('assignments', header, ftemplate, fileoutput)
-        assignments = '<a class="btn btn-outline-info btn-sm" href="/download/%s" ' \
-                      % (downloadable) + 'role="button">Download table</a>' + assignments
+    return proofreaders
+
+
+def insert_task_batch(projectins, job, lines, result):
+    ''' Parse and insert (but don't commit) one batch of streamed tasks
+        Keyword arguments:
+          projectins: project instance
+          job: streaming job (payload has the project-level parameters)
+          lines: list of decoded NDJSON records
+          result: result dictionary
+        Returns:
+          number of tasks inserted
+    '''
+    ipd = dict(job['payload']['ipd'])
+    list_key = getattr(projectins, 'task_list_key', None)
+    if list_key:
+        ipd[list_key] = lines
     else:
-        assignments = "There are no open assignments"
-    return proofreaders, assignments
+        ipd['tasks'] = dict()
+        for line in lines:
+            if not isinstance(line, dict):
+                raise InvalidUsage("Each line must be a JSON dictionary keyed by task key")
+            ipd['tasks'].update(line)
+    error = call_task_parser(projectins, ipd)
+    if not error and hasattr(projectins, 'validate_tasks'):
+        error = projectins.validate_tasks(ipd['tasks'])
+    if error:
+        raise InvalidUsage(error)
+    batch_result = {'rest': {'row_count': 0}}
+    payload = job['payload']
+    create_tasks_from_json(ipd, payload['project_id'], projectins.unit,
+                           projectins.task_insert_props, payload['assignment_id'], batch_result,
+                           payload['user'], commit=False)
+    result['rest']['row_count'] += batch_result['rest']['row_count']
+    return batch_result['rest']['tasks_inserted']
 
 
 def create_assignment_from_tasks(project, assignment_name, ipd, result):
@@ -1446,9 +1747,10 @@ def get_task_by_key(pid, key_type, key):
           key_type: key type
           key: key
     '''
-    bind = (pid, key_type, key)
-    g.c.execute("SELECT * from task_vw WHERE project_id=%s AND key_type=%s AND key_text=%s", bind)
-    return g.c.fetchone()
+    bind = (pid, get_key_type_id(key_type), key)
+    g.c.execute(assignment_utilities.READ['TASK_BY_KEY'], bind)
+    row = g.c.fetchone()
+    return get_task_by_id(row['id']) if row else None
 
 
 def add_point(ipd, key, result):
@@ -1542,7 +1844,10 @@ def update_task(task, ipd, this_user, result):
         result['rest']['row_count'] = g.c.rowcount
         result['rest']['sql_statement'] = g.c.mogrify(WRITE['START_TASK'], bind)
         publish_cdc(result, {"table": "task", "operation": "update"})
-        bind = (ipd['id'], task['project_id'], task['assignment_id'], task['key_type'],
+        if result['rest']['row_count']:
+            move_tasks(g.c, [task], disposition=disposition)
+        refresh_assignment_stats(g.c, [task['assignment_id']])
+        bind = (ipd['id'], task['project_id'], task['assignment_id'], task['key_type_id'],
                 task['key_text'], 'In progress', None, this_user)
         g.c.execute(WRITE['TASK_AUDIT'], bind)
     except Exception as err:
@@ -1651,9 +1956,12 @@ def complete_task(ipd, result):
         result['rest']['row_count'] = g.c.rowcount
         result['rest']['sql_statement'] = g.c.mogrify(WRITE['COMPLETE_TASK'], bind)
         publish_cdc(result, {"table": "task", "operation": "update"})
+        if result['rest']['row_count']:
+            move_tasks(g.c, [task], disposition=disposition, completion_date=end_time)
+        refresh_assignment_stats(g.c, [task['assignment_id']])
     except Exception as err:
         raise InvalidUsage(sql_error(err), 500)
-    bind = (ipd['id'], task['project_id'], task['assignment_id'], task['key_type'],
+    bind = (ipd['id'], task['project_id'], task['assignment_id'], task['key_type_id'],
             task['key_text'], disposition, None, task['user'])
     g.c.execute(WRITE['TASK_AUDIT'], bind)
     for parm in projectins.optional_properties:
@@ -1667,22 +1975,23 @@ def complete_task(ipd, result):
     complete_assignment(ipd, result, assignment, True)
 
 
-def get_task_properties(result):
+def get_task_properties(tasks, id_column='id'):
     ''' Add task properties to tasks
         Keyword arguments:
-          result: result dictionary
+          tasks: list of tasks
+          id_column: column containing the task ID
     '''
-    result['data'] = list()
-    for task in result['temp']:
-        task['properties'] = dict()
-        try:
-            g.c.execute("SELECT type,value FROM task_property_vw WHERE task_id=%s", task['id'])
-            rows = g.c.fetchall()
-        except Exception as err:
-            raise InvalidUsage(sql_error(err), 500)
-        for row in rows:
-            task['properties'][row['type']] = row['value']
-        result['data'].append(task)
+    properties = load_task_properties([task[id_column] for task in tasks])
+    for task in tasks:
+        task['properties'] = dict(properties.get(task[id_column], dict()))
+
+
+def get_audit_task_properties(tasks):
+    ''' Add task properties to task audit rows
+        Keyword arguments:
+          tasks: list of task audit rows
+    '''
+    get_task_properties(tasks, 'task_id')
 
 
 def build_task_table(aname):
@@ -1752,15 +2061,10 @@ def get_task_controls(user, task_id, task):
             <button type="button" class="btn btn-warning btn-sm" style="margin-right:20px" onclick='modify_task(%s,"complete");'>Complete task</button>
             '''
             controls = controls % (task_id)
-            try:
-                g.c.execute("SELECT cv_term FROM cv_term_vw WHERE cv='disposition'")
-                rows = g.c.fetchall()
-            except Exception as err:
-                raise err
             controls += 'Disposition: <select id="disposition" style="margin-right: 20px">'
-            for row in rows:
-                if row['cv_term'] not in ['In progress']:
-                    controls += '<option>%s</option>' % (row['cv_term'])
+            for term in cv_term_cache.get_terms('disposition'):
+                if term not in ['In progress']:
+                    controls += '<option>%s</option>' % (term)
             controls += '</select>Note: <input id="note" size=40>'
     return controls
 
@@ -2030,10 +2334,10 @@ def generate_navbar(active):
                    + 'role="button" data-toggle="dropdown" aria-haspopup="true" ' \
                    + 'aria-expanded="false">Protocols</a><div class="dropdown-menu" '\
                    + 'aria-labelledby="navbarDropdown">'
-            for subhead in app.config['PROTOCOLS']:
+            for subhead in get_protocols():
                 if subhead in sys.modules:
                     nav += '<a class="dropdown-item" href="/userlist/%s">%s</a>' \
-                           % (subhead, app.config['PROTOCOLS'][subhead])
+                           % (subhead, get_protocols()[subhead])
             nav += '</div></li>'
         elif heading == 'Users':
             nav += '<li class="nav-item dropdown active">' \
@@ -2054,22 +2358,78 @@ def generate_navbar(active):
     return nav
 
 
-def create_downloadable(name, header, template, content):
-    ''' Generate a dowenloadabe content file
+def export_link(kind, params=None):
+    ''' Generate a download button for an export
+        Keyword arguments:
+          kind: export kind
+          params: dictionary of export parameters
+        Returns:
+          Button HTML
+    '''
+    link = '/export/%s.tsv' % (kind)
+    if params:
+        link += '?' + urlencode(params, doseq=True)
+    return '<a class="btn btn-outline-info btn-sm" href="%s" role="button">Download table</a>' \
+           % (link)
+
+
+def export_projects(user, params):
+    ''' Get the project list export
+        Keyword arguments:
+          user: user
+          params: dictionary of export parameters (protocol, start_date, stop_date)
+        Returns:
+          permission scope, line generator function
+    '''
+    permissions = check_permission(user)
+    full = 'admin' in permissions or 'view' in permissions
+    scope = 'all' if full else sorted(permissions)
+
+    def generate():
+        try:
+            g.c.execute(*project_summary_query(params))
+            rows = g.c.fetchall()
+        except Exception as err:
+            raise InvalidUsage(sql_error(err), 500)
+        yield tsv_line(['Protocol', 'Group', 'Project', 'Tasks', 'Disposition', 'Priority',
+                        'Created', 'Active'])
+        for row in rows:
+            if not full and row['protocol'] not in permissions:
+                continue
+            yield tsv_line([get_protocols()[row['protocol']], row['project_group'],
+                            row['project'], row['num'], row['disposition'], row['priority'],
+                            row['create_date'], row['active']])
+
+    return scope, generate
+
+
+def export_unassigned(user, _):
+    ''' Get the export of projects with unassigned tasks
         Keyword arguments:
-          name: base file name
-          header: table header
-          template: header row template
-          content: table content
+          user: user
         Returns:
-          File name
+          permission scope, line generator function
     '''
-    fname = '%s_%s_%s.tsv' % (name, random_string(), datetime.today().strftime('%Y%m%d%H%M%S'))
-    text_file = open("/tmp/%s" % (fname), "w")
-    text_file.write(template % tuple(header))
-    text_file.write(content)
-    text_file.close()
-    return fname
+    if not check_permission(user, 'admin'):
+        raise InvalidUsage("You don't have permission to view unassigned tasks", 403)
+
+    def generate():
+        try:
+            g.c.execute(READ['UPSUMMARY'])
+            rows = g.c.fetchall()
+        except Exception as err:
+            raise InvalidUsage(sql_error(err), 500)
+        yield tsv_line(['Protocol', 'Group', 'Project', 'Tasks', 'Priority', 'Active',
+                        'Assignment'])
+        for row in rows:
+            yield tsv_line([get_protocols()[row['protocol']], row['project_group'],
+                            row['project'], row['num'], row['priority'], row['active'], '-'])
+
+    return 'all', generate
+
+
+EXPORTS = {'projects': export_projects,
+           'unassigned': export_unassigned}
 
 
 def generate_disposition_tasklist(rows, user):
@@ -2117,7 +2477,7 @@ def generate_disposition_tasklist(rows, user):
 
 
 def publish_kafka(topic, result, message):
-    ''' Publish a message to Kafka
+    ''' Queue a message for publishing to Kafka
         Keyword arguments:
           topic: Kafka topic
           result: result dictionary
@@ -2130,15 +2490,13 @@ def publish_kafka(topic, result, message):
     message['host'] = os.uname()[1]
     message['status'] = 200
     message['time'] = int(time())
-    future = PRODUCER.send(topic, json.dumps(message).encode('utf-8'))
-    try:
-        future.get(timeout=10)
-    except KafkaError:
-        print("Failed sending message to Kafka!")
+    PUBLISHER.publish(topic, message)
 
 
 def publish_cdc(result, message):
-    ''' Publish a CDC message to Kafka
+    ''' Write a CDC message to the outbox table. The message is committed
+        (or rolled back) with the rest of the transaction, and published to
+        Kafka by outbox_relay.py.
         Keyword arguments:
           result: result dictionary
           message: message to publish
@@ -2154,11 +2512,13 @@ def publish_cdc(result, message):
     message['id'] = g.c.lastrowid
     message['rows'] = g.c.rowcount
     message['sql'] = g.c._last_executed # pylint: disable=W0212
-    future = PRODUCER.send(app.config['KAFKA_TOPIC'], json.dumps(message).encode('utf-8'))
+    # Use a separate cursor so g.c's rowcount and lastrowid are untouched
     try:
-        future.get(timeout=10)
-    except KafkaError:
-        print("Failed sending CDC to Kafka!")
+        cursor = g.db.cursor()
+        cursor.execute(WRITE['INSERT_OUTBOX'], (app.config['KAFKA_TOPIC'], json.dumps(message)))
+        cursor.close()
+    except Exception as err:
+        raise InvalidUsage(sql_error(err), 500)
 
 
 def remove_id_from_index(this_id, index, result):
@@ -2258,8 +2618,8 @@ def user_list():
         else:
             showarr = []
             for perm in row['permissions'].split(','):
-                if perm in app.config['PROTOCOLS']:
-                    this_perm = '<span style="color:cyan">%s</span>' % app.config['PROTOCOLS'][perm]
+                if perm in get_protocols():
+                    this_perm = '<span style="color:cyan">%s</span>' % get_protocols()[perm]
                 elif perm in app.config['GROUPS']:
                     this_perm = '<span style="color:gold">%s</span>' % perm
                 else:
@@ -2340,7 +2700,7 @@ def user_protocol_list(protocol):
     return render_template('userplist.html', urlroot=request.url_root, face=face,
                            dataset=app.config['DATASET'],
                            navbar=generate_navbar('Protocols'),
-                           protocol=app.config['PROTOCOLS'][protocol],
+                           protocol=get_protocols()[protocol],
                            organizations=organizations, userrows=urows)
 
 
@@ -2481,15 +2841,50 @@ def logout():
     return response
 
 
-@app.route('/download/<string:fname>')
-def download(fname):
-    ''' Downloadable content
+@app.route('/export/<string:kind>.tsv', methods=['GET'])
+def export_file(kind):
     '''
+    Download an export
+    Generate (or return a cached copy of) a TSV export. Exports are cached
+     for a short time; conditional GETs (If-None-Match) are supported.
+    ---
+    tags:
+      - Export
+    parameters:
+      - in: path
+        name: kind
+        schema:
+          type: string
+        required: true
+        description: export (projects or unassigned)
+    responses:
+      200:
+          description: TSV file
+      304:
+          description: Not modified
+      401:
+          description: Not authorized
+      404:
+          description: Export not found
+    '''
+    user, _ = check_token()
+    if not user:
+        raise InvalidUsage('You must authorize to use this endpoint', 401)
+    if kind not in EXPORTS:
+        raise InvalidUsage("Export %s does not exist" % (kind), 404)
+    params = {key: request.args.getlist(key) for key in sorted(request.args)}
+    scope, generator = EXPORTS[kind](user, params)
     try:
-        return send_file('/tmp/' + fname, attachment_filename=fname)
-    except Exception as err:
-        return render_template('error.html', urlroot=request.url_root,
-                               title='Download error', message=err)
+        path, etag = exports.get_export(kind, params, scope, generator)
+    except OSError as err:
+        raise InvalidUsage("Could not write export: %s" % (err), 500)
+    response = send_file(path, mimetype='text/tab-separated-values', as_attachment=True,
+                         attachment_filename=kind + '.tsv', add_etags=False, conditional=False)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.public = False
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 
 @app.route('/')
@@ -2524,13 +2919,13 @@ def show_projects(): # pylint: disable=R0914,R0912,R0915
         '''
         template = '<tr><td>%s</td><td style="text-align: center">%s</td></tr>'
         for row in rows:
-            row['protocol'] = app.config['PROTOCOLS'][row['protocol']]
+            row['protocol'] = get_protocols()[row['protocol']]
             projectsummary += template \
                                  % tuple([row[x] for x in ['protocol', 'c']])
         projectsummary += '</tbody></table>'
     ipd = receive_payload(result)
     try:
-        g.c.execute(project_summary_query(ipd))
+        g.c.execute(*project_summary_query(ipd))
         rows = g.c.fetchall()
     except Exception as err:
         return render_template('error.html', urlroot=request.url_root,
@@ -2538,16 +2933,13 @@ def show_projects(): # pylint: disable=R0914,R0912,R0915
     if rows:
         header = ['Protocol', 'Group', 'Project', 'Tasks', 'Disposition', 'Priority',
                   'Created', 'Active']
-        projects = '''
+        projects = ['''
         <table id="projects" class="tablesorter standard">
         <thead>
         <tr><th>
-        '''
-        projects += '</th><th>'.join(header) + '</th></tr></thead><tbody>'
+        ''' + '</th><th>'.join(header) + '</th></tr></thead><tbody>']
         template = '<tr class="%s">' + ''.join("<td>%s</td>")*3 \
                    + ''.join('<td style="text-align: center">%s</td>')*5 + "</tr>"
-        fileoutput = ''
-        ftemplate = "\t".join(["%s"]*8) + "\n"
         for row in rows:
             if 'admin' not in permissions and 'view' not in permissions \
                and row['protocol'] not in permissions:
@@ -2558,17 +2950,14 @@ def show_projects(): # pylint: disable=R0914,R0912,R0915
             proj = '<a href="/project/%s">%s</a>' % (row['project'], row['project'])
             active = "<span style='color:%s'>%s</span>" \
                      % (('lime', 'YES') if row['active'] else ('red', 'NO'))
-            this_protocol = app.config['PROTOCOLS'][row['protocol']]
-            projects += template % (rclass, this_protocol, row['project_group'], proj,
-                                    row['num'], row['disposition'], row['priority'],
-                                    row['create_date'], active)
-            fileoutput += ftemplate % (this_protocol, row['project_group'], row['project'],
-                                       row['num'], row['disposition'], row['priority'],
-                                       row['create_date'], row['active'])
-        projects += "</tbody></table>"
-        downloadable = create_downloadable('projects', header, ftemplate, fileoutput)
-        projects = '<a class="btn btn-outline-info btn-sm" href="/download/%s" ' \
-                   % (downloadable) + 'role="button">Download table</a>' + projects
+            this_protocol = get_protocols()[row['protocol']]
+            projects.append(template % (rclass, this_protocol, row['project_group'], proj,
+                                        row['num'], row['disposition'], row['priority'],
+                                        row['create_date'], active))
+        projects.append("</tbody></table>")
+        projects = export_link('projects', {key: ipd[key] for key in
+                                            ['protocol', 'start_date', 'stop_date']
+                                            if ipd.get(key)}) + ''.join(projects)
     else:
         projects = "There are no projects"
     if request.method == 'POST':
@@ -2584,7 +2973,7 @@ def show_projects(): # pylint: disable=R0914,R0912,R0915
         for row in result['temp']:
             if bool(row['cv_term'] in sys.modules):
                 newproject += '<option value="%s">%s</option>' % (row['cv_term'], \
-                               app.config['PROTOCOLS'][row['cv_term']])
+                               get_protocols()[row['cv_term']])
         newproject += '</select><hr style="border: 1px solid gray">'
     if not token:
         token = ''
@@ -2597,20 +2986,18 @@ def show_projects(): # pylint: disable=R0914,R0912,R0915
     return response
 
 
-@app.route('/assignmentlist', methods=['GET', 'POST'])
-@app.route('/assignmentlist/interactive', methods=['GET', 'POST'])
+@app.route('/assignmentlist')
+@app.route('/assignmentlist/interactive')
 def show_assignments(): # pylint: disable=R0914
-    ''' Show assignments
+    ''' Show assignments (the assignment table is loaded from /assignmentlist/data)
     '''
     user, face = check_token()
     if not user:
         return redirect(app.config['AUTH_URL'] + "?redirect=" + request.url_root)
     result = initialize_result()
-    ipd = receive_payload(result)
     initial_start = ''
     if 'interactive' not in request.url:
         initial_start = (datetime.now() - timedelta(days=7)).date()
-        ipd['start_date'] = initial_start
     try:
         g.c.execute('SELECT protocol,disposition,COUNT(1) AS c FROM assignment_vw GROUP BY 1,2')
         rows = g.c.fetchall()
@@ -2626,23 +3013,144 @@ def show_assignments(): # pylint: disable=R0914
         '''
         template = '<tr><td>%s</td><td>%s</td><td style="text-align: center">%s</td></tr>'
         for row in rows:
-            row['protocol'] = app.config['PROTOCOLS'][row['protocol']]
+            row['protocol'] = get_protocols()[row['protocol']]
             assignmentsummary += template \
                                  % tuple([row[x] for x in ['protocol', 'disposition', 'c']])
         assignmentsummary += '</tbody></table><br>'
-    proofreaders, assignments = build_assignment_table(user, ipd)
-    if request.method == 'POST':
-        return {"assignments": assignments}
+    try:
+        proofreaders = proofreader_select_list(user)
+    except InvalidUsage as err:
+        return render_template('error.html', urlroot=request.url_root,
+                               title='SQL error', message=err.message)
     protocols = protocol_select_list(result)
     response = make_response(render_template('assignmentlist.html', urlroot=request.url_root,
                                              face=face, dataset=app.config['DATASET'],
                                              navbar=generate_navbar('Assignments'),
                                              assignmentsummary=assignmentsummary,
-                                             start=initial_start, assignments=assignments,
-                                             protocols=protocols, proofreaders=proofreaders,))
+                                             start=initial_start, protocols=protocols,
+                                             proofreaders=proofreaders,))
     return response
 
 
+@app.route('/assignmentlist/data', methods=['GET'])
+def get_assignment_list_data():
+    '''
+    Get a page of the assignment list
+    Return assignments (with task counts and dispositions) one page at a time.
+     Pages are keyed on the sort column and assignment ID, so each page costs
+     the same regardless of how many assignments exist. Pass the returned
+     rest.next value as "after" to get the following page. Use format=tsv to
+     download every matching assignment.
+    ---
+    tags:
+      - Assignment
+    parameters:
+      - in: query
+        name: protocol
+        schema:
+          type: string
+        required: false
+        description: protocol(s) (comma-separated)
+      - in: query
+        name: proofreader
+        schema:
+          type: string
+        required: false
+        description: proofreader(s) (comma-separated)
+      - in: query
+        name: start_date
+        schema:
+          type: string
+        required: false
+        description: earliest creation date (YYYY-MM-DD)
+      - in: query
+        name: stop_date
+        schema:
+          type: string
+        required: false
+        description: latest creation date (YYYY-MM-DD)
+      - in: query
+        name: sort
+        schema:
+          type: string
+        required: false
+        description: sort column (proofreader, project, protocol, assignment,
+                     create_date, start_date, completion_date)
+      - in: query
+        name: order
+        schema:
+          type: string
+        required: false
+        description: asc (default) or desc
+      - in: query
+        name: after
+        schema:
+          type: string
+        required: false
+        description: cursor from the previous page
+      - in: query
+        name: page_size
+        schema:
+          type: integer
+        required: false
+        description: assignments per page (1-1000, default 100)
+      - in: query
+        name: format
+        schema:
+          type: string
+        required: false
+        description: json (default) or tsv
+    responses:
+      200:
+          description: Assignments
+      400:
+          description: Invalid arguments
+      401:
+          description: Not authorized
+    '''
+    result = initialize_result()
+    user = result['rest'].get('user')
+    if not user:
+        user, _ = check_token()
+    if not user:
+        raise InvalidUsage('You must authorize to use this endpoint', 401)
+    ipd = {key: request.args[key] for key in ['protocol', 'proofreader', 'start_date',
+                                              'stop_date'] if request.args.get(key)}
+    if not check_permission(user, ['admin', 'view']):
+        ipd['proofreader'] = user
+    sort = request.args.get('sort', 'proofreader')
+    order = request.args.get('order', 'asc').lower()
+    try:
+        page_size = int(request.args.get('page_size', 100))
+    except ValueError:
+        raise InvalidUsage("page_size must be an integer")
+    if not 1 <= page_size <= 1000:
+        raise InvalidUsage("page_size must be between 1 and 1000")
+    if request.args.get('format') == 'tsv':
+        header = ['Proofreader', 'Project', 'Protocol', 'Assignment', 'Started', 'Completed',
+                  'Task disposition', 'Task count']
+
+        def generate():
+            yield tsv_line(header)
+            cursor = None
+            while True:
+                rows, cursor = assignment_page(ipd, sort, order, cursor, 1000)
+                for row in rows:
+                    yield tsv_line([row[x] for x in
+                                    ['proofreader', 'project', 'protocol', 'assignment',
+                                     'start_date', 'completion_date', 'task_disposition',
+                                     'tasks']])
+                if not cursor:
+                    break
+
+        return stream_response(generate(), 'assignments.tsv')
+    result['data'], result['rest']['next'] = assignment_page(ipd, sort, order,
+                                                             request.args.get('after'),
+                                                             page_size)
+    result['rest']['row_count'] = len(result['data'])
+    return generate_response(result)
+
+
 @app.route('/assigntasks')
 def assign_tasks(): # pylint: disable=R0914
     ''' Assign tasks
@@ -2662,33 +3170,26 @@ def assign_tasks(): # pylint: disable=R0914
                                title='SQL error', message=sql_error(err))
     if rows:
         header = ['Protocol', 'Group', 'Project', 'Tasks', 'Priority', 'Active', 'Assignment']
-        unassigned = '''
+        unassigned = ['''
         <table id="unassigned" class="tablesorter standard">
         <tr><th>
-        '''
-        unassigned += '</th><th>'.join(header) + '</th></tr></thead><tbody>'
+        ''' + '</th><th>'.join(header) + '</th></tr></thead><tbody>']
         template = "<tr>" + ''.join("<td>%s</td>")*3 \
                    + ''.join('<td style="text-align: center">%s</td>')*4 + "</tr>"
-        fileoutput = ''
-        ftemplate = "\t".join(["%s"]*7) + "\n"
         for row in rows:
             active = "<span style='color:%s'>%s</span>" \
                      % (('lime', 'YES') if row['active'] else ('red', 'NO'))
             button = '' if not row['active'] else \
                         '<a class="btn btn-success btn-tiny" style="color:#fff" href="' \
                         + '/assignto/' + row['project'] + '" role="button">Create</a>'
-            this_protocol = app.config['PROTOCOLS'][row['protocol']]
-            unassigned += template % (this_protocol, row['project_group'],
-                                      ('<a href="/project/%s">%s</a>' % (row['project'], \
-                                       row['project'])),
-                                      row['num'], row['priority'], active, button)
-            fileoutput += ftemplate % (this_protocol, row['project_group'], row['project'],
-                                       row['num'], row['priority'], row['active'], '-')
-        unassigned += "</tbody></table>"
-        downloadable = create_downloadable('unassigned', header, ftemplate, fileoutput)
+            this_protocol = get_protocols()[row['protocol']]
+            unassigned.append(template % (this_protocol, row['project_group'],
+                                          ('<a href="/project/%s">%s</a>' % (row['project'], \
+                                           row['project'])),
+                                          row['num'], row['priority'], active, button))
+        unassigned.append("</tbody></table>")
         unassigned = '<br><h2>Projects with unassigned tasks</h2>' \
-                     + '<a class="btn btn-outline-info btn-sm" href="/download/%s" ' \
-                     % (downloadable) + 'role="button">Download table</a>' + unassigned
+                     + export_link('unassigned') + ''.join(unassigned)
     else:
         unassigned = "There are no projects with unassigned tasks"
     response = make_response(render_template('assigntasks.html', urlroot=request.url_root,
@@ -2848,7 +3349,7 @@ def show_project(pname):
         controls = controls % (project['priority'], project['name'], project['priority'])
     # Unassigned tasks
     try:
-        g.c.execute(READ['PROJECTUA'] % (pname,))
+        g.c.execute(READ['PROJECTUA'], (pname,))
         tasks = g.c.fetchone()
     except Exception as err:
         return render_template('error.html', urlroot=request.url_root,
@@ -2856,7 +3357,7 @@ def show_project(pname):
     num_unassigned = tasks['num'] if tasks else 0
     # Assigned tasks
     try:
-        g.c.execute(READ['PROJECTA'] % (pname,))
+        g.c.execute(READ['PROJECTA'], (pname,))
         tasks = g.c.fetchall()
     except Exception as err:
         return render_template('error.html', urlroot=request.url_root,
@@ -2885,6 +3386,32 @@ def show_project(pname):
                            assigned=assigned)
 
 
+def dvid_task_report(sql, name, kind):
+    ''' Stream a DVID task result report
+        Keyword arguments:
+          sql: report SQL statement
+          name: project or assignment name
+          kind: "Project" or "Assignment"
+        Returns:
+          streaming TSV response
+    '''
+    try:
+        cursor, first = open_stream(sql, (name, ))
+    except Exception as err:
+        return render_template('error.html', urlroot=request.url_root,
+                               title='SQL error', message=sql_error(err))
+    if not first:
+        cursor.close()
+        return render_template('error.html', urlroot=request.url_root,
+                               title='Not found', message="%s %s was not found" % (kind, name))
+
+    def generate():
+        yield tsv_line(['Task ID', 'Result', 'User'])
+        yield from stream_rows(cursor, first, ['id', 'result', 'user'])
+
+    return stream_response(generate())
+
+
 @app.route('/project/report/task_results/<string:name>.tsv', methods=['GET'])
 def project_report_task_results(name):
     '''
@@ -2901,21 +3428,7 @@ def project_report_task_results(name):
         required: true
         description: project name
     '''
-    try:
-        g.c.execute(READ['DVID_PROJECT_TASKS'], (name, ))
-        tasks = g.c.fetchall()
-    except Exception as err:
-        return render_template('error.html', urlroot=request.url_root,
-                               title='SQL error', message=sql_error(err))
-    if not tasks:
-        return render_template('error.html', urlroot=request.url_root,
-                               title='Not found', message="Project %s was not found" % name)
-    template = "%s\t%s\t%s\n"
-    output = template % ('Task ID', 'Result', 'User')
-    for task in tasks:
-        output += template % (task['id'], task['result'], task['user'])
-    response = Response(output, mimetype='text/tab-separated-values')
-    return response
+    return dvid_task_report(READ['DVID_PROJECT_TASKS'], name, 'Project')
 
 
 @app.route('/assignment/<string:aname>')
@@ -2949,7 +3462,7 @@ def show_assignment(aname):
                 assignment[prop] = '<a href="/project/%s">%s</a>' \
                                    % (assignment[prop], assignment[prop])
             elif prop == 'protocol':
-                assignment['protocol'] = app.config['PROTOCOLS'][assignment['protocol']]
+                assignment['protocol'] = get_protocols()[assignment['protocol']]
             aprops.append([show, assignment[prop]])
     tasks, num_tasks, tasks_started = build_task_table(aname)
     try:
@@ -2986,22 +3499,7 @@ def assignment_report_task_results(name):
         required: true
         description: assignment name
     '''
-    stmt = READ['DVID_PROJECT_TASKS'].replace('project', 'assignment')
-    try:
-        g.c.execute(stmt, (name, ))
-        tasks = g.c.fetchall()
-    except Exception as err:
-        return render_template('error.html', urlroot=request.url_root,
-                               title='SQL error', message=sql_error(err))
-    if not tasks:
-        return render_template('error.html', urlroot=request.url_root,
-                               title='Not found', message="Assignment %s was not found" % name)
-    template = "%s\t%s\t%s\n"
-    output = template % ('Task ID', 'Result', 'User')
-    for task in tasks:
-        output += template % (task['id'], task['result'], task['user'])
-    response = Response(output, mimetype='text/tab-separated-values')
-    return response
+    return dvid_task_report(READ['DVID_ASSIGNMENT_TASKS'], name, 'Assignment')
 
 
 @app.route('/task/<string:task_id>')
@@ -3032,7 +3530,7 @@ def show_task(task_id):
     task_id = task['id']
     tprops = []
     tprops.append(['Project:', '<a href="/project/%s">%s</a>' % (task['project'], task['project'])])
-    tprops.append(['Protocol:', app.config['PROTOCOLS'][task['protocol']]])
+    tprops.append(['Protocol:', get_protocols()[task['protocol']]])
     tprops.append(['Assignment:', '<a href="/assignment/%s">%s</a>' % (task['assignment'],
                                                                        task['assignment'])])
     val = neuprint_link('bodyid', task['key_text']) \
@@ -3044,19 +3542,17 @@ def show_task(task_id):
     tprops.append(['Duration:', task['duration']])
     tprops.append(['Working duration:', task['working_duration']])
     try:
-        g.c.execute("SELECT type_display,value FROM task_property_vw WHERE task_id=%s ORDER BY 1"
-                    % (task_id,))
-        props = g.c.fetchall()
-    except Exception as err:
+        props = load_task_properties([task_id], 'type_display')[task_id]
+    except InvalidUsage as err:
         return render_template('error.html', urlroot=request.url_root,
-                               title='SQL error', message=sql_error(err))
-    for prop in props:
-        if not prop['value']:
+                               title='SQL error', message=err.message)
+    for type_display in sorted(props):
+        value = props[type_display]
+        if not value:
             continue
-        val = neuprint_link('bodyid', prop['value']) \
-              if 'Body ID' in prop['type_display'] else prop['value']
-        tprops.append([prop['type_display'], val])
-        if prop['type_display'] == 'DVID user':
+        val = neuprint_link('bodyid', value) if 'Body ID' in type_display else value
+        tprops.append([type_display, val])
+        if type_display == 'DVID user':
             tprops.append(['DVID record', dvid_result_button(task['protocol'], task['key_text'])])
     # Controls
     try:
@@ -3091,7 +3587,7 @@ def project_create(protocol):
     required, optional, optionaljs, filt, filtjs = process_projectparms(projectins, protocol)
     return render_template('newproject.html', urlroot=request.url_root, face=face,
                            dataset=app.config['DATASET'], navbar=generate_navbar('Projects'),
-                           protocol=protocol, display_protocol=app.config['PROTOCOLS'][protocol],
+                           protocol=protocol, display_protocol=get_protocols()[protocol],
                            required=required, optionaljs=optionaljs, optional=optional, filt=filt,
                            filtjs=filtjs)
 
@@ -3207,7 +3703,9 @@ def stats():
                            "endpoint_counts": app.config['ENDPOINTS'],
                            "user_counts": app.config['USERS'],
                            "time_since_last_transaction": tbt,
-                           "database_connection": db_connection}
+                           "database_connection": db_connection,
+                           "database_pool": POOL.report(),
+                           "kafka": PUBLISHER.report() if PUBLISHER else None}
         if None in result['stats']['endpoint_counts']:
             del result['stats']['endpoint_counts']
     except Exception as err:
@@ -3541,10 +4039,11 @@ def add_cv(): # pragma: no cover
             result['rest']['row_count'] = g.c.rowcount
             result['rest']['inserted_id'] = g.c.lastrowid
             result['rest']['sql_statement'] = g.c.mogrify(WRITE['INSERT_CV'], bind)
-            g.db.commit()
             publish_cdc(result, {"table": "cv", "operation": "insert"})
+            g.db.commit()
         except Exception as err:
             raise InvalidUsage(sql_error(err), 500)
+        cv_term_cache.invalidate()
     return generate_response(result)
 
 
@@ -3719,8 +4218,10 @@ def add_cv_term(): # pragma: no cover
             result['rest']['inserted_id'] = g.c.lastrowid
             result['rest']['sql_statement'] = g.c.mogrify(WRITE['INSERT_CVTERM'], bind)
             publish_cdc(result, {"table": "cv_term", "operation": "insert"})
+            g.db.commit()
         except Exception as err:
             raise InvalidUsage(sql_error(err), 500)
+        cv_term_cache.invalidate()
     return generate_response(result)
 
 
@@ -3786,6 +4287,7 @@ def reload_protocol(protocol):
         raise InvalidUsage("Protocol %s is not loaded" % protocol)
     modobj = import_module(protocol)
     reload(modobj)
+    cv_term_cache.invalidate()
     return generate_response(result)
 
 
@@ -4347,7 +4849,9 @@ def get_assignment_info():
      supported. Wildcards are supported (use "*"). Specific columns from the
      assignment_vw table can be returned with the _columns key. The returned
      list may be ordered by specifying a column with the _sort key. In both
-     cases, multiple columns would be separated by a comma.
+     cases, multiple columns would be separated by a comma. Results may be
+     limited (_limit, _offset), paged (_page_size, _after) or streamed
+     (_format=ndjson) as for /tasks.
     ---
     tags:
       - Assignment
@@ -4358,7 +4862,7 @@ def get_assignment_info():
           description: Assignments not found
     '''
     result = initialize_result()
-    execute_sql(result, 'SELECT * FROM assignment_vw', 'data')
+    execute_sql(result, 'SELECT * FROM assignment_vw', 'data', stream=True)
     return generate_response(result)
 
 
@@ -4888,7 +5392,7 @@ def reassign_assignment_by_id(assignment_id): # pragma: no cover
         raise InvalidUsage(sql_error(err), 500)
     audit_list = []
     for task in rows:
-        bind = (task['id'], task['project_id'], assignment_id, task['key_type'],
+        bind = (task['id'], task['project_id'], assignment_id, task['key_type_id'],
                 task['key_text'], 'Reassigned', ('Reassigned to %s' % ipd['user']), task['user'])
         audit_list.append(bind)
     try:
@@ -4987,6 +5491,7 @@ def delete_assignment(assignment_id):
     assignment_id = assignment['id']
     tasks = get_tasks_by_assignment_id(assignment_id)
     del_assignment = True
+    unassigned = []
     for task in tasks:
         if task['start_date']:
             del_assignment = False
@@ -4996,11 +5501,18 @@ def delete_assignment(assignment_id):
             bind = (task['id'])
             g.c.execute(stmt, bind)
             result['rest']['row_count'] += g.c.rowcount
-            bind = (task['id'], task['project_id'], assignment_id, task['key_type'],
+            if g.c.rowcount:
+                unassigned.append(task)
+            bind = (task['id'], task['project_id'], assignment_id, task['key_type_id'],
                     task['key_text'], 'Unassigned', None, task['user'])
             g.c.execute(WRITE['TASK_AUDIT'], bind)
         except Exception as err:
             raise InvalidUsage(sql_error(err), 500)
+    try:
+        move_tasks(g.c, unassigned, assignment_id=None)
+        refresh_assignment_stats(g.c, [assignment_id])
+    except Exception as err:
+        raise InvalidUsage(sql_error(err), 500)
     if del_assignment:
         try:
             stmt = "DELETE from assignment WHERE id=%s"
@@ -5014,6 +5526,101 @@ def delete_assignment(assignment_id):
     return generate_response(result)
 
 
+# *****************************************************************************
+# * Job endpoints                                                             *
+# *****************************************************************************
+@app.route('/jobs', methods=['GET'])
+def get_job_info():
+    '''
+    Get background job information (with filtering)
+    Return a list of background jobs (rows from the job table, without
+     payloads). The caller can filter on any of the columns in the job table.
+     Inequalities (!=) and some relational operations (&lt;= and &gt;=) are
+     supported. Wildcards are supported (use "*"). The returned list may be
+     ordered by specifying a column with the _sort key.
+    ---
+    tags:
+      - Job
+    responses:
+      200:
+          description: List of information for one or more jobs
+      404:
+          description: Jobs not found
+    '''
+    result = initialize_result()
+    execute_sql(result, READ['JOBS'], 'data')
+    return generate_response(result)
+
+
+@app.route('/jobs/<string:job_id>', methods=['GET'])
+def get_job_by_id(job_id):
+    '''
+    Get background job status
+    Return the status, progress and number of rows inserted for a job.
+    ---
+    tags:
+      - Job
+    parameters:
+      - in: path
+        name: job_id
+        schema:
+          type: string
+        required: true
+        description: job ID
+    responses:
+      200:
+          description: Information for one job
+      404:
+          description: Job ID not found
+    '''
+    result = initialize_result()
+    try:
+        g.c.execute(READ['JOBS'] + " WHERE id=%s", (job_id,))
+        job = g.c.fetchone()
+    except Exception as err:
+        raise InvalidUsage(sql_error(err), 500)
+    if not job:
+        raise InvalidUsage("Job %s was not found" % job_id, 404)
+    if job['result']:
+        job['result'] = json.loads(job['result'])
+    result['rest']['row_count'] = 1
+    result['data'] = job
+    return generate_response(result)
+
+
+@app.route('/jobs/<string:job_id>/retry', methods=['OPTIONS', 'POST'])
+def retry_job_by_id(job_id): # pragma: no cover
+    '''
+    Retry a failed background job
+    Requeue a job that has failed all of its attempts.
+    ---
+    tags:
+      - Job
+    parameters:
+      - in: path
+        name: job_id
+        schema:
+          type: string
+        required: true
+        description: job ID
+    responses:
+      200:
+          description: Job requeued
+      400:
+          description: Job is not a failed background job
+    '''
+    result = initialize_result()
+    try:
+        result['rest']['row_count'] = retry_job(job_id, list(JOBS.handlers))
+    except Exception as err:
+        raise InvalidUsage(sql_error(err), 500)
+    if not result['rest']['row_count']:
+        raise InvalidUsage("Job %s was not found, has not failed, or can't be retried "
+                           % job_id + "(resume streamed uploads instead)")
+    g.db.commit()
+    return generate_response(result)
+
+
 # *****************************************************************************
 # * Task endpoints                                                            *
 # *****************************************************************************
@@ -5128,12 +5735,13 @@ def new_tasks_for_project(protocol, project_name, assignment_name=None):
     # Create the tasks
     background = len(ipd['tasks']) > app.config['FOREGROUND_TASK_LIMIT']
     if background:
+        payload = {'ipd': ipd, 'project_id': project['id'], 'key_type': projectins.unit,
+                   'task_insert_props': projectins.task_insert_props,
+                   'assignment_id': assignment_id, 'user': this_user}
+        result['rest']['job_id'] = submit_job('create_tasks_from_json', payload,
+                                              result['rest']['user'], len(ipd['tasks']))
         g.db.commit()
-        pro = Process(target=create_tasks_from_json,
-                      args=(ipd, project['id'], projectins.unit, projectins.task_insert_props,
-                            assignment_id, result, this_user))
-        print("Starting create_tasks_from_json in background")
-        pro.start()
+        print("Queued create_tasks_from_json as job %s" % result['rest']['job_id'])
         result['rest']['tasks_inserted'] = -1
     else:
         create_tasks_from_json(ipd, project['id'], projectins.unit,
@@ -5141,6 +5749,156 @@ def new_tasks_for_project(protocol, project_name, assignment_name=None):
     return generate_response(result)
 
 
+@app.route('/tasks/stream/<string:protocol>/<string:project_name>', methods=['OPTIONS', 'POST'])
+@app.route('/tasks/stream/<string:protocol>/<string:project_name>/<string:assignment_name>',
+           methods=['OPTIONS', 'POST'])
+def stream_tasks_for_project(protocol, project_name, assignment_name=None): # pylint: disable=R0912,R0914,R0915
+    '''
+    Stream new tasks for a new or existing project
+    The request body is newline-delimited JSON (one task per line), so task
+     lists of any size can be uploaded without splitting them. For protocols
+     that upload a task list (focused_merge, cell_type_validation) or points
+     (todo, connection_validation), each line is one list element. For other
+     protocols, each line is a dictionary of {key text: task properties}.
+     Project-level parameters (note, group, source, body_id, etc.) are passed
+     on the query string. Tasks are inserted and committed in batches, and
+     progress is recorded as a job. If an upload is interrupted, send the
+     same body again with resume=<job ID> to continue after the last
+     committed batch.
+    ---
+    tags:
+      - Task
+    parameters:
+      - in: path
+        name: protocol
+        schema:
+          type: string
+        required: true
+        description: protocol
+      - in: path
+        name: project_name
+        schema:
+          type: string
+        required: true
+        description: project name (or ID)
+      - in: query
+        name: batch_size
+        schema:
+          type: integer
+        required: false
+        description: number of tasks per committed batch (1-10000, default 1000)
+      - in: query
+        name: resume
+        schema:
+          type: string
+        required: false
+        description: job ID of an interrupted upload to resume (only the user
+                     who started it can resume it, to the same project and
+                     assignment)
+    responses:
+      200:
+          description: Tasks generated
+      400:
+          description: Tasks not generated (see job for committed progress)
+    '''
+    result = initialize_result()
+    ipd = request.args.to_dict()
+    try:
+        batch_size = int(ipd.pop('batch_size', 1000))
+    except ValueError:
+        raise InvalidUsage("batch_size must be an integer")
+    if not 1 <= batch_size <= 10000:
+        raise InvalidUsage("batch_size must be between 1 and 10000")
+    resume = ipd.pop('resume', None)
+    if not valid_cv_term('protocol', protocol):
+        raise InvalidUsage("%s is not a valid protocol" % protocol)
+    projectins = globals()[protocol.capitalize()]()
+    if resume:
+        job = get_job(resume)
+        if not job or job['job_type'] != 'stream_tasks' \
+           or job['status'] not in ('streaming', 'failed'):
+            raise InvalidUsage("Job %s is not a resumable task upload" % resume)
+        if job['user'] != result['rest']['user']:
+            raise InvalidUsage("Job %s can only be resumed by %s" % (resume, job['user']), 403)
+        if job['payload']['protocol'] != protocol:
+            raise InvalidUsage("Job %s was not a %s upload" % (resume, protocol))
+        project = get_project_by_name_or_id(project_name)
+        if not project or project['id'] != job['payload']['project_id']:
+            raise InvalidUsage("Job %s was not an upload to project %s" % (resume, project_name))
+        assignment = get_assignment_by_name_or_id(assignment_name) if assignment_name else None
+        if (assignment['id'] if assignment else None) != job['payload']['assignment_id']:
+            raise InvalidUsage("Job %s was not an upload to %s" \
+                               % (resume, "assignment " + assignment_name if assignment_name
+                                  else "an unassigned project"))
+        job_id = job['id']
+    else:
+        ipd['protocol'] = protocol
+        ipd['project_name'] = project_name
+        project = get_project_by_name_or_id(project_name)
+        if project:
+            if project['protocol'] != protocol:
+                raise InvalidUsage("Additional tasks for an existing project " \
+                                   + "must be in the same protocol")
+        else:
+            ipd['priority'] = ipd['priority'] if 'priority' in ipd else 10
+            insert_project(ipd, result)
+            project = {'id': result['rest']['inserted_id'], 'protocol': protocol}
+        for parm in projectins.optional_properties:
+            if parm in ipd:
+                update_property(project['id'], 'project', parm, ipd[parm])
+                result['rest']['row_count'] += g.c.rowcount
+        assignment_id = None
+        if assignment_name:
+            assignment_id, this_user = create_assignment_from_tasks(project, assignment_name,
+                                                                    ipd, result)
+        else:
+            this_user = result['rest']['user']
+        payload = {'protocol': protocol, 'project_id': project['id'],
+                   'assignment_id': assignment_id, 'user': this_user, 'ipd': ipd}
+        try:
+            job_id = start_stream_job('stream_tasks', payload, result['rest']['user'])
+            job = get_job(job_id)
+        except Exception as err:
+            raise InvalidUsage(sql_error(err), 500)
+        g.db.commit()
+    result['rest']['job_id'] = job_id
+    committed = skip = job['progress']
+    inserted = job['rows_inserted']
+    lines = []
+    try:
+        for line in iter(request.stream.readline, b''):
+            if not line.strip():
+                continue
+            if skip:
+                skip -= 1
+                continue
+            try:
+                lines.append(json.loads(line))
+            except ValueError:
+                raise InvalidUsage("Invalid JSON on line %d" % (committed + len(lines) + 1))
+            if len(lines) >= batch_size:
+                inserted += insert_task_batch(projectins, job, lines, result)
+                record_stream_progress(job_id, committed + len(lines), inserted)
+                g.db.commit()
+                committed += len(lines)
+                lines = []
+        if lines:
+            inserted += insert_task_batch(projectins, job, lines, result)
+            record_stream_progress(job_id, committed + len(lines), inserted)
+            g.db.commit()
+            committed += len(lines)
+    except Exception as err:
+        g.db.rollback()
+        message = err.message if isinstance(err, InvalidUsage) else sql_error(err)
+        end_stream_job(job_id, "%s (after %d committed records)" % (message, committed))
+        raise InvalidUsage("%s. Committed %d records; resume with job %s" \
+                           % (message, committed, job_id))
+    end_stream_job(job_id)
+    result['rest']['records_processed'] = committed
+    result['rest']['tasks_inserted'] = inserted
+    return generate_response(result)
+
+
 @app.route('/task/properties/<string:task_id>', methods=['OPTIONS', 'POST'])
 def update_task_property(task_id):
     '''
@@ -5284,9 +6042,7 @@ def get_tasks_by_id(task_id):
           description: Task ID not found
     '''
     result = initialize_result()
-    execute_sql(result, 'SELECT * FROM task_vw', 'temp', task_id)
-    get_task_properties(result)
-    del result['temp']
+    execute_sql(result, 'SELECT * FROM task_vw', 'data', task_id, get_task_properties)
     return generate_response(result)
 
 
@@ -5300,7 +6056,11 @@ def get_task_info():
      supported. Wildcards are supported (use "*"). Specific columns from the
      task_vw table can be returned with the _columns key. The returned
      list may be ordered by specifying a column with the _sort key. In both
-     cases, multiple columns would be separated by a comma.
+     cases, multiple columns would be separated by a comma. The number of
+     rows may be limited with _limit (and _offset). Large results should be
+     paged with _page_size: pages are ordered by id, and the "next" value
+     in the response is passed as _after to get the following page. Use
+     _format=ndjson to stream rows as newline-delimited JSON.
     ---
     tags:
       - Task
@@ -5311,9 +6071,8 @@ def get_task_info():
           description: Tasks not found
     '''
     result = initialize_result()
-    execute_sql(result, 'SELECT * FROM task_vw', 'temp')
-    get_task_properties(result)
-    del result['temp']
+    execute_sql(result, 'SELECT * FROM task_vw', 'data', rows_hook=get_task_properties,
+                stream=True)
     return generate_response(result)
 
 
@@ -5423,7 +6182,8 @@ def run_search():
         schema:
           type: string
         required: true
-        description: key text
+        description: key text (a full multibody or body_xyz key finds tasks
+                     with all of its IDs)
     responses:
       200:
           description: Task table
@@ -5434,18 +6194,13 @@ def run_search():
     ipd = receive_payload(result)
     check_missing_parms(ipd, ['key_type', 'key_text'])
     if ipd['key_type'] == 'task_id':
-        sql = 'SELECT id,protocol,project,assignment,key_type_display,key_text ' \
-              + 'FROM task_vw WHERE id=%s'
+        sql = task_keys.READ['SEARCH_ID']
         bind = (ipd['key_text'], )
+    elif ipd['key_type'] in ('body', 'xyz'):
+        # Body IDs and coordinates are looked up in the task key index
+        sql, bind = task_keys.search_sql(ipd['key_type'], ipd['key_text'])
     else:
-        prefix = 'SELECT id,protocol,project,assignment,key_type_display,key_text ' \
-                 + 'FROM task_vw WHERE key_text=%s'
-        if ipd['key_type'] == 'body':
-            sql = prefix + " OR key_text LIKE %s OR key_text LIKE %s"
-            bind = (ipd['key_text'], ipd['key_text'] + '_%', '%_' + ipd['key_text'])
-        elif ipd['key_type'] == 'xyz':
-            sql = prefix
-            bind = (ipd['key_text'])
+        raise InvalidUsage("key_type must be task_id, body or xyz")
     sql += ' ORDER BY 2,3,4,6'
     result['data'] = 'No tasks found'
     try:
@@ -5469,12 +6224,75 @@ def run_search():
             plink = '<a href="/project/%s">%s</a>' % tuple([row['project']] * 2)
             alink = '<a href="/assignment/%s">%s</a>' % tuple([row['assignment']] * 2) \
                     if row['assignment'] else ''
-            result['data'] += template % (tlink, app.config['PROTOCOLS'][row['protocol']],
+            result['data'] += template % (tlink, get_protocols()[row['protocol']],
                                           plink, alink, row['key_type_display'], row['key_text'])
         result['data'] += '</tbody></table>'
     return generate_response(result)
 
 
+@app.route('/search_tasks', methods=['OPTIONS', 'POST'])
+def search_tasks():
+    '''
+    Search tasks for a list of keys
+    Find the tasks for a list of body IDs (or coordinates) in one request.
+     Results are grouped by key; keys with no tasks are omitted. Each task
+     has its ID, protocol, project, assignment and disposition.
+    ---
+    tags:
+      - Task
+    parameters:
+      - in: query
+        name: key_type
+        schema:
+          type: string
+        required: true
+        description: key type (body or xyz)
+      - in: query
+        name: keys
+        schema:
+          type: list
+        required: true
+        description: list of body IDs or coordinates (x_y_z)
+      - in: query
+        name: incomplete
+        schema:
+          type: boolean
+        required: false
+        description: only return tasks that haven't been completed
+    responses:
+      200:
+          description: Tasks grouped by key
+      400:
+          description: Invalid key type or key list
+    '''
+    result = initialize_result()
+    ipd = receive_payload(result)
+    check_missing_parms(ipd, ['key_type', 'keys'])
+    if ipd['key_type'] not in ('body', 'xyz'):
+        raise InvalidUsage("key_type must be body or xyz")
+    if not isinstance(ipd['keys'], list):
+        raise InvalidUsage("keys must be a list")
+    if len(ipd['keys']) > app.config['SEARCH_KEY_LIMIT']:
+        raise InvalidUsage("At most %d keys may be searched at once"
+                           % (app.config['SEARCH_KEY_LIMIT']))
+    composite = [key for key in ipd['keys']
+                 if len(task_keys.search_components(ipd['key_type'], key)) > 1]
+    if composite:
+        raise InvalidUsage("keys must be single body IDs or coordinates (search for %s "
+                           % (composite[0]) + "with /run_search)")
+    values = list(dict.fromkeys([task_keys.search_value(ipd['key_type'], key)
+                                 for key in ipd['keys']]))
+    try:
+        result['data'] = task_keys.search_keys(g.c, ipd['key_type'], values,
+                                               bool(ipd.get('incomplete')))
+    except Exception as err:
+        raise InvalidUsage(sql_error(err), 500)
+    result['rest']['keys_searched'] = len(values)
+    result['rest']['keys_found'] = len(result['data'])
+    result['rest']['row_count'] = sum([len(tasks) for tasks in result['data'].values()])
+    return generate_response(result)
+
+
 @app.route('/task_audits/columns', methods=['GET'])
 def get_task_audit_columns():
     '''
@@ -5503,7 +6321,11 @@ def get_task_audit_info():
      supported. Wildcards are supported (use "*"). Specific columns from the
      task_vw table can be returned with the _columns key. The returned
      list may be ordered by specifying a column with the _sort key. In both
-     cases, multiple columns would be separated by a comma.
+     cases, multiple columns would be separated by a comma. The number of
+     rows may be limited with _limit (and _offset). Large results should be
+     paged with _page_size: pages are ordered by id, and the "next" value
+     in the response is passed as _after to get the following page. Use
+     _format=ndjson to stream rows as newline-delimited JSON.
     ---
     tags:
       - Task
@@ -5514,9 +6336,8 @@ def get_task_audit_info():
           description: Tasks not found
     '''
     result = initialize_result()
-    execute_sql(result, 'SELECT * FROM task_audit_vw', 'temp')
-    get_task_properties(result)
-    del result['temp']
+    execute_sql(result, 'SELECT * FROM task_audit_vw', 'data',
+                rows_hook=get_audit_task_properties, stream=True)
     return generate_response(result)
 
 
@@ -5722,8 +6543,9 @@ def add_user(): # pragma: no cover
     if 'permissions' in ipd and type(ipd['permissions']).__name__ == 'list':
         add_user_permissions(result, ipd['name'], ipd['permissions'])
     print("Added user " + ipd['janelia_id'])
-    g.db.commit()
     publish_cdc(result, {"table": "user", "operation": "insert"})
+    g.db.commit()
+    invalidate_permissions(ipd['name'])
     return generate_response(result)
 
 
@@ -5763,6 +6585,7 @@ def add_user_permission(): # pragma: no cover
     result['rest']['row_count'] = 0
     add_user_permissions(result, ipd['name'], ipd['permissions'])
     g.db.commit()
+    invalidate_permissions(ipd['name'])
     return generate_response(result)
 
 
@@ -5811,6 +6634,7 @@ def delete_user_permission(): # pragma: no cover
         except Exception as err:
             raise InvalidUsage(sql_error(err), 500)
     g.db.commit()
+    invalidate_permissions(ipd['name'])
     return generate_response(result)
 
 
@@ -0,0 +1,87 @@
+''' assignment_stats.py
+    Maintain the assignment_stats table (task counts and dispositions for
+    each assignment). Rows are refreshed for the affected assignments
+    whenever tasks are assigned, unassigned, started or completed; run this
+    file to rebuild the whole table.
+'''
+
+import argparse
+import os
+import sys
+import colorlog
+from flask import Config
+from db_pool import connect
+
+LOGGER = colorlog.getLogger()
+READ = {'ASSIGNMENT_IDS': "SELECT id FROM assignment WHERE id>%s ORDER BY id LIMIT %s"}
+WRITE = {
+    'DELETE_STATS': "DELETE FROM assignment_stats WHERE assignment_id IN (%s)",
+    'INSERT_STATS': "INSERT INTO assignment_stats (assignment_id,tasks,started,completed,"
+                    + "task_disposition) SELECT assignment_id,COUNT(1),COUNT(start_date),"
+                    + "COUNT(completion_date),GROUP_CONCAT(DISTINCT IFNULL(disposition,'NULL')) "
+                    + "FROM task WHERE assignment_id IN (%s) GROUP BY assignment_id",
+}
+
+
+def refresh_assignment_stats(cursor, assignment_ids):
+    ''' Recompute the statistics for assignments. Only the tasks for these
+        assignments are read (task.assignment_id is indexed). The caller
+        commits, so the statistics change with the tasks.
+        Keyword arguments:
+          cursor: database cursor
+          assignment_ids: list of assignment IDs
+    '''
+    assignment_ids = [aid for aid in set(assignment_ids) if aid]
+    if not assignment_ids:
+        return
+    placeholders = ','.join(['%s'] * len(assignment_ids))
+    cursor.execute(WRITE['DELETE_STATS'] % placeholders, assignment_ids)
+    cursor.execute(WRITE['INSERT_STATS'] % placeholders, assignment_ids)
+
+
+def rebuild_assignment_stats(conn, batch=1000):
+    ''' Recompute the statistics for every assignment, committing after each
+        batch of assignments
+        Keyword arguments:
+          conn: database connection
+          batch: assignments per transaction
+        Returns:
+          number of assignments processed
+    '''
+    cursor = conn.cursor()
+    last_id = 0
+    count = 0
+    while True:
+        cursor.execute(READ['ASSIGNMENT_IDS'], (last_id, batch))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        refresh_assignment_stats(cursor, [row['id'] for row in rows])
+        conn.commit()
+        last_id = rows[-1]['id']
+        count += len(rows)
+        LOGGER.info("Assignments processed: %d", count)
+    return count
+
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description='Rebuild the assignment_stats table')
+    PARSER.add_argument('--batch', dest='batch', action='store', type=int, default=1000,
+                        help='Assignments per transaction (optional, default=1000)')
+    PARSER.add_argument('--verbose', action='store_true', dest='verbose',
+                        default=False, help='Turn on verbose output')
+    ARG = PARSER.parse_args()
+    LOGGER.setLevel(colorlog.colorlog.logging.INFO if ARG.verbose
+                    else colorlog.colorlog.logging.WARNING)
+    HANDLER = colorlog.StreamHandler()
+    HANDLER.setFormatter(colorlog.ColoredFormatter())
+    LOGGER.addHandler(HANDLER)
+    CONFIG = Config(os.path.dirname(os.path.abspath(__file__)))
+    CONFIG.from_pyfile('config.cfg')
+    try:
+        TOTAL = rebuild_assignment_stats(connect(CONFIG), ARG.batch)
+    except KeyboardInterrupt:
+        sys.exit(0)
+    print("Rebuilt statistics for %d assignments" % TOTAL)
@@ -2,7 +2,6 @@
     Assignment manager utilities
 '''
 
-import datetime
 import json
 import random
 import re
@@ -11,13 +10,33 @@ import time
 from urllib.parse import parse_qs
 from flask import g
 import requests
-import holidays as pyholidays
-import pandas as pd
-from business_duration import businessDuration
+import business_hours
+import cv_term_cache
 
 BEARER = ''
 CONFIG = {'config': {"url": "http://config.int.janelia.org/"}}
-KEY_TYPE_IDS = dict()
+# Permissions are cached per user (name -> (load time, permission list))
+PERMISSION_TTL = 60
+PERMISSIONS = dict()
+# Lean, index-backed task lookups (task_vw joins several more tables)
+READ = {
+    'TASK': "SELECT t.*,pp.name AS protocol FROM task t JOIN project p ON (p.id=t.project_id) "
+            + "LEFT OUTER JOIN cv_term pp ON (pp.id=p.protocol_id) WHERE t.id=%s",
+    'TASK_BY_KEY': "SELECT id FROM task WHERE project_id=%s AND key_type_id=%s AND key_text=%s",
+    'TASK_PROPERTIES': "SELECT tp.task_id,cv.name AS type,cv.display_name AS type_display,"
+                       + "tp.value FROM task_property tp JOIN cv_term cv ON (cv.id=tp.type_id) "
+                       + "WHERE tp.task_id IN (%s)",
+    'ASSIGNMENT_TASKS': "SELECT t.id,cv.name AS key_type,t.key_text FROM task t JOIN assignment a "
+                        + "ON (a.id=t.assignment_id) JOIN cv_term cv ON (cv.id=t.key_type_id) "
+                        + "WHERE a.name=%s ORDER BY t.id",
+}
+# Task IDs per task property query
+PROPERTY_BATCH = 1000
+# Largest page (_page_size) for generic queries
+MAX_PAGE_SIZE = 10000
+# Task properties returned as numbers or JSON in task lists
+INT_PROPERTIES = ['body ID A', 'body ID B', 'supervoxel ID 1', 'supervoxel ID 2']
+JSON_PROPERTIES = ['supervoxel point 1', 'supervoxel point 2', 'body point 1', 'body point 2']
 
 # *****************************************************************************
 # * Classes                                                                   *
@@ -103,32 +122,61 @@ def call_responder(server, endpoint, payload=''):
     raise InvalidUsage(req.text, req.status_code)
 
 
+def get_permissions(user):
+    ''' Get a user's permissions. Permissions are read once per request, and
+        are shared between requests for PERMISSION_TTL seconds.
+        Keyword arguments:
+          user: user name
+        Returns:
+          list of permissions
+    '''
+    if 'permissions' not in g:
+        g.permissions = dict()
+    if user in g.permissions:
+        return g.permissions[user]
+    cached = PERMISSIONS.get(user)
+    if cached and time.time() - cached[0] < PERMISSION_TTL:
+        g.permissions[user] = cached[1]
+        return cached[1]
+    stmt = "SELECT permission FROM user_permission_vw WHERE name=%s"
+    try:
+        g.c.execute(stmt, (user,))
+        rows = g.c.fetchall()
+    except Exception as err:
+        raise InvalidUsage(sql_error(err), 500)
+    perm = [row['permission'] for row in rows]
+    PERMISSIONS[user] = (time.time(), perm)
+    g.permissions[user] = perm
+    return perm
+
+
+def invalidate_permissions(user=None):
+    ''' Discard cached permissions
+        Keyword arguments:
+          user: user name (None=all users)
+    '''
+    if user:
+        PERMISSIONS.pop(user, None)
+        if 'permissions' in g:
+            g.permissions.pop(user, None)
+    else:
+        PERMISSIONS.clear()
+        g.pop('permissions', None)
+
+
 def check_permission(user, permission=None):
     ''' Validate that a user has a specified permission
         Keyword arguments:
           user: user name
           permission: single permission or list of permissions
     '''
+    perm = get_permissions(user)
     if not permission:
-        stmt = "SELECT * FROM user_permission_vw WHERE name=%s"
-        try:
-            g.c.execute(stmt, (user))
-            rows = g.c.fetchall()
-        except Exception as err:
-            raise InvalidUsage(sql_error(err), 500)
-        perm = [row['permission'] for row in rows]
-        return perm
+        return list(perm)
     if type(permission).__name__ == 'str':
         permission = [permission]
-    stmt = "SELECT * FROM user_permission_vw WHERE name=%s AND permission=%s"
     for per in permission:
-        bind = (user, per)
-        try:
-            g.c.execute(stmt, bind)
-            row = g.c.fetchone()
-        except Exception as err:
-            raise InvalidUsage(sql_error(err), 500)
-        if row:
+        if per in perm:
             return 1
     return 0
 
@@ -145,39 +193,93 @@ def check_project(project, ipd):
         raise InvalidUsage("Project %s is not active" % project['name'])
 
 
-def generate_sql(request, result, sql, query=False):
+def paging_value(ipd, key):
+    ''' Get a non-negative integer paging parameter
+        Keyword arguments:
+          ipd: parsed query string
+          key: parameter
+        Returns:
+          integer value (None if not specified)
+    '''
+    if key not in ipd:
+        return None
+    val = ipd[key][0]
+    if not isinstance(val, str):
+        val = val.decode('utf-8')
+    if not val.isdigit():
+        raise InvalidUsage("%s must be a non-negative integer" % (key))
+    return int(val)
+
+
+def generate_sql(request, result, sql, query=False, after=None, page_size=None):
     ''' Generate a SQL statement and tuple of associated bind variables.
+        Results may be limited with _limit (and _offset), or paged by ID
+        with _page_size and _after (the "next" value from the previous page).
+        A paged query selects one extra row so the caller can tell if there
+        is another page.
         Keyword arguments:
           request: API request
           result: result dictionary
           sql: base SQL statement
           query: uses "id" column if true
+          after: ID to start after (overrides _after)
+          page_size: page size (overrides _page_size)
     '''
     bind = ()
     # pylint: disable=W0603
     idcolumn = 0
     query_string = 'id='+str(query) if query else request.query_string
     order = ''
+    columns = False
+    paging = dict()
+    separator = ' AND' if ' WHERE ' in sql else ' WHERE'
     if query_string:
         if not isinstance(query_string, str):
             query_string = query_string.decode('utf-8')
         ipd = parse_qs(query_string)
-        separator = ' AND' if ' WHERE ' in sql else ' WHERE'
+        for key in ['_limit', '_offset', '_page_size', '_after']:
+            paging[key] = paging_value(ipd, key)
         for key, val in ipd.items():
             if key == '_sort':
                 order = ' ORDER BY ' + val[0]
             elif key == '_columns':
                 sql = sql.replace('*', val[0])
+                columns = True
                 varr = val[0].split(',')
                 if 'id' in varr:
                     idcolumn = 1
             elif key == '_distinct':
                 if 'DISTINCT' not in sql:
                     sql = sql.replace('SELECT', 'SELECT DISTINCT')
+            elif key in paging or key in ('_format', '_verbose'):
+                continue
             else:
                 sql, bind = add_key_value_pair(key, val, separator, sql, bind)
                 separator = ' AND'
-    sql += order
+    if after is None:
+        after = paging.get('_after')
+    if page_size is None:
+        page_size = paging.get('_page_size')
+        if after is not None and page_size is None:
+            page_size = MAX_PAGE_SIZE
+    if page_size is not None:
+        if order or ' ORDER BY ' in sql:
+            raise InvalidUsage("_sort can't be used with _page_size or _after (pages are "
+                               + "ordered by id)")
+        if columns and not idcolumn:
+            raise InvalidUsage("_columns must include id when using _page_size or _after")
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        if after is not None:
+            sql += separator + ' id>%s'
+            bind = bind + (after,)
+        sql += ' ORDER BY id LIMIT %d' % (page_size + 1)
+        result['rest']['page_size'] = page_size
+    else:
+        sql += order
+        if paging.get('_limit') is not None:
+            sql += ' LIMIT %d' % (paging['_limit'])
+            if paging.get('_offset'):
+                sql += ' OFFSET %d' % (paging['_offset'])
     if bind:
         result['rest']['sql_statement'] = sql % bind
     else:
@@ -201,22 +303,6 @@ def get_assignment_by_name_or_id(aid):
     return assignment
 
 
-def get_key_type_id(key_type):
-    ''' Determine the ID for a key type
-        Keyword arguments:
-          key_type: key type
-    '''
-    if key_type not in KEY_TYPE_IDS:
-        try:
-            g.c.execute("SELECT id,cv_term FROM cv_term_vw WHERE cv='key'")
-            cv_terms = g.c.fetchall()
-        except Exception as err:
-            raise InvalidUsage(sql_error(err), 500)
-        for term in cv_terms:
-            KEY_TYPE_IDS[term['cv_term']] = term['id']
-    return KEY_TYPE_IDS[key_type]
-
-
 def get_project_by_name_or_id(proj):
     ''' Get a project by name or ID
         Keyword arguments:
@@ -247,18 +333,41 @@ def get_tasks_by_assignment_id(aid):
 
 
 def get_task_by_id(tid):
-    ''' Get a task by ID
+    ''' Get a task by ID (columns from the task table, plus protocol)
         Keyword arguments:
           tid: task ID
     '''
     try:
-        g.c.execute("SELECT * FROM task_vw WHERE id=%s", (tid))
+        g.c.execute(READ['TASK'], (tid,))
         task = g.c.fetchone()
     except Exception as err:
         raise InvalidUsage(sql_error(err), 500)
     return task
 
 
+def load_task_properties(task_ids, key='type'):
+    ''' Get the properties for a set of tasks. Properties are read with one
+        query per PROPERTY_BATCH tasks (task_property.task_id is indexed).
+        Keyword arguments:
+          task_ids: list of task IDs
+          key: property name column (type or type_display)
+        Returns:
+          dictionary of task ID -> {property: value}
+    '''
+    task_ids = list(dict.fromkeys(tid for tid in task_ids if tid))
+    properties = {tid: dict() for tid in task_ids}
+    for idx in range(0, len(task_ids), PROPERTY_BATCH):
+        batch = task_ids[idx:idx + PROPERTY_BATCH]
+        try:
+            g.c.execute(READ['TASK_PROPERTIES'] % ','.join(['%s'] * len(batch)), batch)
+            rows = g.c.fetchall()
+        except Exception as err:
+            raise InvalidUsage(sql_error(err), 500)
+        for row in rows:
+            properties[row['task_id']][row[key]] = row['value']
+    return properties
+
+
 def get_user_by_name(uname):
     ''' Given a user name, return the user record
         Keyword arguments:
@@ -317,38 +426,26 @@ def return_tasks_json(assignment, result):
     '''
     # pylint: disable=W0703
     result['task list'] = list()
-    sql = 'SELECT t.id AS task_id,type,value,key_type,key_text FROM task_vw t ' \
-          + 'LEFT OUTER JOIN task_property_vw tp ON (t.id=tp.task_id) WHERE ' \
-          + 't.assignment=%s'
     try:
-        g.c.execute(sql, (assignment,))
-        taskprops = g.c.fetchall()
+        g.c.execute(READ['ASSIGNMENT_TASKS'], (assignment,))
+        tasks = g.c.fetchall()
+        properties = load_task_properties([row['id'] for row in tasks])
+    except InvalidUsage as err:
+        return err.message
     except Exception as err:
         return sql_error(err)
-    this_task = ''
-    task = {}
-    task_count = 0
-    for tps in taskprops:
-        if this_task != tps['task_id']:
-            if this_task:
-                result['task list'].append(task)
-            this_task = tps['task_id']
-            task = {"assignment_manager_task_id": this_task,
-                    tps['key_type']: tps['key_text']}
-            task_count += 1
-        if tps['type']:
-            if tps['type'] in ['body ID A', 'body ID B', 'supervoxel ID 1', 'supervoxel ID 2']:
-                task[tps['type']] = int(tps['value'])
-            elif tps['type'] in ['supervoxel point 1', 'supervoxel point 2',
-                                 'body point 1', 'body point 2']:
-                task[tps['type']] = json.loads(tps['value'])
+    for row in tasks:
+        task = {"assignment_manager_task_id": row['id'],
+                row['key_type']: row['key_text']}
+        for ptype, value in properties[row['id']].items():
+            if ptype in INT_PROPERTIES:
+                task[ptype] = int(value)
+            elif ptype in JSON_PROPERTIES:
+                task[ptype] = json.loads(value)
             else:
-                task[tps['type']] = tps['value']
-
-
-    if this_task:
+                task[ptype] = value
         result['task list'].append(task)
-    result['rest']['row_count'] = task_count
+    result['rest']['row_count'] = len(tasks)
     return None
 
 
@@ -377,10 +474,13 @@ def update_property(pid, table, name, value):
           value: value
     '''
     stmt = "INSERT INTO %s_property (%s_id,type_id,value) VALUES " \
-           + "(!s,getCvTermId(!s,!s,NULL),!s) ON DUPLICATE KEY UPDATE value=!s"
+           + "(!s,!s,!s) ON DUPLICATE KEY UPDATE value=!s"
     stmt = stmt % (table, table)
     stmt = stmt.replace('!s', '%s')
-    bind = (pid, table, name, value, value)
+    type_id = cv_term_cache.get_cv_term_id(table, name)
+    if not type_id:
+        raise InvalidUsage("%s is not a valid %s property" % (name, table))
+    bind = (pid, type_id, value, value)
     try:
         g.c.execute(stmt, bind)
     except Exception as err:
@@ -409,18 +509,4 @@ def working_duration(start_unix, end_unix):
           start_unix: start time (epoch seconds)
           end_unix: end time (epoch seconds)
     '''
-    open_time = datetime.time(6, 0, 0)
-    close_time = datetime.time(18, 0, 0)
-    holidaylist = pyholidays.US()
-    startstring = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_unix))
-    endstring = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(end_unix))
-    startdate = pd.to_datetime(startstring)
-    enddate = pd.to_datetime(endstring)
-    work_duration = businessDuration(startdate, enddate, open_time, close_time,
-                                     holidaylist=holidaylist, unit='hour') * 3600
-    try:
-        work_duration = int(work_duration)
-    except ValueError as err:
-        print(str(err) + ' for ' + startstring + ', ' + endstring)
-        work_duration = end_unix - start_unix
-    return work_duration
+    return business_hours.working_duration(start_unix, end_unix)
@@ -0,0 +1,78 @@
+''' backfill_task_keys.py
+    Add existing tasks to the task key search index (task_key_index). New
+    tasks are indexed when they are inserted; run this once after creating
+    the table (sql/migrations/task-key-index.sql). Tasks are read in batches
+    by ID and each batch is committed, so the live service isn't blocked.
+    Tasks that are already indexed are skipped, so it is safe to rerun.
+'''
+
+import argparse
+import os
+import sys
+import time
+import colorlog
+from flask import Config
+from db_pool import connect
+from task_keys import index_task_keys
+
+LOGGER = colorlog.getLogger()
+READ = {
+    'TASKS': "SELECT t.id,t.key_text,cv.name AS key_type FROM task t JOIN cv_term cv ON "
+             + "(cv.id=t.key_type_id) WHERE t.id>%s ORDER BY t.id LIMIT %s",
+}
+
+
+def backfill_task_keys(conn):
+    ''' Index all tasks
+        Keyword arguments:
+          conn: database connection
+    '''
+    cursor = conn.cursor()
+    last_id = ARG.start
+    read = written = 0
+    start = time.time()
+    while True:
+        cursor.execute(READ['TASKS'], (last_id, ARG.batch))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        read += len(rows)
+        by_type = dict()
+        for row in rows:
+            by_type.setdefault(row['key_type'], []).append((row['id'], row['key_text']))
+        for key_type, tasks in by_type.items():
+            written += index_task_keys(cursor, key_type, tasks)
+        conn.commit()
+        LOGGER.info("Tasks through ID %s: %d read, %d index rows", last_id, read, written)
+        if ARG.pause:
+            time.sleep(ARG.pause)
+    print("%d tasks read, %d index rows written in %.1f sec" % (read, written,
+                                                                 time.time() - start),
+          file=sys.stderr)
+
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description='Backfill the task key search index')
+    PARSER.add_argument('--start', dest='start', action='store', type=int, default=0,
+                        help='Only tasks with IDs after this one (optional, default=0)')
+    PARSER.add_argument('--batch', dest='batch', action='store', type=int, default=5000,
+                        help='Tasks per batch (optional, default=5000)')
+    PARSER.add_argument('--pause', dest='pause', action='store', type=float, default=0,
+                        help='Seconds to pause between batches (optional, default=0)')
+    PARSER.add_argument('--verbose', action='store_true', dest='verbose',
+                        default=False, help='Turn on verbose output')
+    ARG = PARSER.parse_args()
+    LOGGER.setLevel(colorlog.colorlog.logging.INFO if ARG.verbose
+                    else colorlog.colorlog.logging.WARNING)
+    HANDLER = colorlog.StreamHandler()
+    HANDLER.setFormatter(colorlog.ColoredFormatter())
+    LOGGER.addHandler(HANDLER)
+    CONFIG = Config(os.path.dirname(os.path.abspath(__file__)))
+    CONFIG.from_pyfile('config.cfg')
+    try:
+        backfill_task_keys(connect(CONFIG))
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,223 @@
+''' business_hours.py
+    Working-hours arithmetic. Working days (weekdays that aren't holidays)
+    are kept as a cumulative count per day, built a year at a time as
+    needed, so the working time between two instants takes a constant
+    number of operations. Times are interpreted in local time. Results
+    match businessDuration (business_duration package) with the same
+    hours and holidays, as working_duration used to compute them.
+'''
+
+import datetime
+import threading
+import time
+import holidays as pyholidays
+import numpy as np
+
+DAY = 86400
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+# Default calendar (see get_calendar)
+CALENDAR = None
+
+
+def _seconds(tod):
+    ''' Convert a time of day to seconds after midnight
+        Keyword arguments:
+          tod: datetime.time
+        Returns:
+          seconds
+    '''
+    return tod.hour * 3600 + tod.minute * 60 + tod.second
+
+
+# *****************************************************************************
+# * Classes                                                                   *
+# *****************************************************************************
+class BusinessCalendar():
+    ''' Working hours, weekend days and holidays
+    '''
+    def __init__(self, open_time=datetime.time(6, 0, 0), close_time=datetime.time(18, 0, 0),
+                 holidays=None, weekend=(5, 6)):
+        ''' Keyword arguments:
+              open_time: start of the working day
+              close_time: end of the working day (must be after open_time)
+              holidays: holidays object (default is US holidays)
+              weekend: weekday numbers of non-working days
+        '''
+        self.open = _seconds(open_time)
+        self.close = _seconds(close_time)
+        if self.close <= self.open:
+            raise ValueError("close_time must be after open_time")
+        self.workday = self.close - self.open
+        self.holidays = pyholidays.US() if holidays is None else holidays
+        self.weekend = weekend
+        self.lock = threading.Lock()
+        # (first day, last day, working flag per day, cumulative working days),
+        # replaced as a whole when the calendar is extended
+        self.table = (0, -1, np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64))
+
+    def _cover(self, first_day, last_day):
+        ''' Make sure the calendar includes a range of days. It is extended
+            to whole years (and at least through next year).
+            Keyword arguments:
+              first_day: first day (days since 1970-01-01)
+              last_day: last day
+            Returns:
+              (first day, last day, working flag per day, cumulative[i] = working
+              days before first day + i)
+        '''
+        table = self.table
+        if first_day >= table[0] and last_day <= table[1]:
+            return table
+        with self.lock:
+            table = self.table
+            if first_day >= table[0] and last_day <= table[1]:
+                return table
+            if table[1] >= table[0]:
+                first_day = min(first_day, table[0])
+                last_day = max(last_day, table[1])
+            first_year = datetime.date.fromordinal(EPOCH_ORDINAL + int(first_day)).year
+            last_year = max(datetime.date.fromordinal(EPOCH_ORDINAL + int(last_day)).year,
+                            datetime.date.today().year + 1)
+            start = datetime.date(first_year, 1, 1).toordinal()
+            stop = datetime.date(last_year, 12, 31).toordinal()
+            working = np.zeros(stop - start + 1, dtype=np.int64)
+            for idx, ordinal in enumerate(range(start, stop + 1)):
+                day = datetime.date.fromordinal(ordinal)
+                working[idx] = day.weekday() not in self.weekend and day not in self.holidays
+            cumulative = np.zeros(len(working) + 1, dtype=np.int64)
+            np.cumsum(working, out=cumulative[1:])
+            self.table = (start - EPOCH_ORDINAL, stop - EPOCH_ORDINAL, working, cumulative)
+            return self.table
+
+    @staticmethod
+    def local_time(timestamp):
+        ''' Split an epoch time into local day and time of day
+            Keyword arguments:
+              timestamp: epoch seconds
+            Returns:
+              day (days since 1970-01-01), seconds after midnight
+        '''
+        seconds = int(timestamp // 1)
+        local = seconds + time.localtime(seconds).tm_gmtoff
+        return local // DAY, local % DAY
+
+    @staticmethod
+    def local_times(timestamps):
+        ''' Split epoch times into local days and times of day. UTC offsets
+            are looked up once per distinct hour; hours containing an offset
+            change are looked up per time.
+            Keyword arguments:
+              timestamps: array of epoch seconds
+            Returns:
+              array of days (days since 1970-01-01), array of seconds after midnight
+        '''
+        seconds = np.floor(np.asarray(timestamps, dtype=np.float64)).astype(np.int64)
+        hours, inverse = np.unique(seconds // 3600, return_inverse=True)
+        first = np.array([time.localtime(int(hour) * 3600).tm_gmtoff for hour in hours],
+                         dtype=np.int64)
+        last = np.array([time.localtime(int(hour) * 3600 + 3599).tm_gmtoff for hour in hours],
+                        dtype=np.int64)
+        offsets = first[inverse]
+        for idx in np.nonzero(first[inverse] != last[inverse])[0]:
+            offsets[idx] = time.localtime(int(seconds[idx])).tm_gmtoff
+        local = seconds + offsets
+        return local // DAY, local % DAY
+
+    def working_days(self, first_day, last_day):
+        ''' Count the working days in a range of days
+            Keyword arguments:
+              first_day: first day (days since 1970-01-01)
+              last_day: last day (inclusive)
+            Returns:
+              number of working days
+        '''
+        base, _, _, cumulative = self._cover(first_day, last_day)
+        return int(cumulative[last_day - base + 1] - cumulative[first_day - base])
+
+    def duration(self, start, end):
+        ''' Get the working seconds between two times
+            Keyword arguments:
+              start: start time (epoch seconds)
+              end: end time (epoch seconds)
+            Returns:
+              working seconds (end - start if end is before start in local time)
+        '''
+        sday, ssod = self.local_time(start)
+        eday, esod = self.local_time(end)
+        if (eday, esod) < (sday, ssod):
+            return end - start
+        base, _, working, cumulative = self._cover(sday, eday)
+        days = int(cumulative[eday - base + 1] - cumulative[sday - base])
+        if not days:
+            return 0
+        # Working time already elapsed on the first working day, and still
+        # to come on the last one
+        before = min(max(ssod, self.open), self.close) - self.open \
+                 if working[sday - base] else 0
+        after = self.close - min(max(esod, self.open), self.close) \
+                if working[eday - base] else 0
+        seconds = days * self.workday - before - after
+        # Same arithmetic as businessDuration(unit='hour') * 3600
+        return int(seconds / 60 / 60 * 3600)
+
+    def durations(self, starts, ends): # pylint: disable=R0914
+        ''' Get the working seconds between arrays of times
+            Keyword arguments:
+              starts: array of start times (epoch seconds)
+              ends: array of end times (epoch seconds)
+            Returns:
+              array of working seconds
+        '''
+        starts = np.asarray(starts)
+        ends = np.asarray(ends)
+        if not starts.size:
+            return np.zeros(0, dtype=np.int64)
+        sday, ssod = self.local_times(starts)
+        eday, esod = self.local_times(ends)
+        base, _, working, cumulative = self._cover(int(min(sday.min(), eday.min())),
+                                                   int(max(sday.max(), eday.max())))
+        backwards = eday * DAY + esod < sday * DAY + ssod
+        days = np.where(backwards, 0, cumulative[eday - base + 1] - cumulative[sday - base])
+        before = np.where(working[sday - base], np.clip(ssod, self.open, self.close) - self.open,
+                          0)
+        after = np.where(working[eday - base], self.close - np.clip(esod, self.open, self.close),
+                         0)
+        seconds = np.where(days > 0, days * self.workday - before - after, 0)
+        result = (seconds / 60 / 60 * 3600).astype(np.int64)
+        return np.where(backwards, (ends - starts).astype(np.int64), result)
+
+
+# *****************************************************************************
+# * Functions                                                                 *
+# *****************************************************************************
+def get_calendar():
+    ''' Get the default calendar (6:00-18:00, US holidays)
+        Returns:
+          BusinessCalendar
+    '''
+    global CALENDAR # pylint: disable=W0603
+    if CALENDAR is None:
+        CALENDAR = BusinessCalendar()
+    return CALENDAR
+
+
+def working_duration(start_unix, end_unix):
+    ''' Determine working duration (working hours only)
+        Keyword arguments:
+          start_unix: start time (epoch seconds)
+          end_unix: end time (epoch seconds)
+        Returns:
+          working seconds
+    '''
+    return get_calendar().duration(start_unix, end_unix)
+
+
+def working_durations(starts, ends):
+    ''' Determine working durations for arrays of start and end times
+        Keyword arguments:
+          starts: array of start times (epoch seconds)
+          ends: array of end times (epoch seconds)
+        Returns:
+          array of working seconds
+    '''
+    return get_calendar().durations(starts, ends)
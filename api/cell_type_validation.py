@@ -18,6 +18,7 @@ class Cell_type_validation:
         self.unit = 'multibody'
         self.optional_properties = ['note', 'group', 'source']
         self.allowable_filters = []
+        self.task_list_key = 'task list'
         # self.no_assignment = True
         self.required_task_props = ['body ID A', 'body ID B', 'match_score', 'task result id', 'task type']
         self.task_insert_props = ['body ID A', 'body ID B', 'match_score', 'task result id', 'task type', 'debug']
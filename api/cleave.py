@@ -17,16 +17,13 @@ class Cleave:
         self.optional_properties = ['roi', 'source', 'status', 'note', 'group']
         self.task_insert_props = ['cluster_name', 'post', 'pre', 'status']
 
-    def cypher(self, result, ipd, source, count_only=False):
+    def where_clause(self, ipd):
         '''
-        Given a size, and optional ROI and status, generate the Cypher query
+        Given a size, and optional ROI and status, generate the Cypher WHERE clause
         Keyword arguments:
           self: object
-          result: result dictionary
           ipd: input parameters
-          source: neuprint source
         '''
-        perfstart = datetime.now()
         assert 'roi' in ipd and ipd['roi'], \
                "Cannot generate orphan_link Cypher query: missing ROI"
         clauses = []
@@ -59,7 +56,19 @@ class Cleave:
         else:
             ipd['status'] = ''
         clauses.append(status_clause)
-        where_clause = ' AND '.join(clauses)
+        return ' AND '.join(clauses)
+
+    def cypher(self, result, ipd, source, count_only=False):
+        '''
+        Given a size, and optional ROI and status, generate the Cypher query
+        Keyword arguments:
+          self: object
+          result: result dictionary
+          ipd: input parameters
+          source: neuprint source
+        '''
+        perfstart = datetime.now()
+        where_clause = self.where_clause(ipd)
         suffix = " RETURN COUNT(n)" if count_only else " RETURN n ORDER BY n.size DESC"
         payload = {"cypher" : "MATCH (n:`" + source + "`) WHERE " + where_clause \
                    + suffix}
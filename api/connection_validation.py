@@ -16,6 +16,7 @@ class Connection_validation:
         self.unit = 'body_xyz'
         self.optional_properties = ['note', 'group', 'source']
         self.allowable_filters = []
+        self.task_list_key = 'points'
         # self.no_assignment = True
         self.required_task_props = []
         self.task_insert_props = []
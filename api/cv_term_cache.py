@@ -0,0 +1,135 @@
+''' cv_term_cache.py
+    In-process cache of CV terms. Terms are loaded from cv_term_vw in one
+    query and kept for TTL seconds, or until invalidate() is called (after CV
+    or CV term inserts, and on protocol reload). Terms that aren't in the
+    cache are resolved with the getCvTermId stored function, which also
+    handles sub-CVs.
+'''
+
+import threading
+from time import time
+from flask import g
+import assignment_utilities
+
+READ = {
+    'TERMS': "SELECT id,cv,cv_term,display_name FROM cv_term_vw ORDER BY cv,display_name",
+    'TERM_ID': "SELECT getCvTermId(%s,%s,NULL) AS id",
+}
+TTL = 300
+# Seconds between reloads caused by cache misses
+MISS_RELOAD = 5
+CACHE = {'loaded': 0, 'terms': {}, 'ids': {}}
+LOCK = threading.Lock()
+
+
+def invalidate():
+    ''' Discard the cache. It will be reloaded on next use.
+    '''
+    with LOCK:
+        CACHE['loaded'] = 0
+
+
+def _load():
+    ''' Load all CV terms (including retired ones, which existing projects and
+        tasks may still refer to)
+    '''
+    try:
+        g.c.execute(READ['TERMS'])
+        rows = g.c.fetchall()
+    except Exception as err:
+        raise assignment_utilities.InvalidUsage(assignment_utilities.sql_error(err), 500)
+    terms = dict()
+    ids = dict()
+    for row in rows:
+        if row['cv'] not in terms:
+            terms[row['cv']] = dict()
+        terms[row['cv']][row['cv_term']] = row['display_name']
+        ids[(row['cv'], row['cv_term'])] = row['id']
+    with LOCK:
+        CACHE['terms'] = terms
+        CACHE['ids'] = ids
+        CACHE['loaded'] = time()
+
+
+def _check(miss=False):
+    ''' Reload the cache if it has expired (or, for a cache miss, if it
+        wasn't loaded in the last few seconds)
+        Keyword arguments:
+          miss: a term was not found
+        Returns:
+          True if the cache was reloaded
+    '''
+    age = time() - CACHE['loaded']
+    if age >= TTL or (miss and age >= MISS_RELOAD):
+        _load()
+        return True
+    return False
+
+
+def get_terms(cv):
+    ''' Get the terms for a CV
+        Keyword arguments:
+          cv: CV
+        Returns:
+          dictionary of CV term -> display name (ordered by display name)
+    '''
+    _check()
+    return CACHE['terms'].get(cv, dict())
+
+
+def get_protocols():
+    ''' Get the protocols
+        Returns:
+          dictionary of protocol -> display name (ordered by display name)
+    '''
+    return get_terms('protocol')
+
+
+def valid_cv_term(cv, cv_term):
+    ''' Determine if a CV term is valid for a given CV
+        Keyword arguments:
+          cv: CV
+          cv_term: CV term
+        Returns:
+          1 if the term is valid, 0 otherwise
+    '''
+    if cv_term in get_terms(cv):
+        return 1
+    if _check(miss=True) and cv_term in get_terms(cv):
+        return 1
+    return 0
+
+
+def get_cv_term_id(cv, cv_term):
+    ''' Determine the ID for a CV term
+        Keyword arguments:
+          cv: CV
+          cv_term: CV term
+        Returns:
+          CV term ID (None if the term isn't found)
+    '''
+    _check()
+    if (cv, cv_term) in CACHE['ids']:
+        return CACHE['ids'][(cv, cv_term)]
+    if _check(miss=True) and (cv, cv_term) in CACHE['ids']:
+        return CACHE['ids'][(cv, cv_term)]
+    try:
+        g.c.execute(READ['TERM_ID'], (cv, cv_term))
+        row = g.c.fetchone()
+    except Exception as err:
+        raise assignment_utilities.InvalidUsage(assignment_utilities.sql_error(err), 500)
+    if not row['id']:
+        return None
+    with LOCK:
+        CACHE['ids'][(cv, cv_term)] = row['id']
+    return row['id']
+
+
+def get_key_type_id(key_type):
+    ''' Determine the ID for a key type
+        Keyword arguments:
+          key_type: key type
+        Returns:
+          key type ID
+    '''
+    return get_cv_term_id('key', key_type)
@@ -0,0 +1,167 @@
+''' db_pool.py
+    Pooled MySQL connections for the assignment responder
+'''
+
+import queue
+import threading
+import time
+import pymysql.cursors
+
+
+def connect(config, cursorclass=pymysql.cursors.DictCursor):
+    ''' Open a new connection to the assignment database
+        Keyword arguments:
+          config: configuration dictionary (app.config or Flask Config)
+          cursorclass: default cursor class
+        Returns:
+          pymysql connection
+    '''
+    return pymysql.connect(host=config['MYSQL_DATABASE_HOST'],
+                           user=config['MYSQL_DATABASE_USER'],
+                           password=config['MYSQL_DATABASE_PASSWORD'],
+                           db=config['MYSQL_DATABASE_DB'],
+                           cursorclass=cursorclass)
+
+
+# *****************************************************************************
+# * Classes                                                                   *
+# *****************************************************************************
+class PoolExhausted(Exception):
+    ''' No connection could be checked out before the timeout expired
+    '''
+
+
+class ConnectionPool(): # pylint: disable=R0902
+    ''' Fixed-size pool of database connections. Connections are opened
+        lazily, health-checked (and reconnected if needed) on checkout,
+        and rolled back on return so no transaction leaks between requests.
+    '''
+    def __init__(self, config, size=5, timeout=30, check_seconds=0):
+        ''' Keyword arguments:
+              config: configuration dictionary
+              size: maximum number of open connections
+              timeout: seconds to wait for a free connection
+              check_seconds: only ping connections idle for at least this long
+        '''
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self.check_seconds = check_seconds
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.stats = {'checkouts': 0, 'waits': 0, 'total_wait': 0.0, 'max_wait': 0.0,
+                      'reconnects': 0, 'timeouts': 0}
+
+    def _open(self):
+        ''' Open a new connection if the pool isn't at capacity
+            Returns:
+              connection or None if the pool is full
+        '''
+        with self.lock:
+            if self.opened >= self.size:
+                return None
+            self.opened += 1
+        try:
+            return connect(self.config)
+        except Exception:
+            with self.lock:
+                self.opened -= 1
+            raise
+
+    def _discard(self, conn):
+        ''' Close a connection and release its slot
+            Keyword arguments:
+              conn: connection
+        '''
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self.lock:
+            self.opened -= 1
+
+    def _reconnect(self, conn):
+        ''' Replace a dead connection with a new one in the same slot
+            Keyword arguments:
+              conn: connection
+            Returns:
+              new connection
+        '''
+        try:
+            conn.close()
+        except Exception:
+            pass
+        try:
+            conn = connect(self.config)
+        except Exception:
+            with self.lock:
+                self.opened -= 1
+            raise
+        with self.lock:
+            self.stats['reconnects'] += 1
+        return conn
+
+    def checkout(self):
+        ''' Get a healthy connection from the pool, waiting if all are in use
+            Returns:
+              connection
+        '''
+        start = time.time()
+        try:
+            conn, last_used = self.idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+            last_used = None
+            if not conn:
+                try:
+                    conn, last_used = self.idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    self.stats['timeouts'] += 1
+                    raise PoolExhausted("No database connection available after %d seconds"
+                                        % (self.timeout))
+        wait = time.time() - start
+        if last_used is not None and time.time() - last_used >= self.check_seconds:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                conn = self._reconnect(conn)
+        with self.lock:
+            self.stats['checkouts'] += 1
+            if wait >= 0.001:
+                self.stats['waits'] += 1
+            self.stats['total_wait'] += wait
+            self.stats['max_wait'] = max(self.stats['max_wait'], wait)
+        return conn
+
+    def checkin(self, conn):
+        ''' Return a connection to the pool. Uncommitted work is rolled back.
+            Keyword arguments:
+              conn: connection
+        '''
+        try:
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        try:
+            self.idle.put_nowait((conn, time.time()))
+        except queue.Full:
+            self._discard(conn)
+
+    def report(self):
+        ''' Return pool statistics
+            Returns:
+              statistics dictionary
+        '''
+        with self.lock:
+            checkouts = self.stats['checkouts']
+            return {'size': self.size,
+                    'open': self.opened,
+                    'idle': self.idle.qsize(),
+                    'checkouts': checkouts,
+                    'waits': self.stats['waits'],
+                    'average_wait': self.stats['total_wait'] / checkouts if checkouts else 0,
+                    'max_wait': self.stats['max_wait'],
+                    'reconnects': self.stats['reconnects'],
+                    'timeouts': self.stats['timeouts']}
@@ -0,0 +1,137 @@
+''' exports.py
+    On-demand TSV exports. An export is generated when it is first requested
+    and cached in EXPORT_DIR, keyed by a hash of its kind, query parameters
+    and permission scope. Cached files are reused for TTL seconds and served
+    with their content hash as the ETag. The directory is kept under
+    MAX_BYTES by removing the least recently used files. Point EXPORT_DIR at
+    a shared volume to share exports between workers and containers.
+'''
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+EXPORT_DIR = '/tmp/assignment_exports'
+MAX_BYTES = 100 * 1024 * 1024
+TTL = 60
+LOCK = threading.Lock()
+
+
+def export_key(kind, params, scope):
+    ''' Get the cache key for an export
+        Keyword arguments:
+          kind: export kind
+          params: dictionary of query parameters
+          scope: permission scope (exports for different scopes differ)
+        Returns:
+          key
+    '''
+    text = json.dumps([kind, params, scope], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def lookup(key):
+    ''' Find a fresh cached export. The file's access time is updated, since
+        eviction is least recently used first.
+        Keyword arguments:
+          key: cache key
+        Returns:
+          (path, ETag) or None
+    '''
+    for path in glob.glob(os.path.join(EXPORT_DIR, key + '.*.tsv')):
+        try:
+            modified = os.path.getmtime(path)
+            if time.time() - modified >= TTL:
+                continue
+            os.utime(path, (time.time(), modified))
+        except OSError:
+            continue
+        return path, os.path.basename(path).split('.')[1]
+    return None
+
+
+def store(key, lines):
+    ''' Write an export to the cache
+        Keyword arguments:
+          key: cache key
+          lines: line generator
+        Returns:
+          (path, ETag)
+    '''
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    handle, temp = tempfile.mkstemp(dir=EXPORT_DIR, suffix='.part')
+    try:
+        with os.fdopen(handle, 'wb') as outstream:
+            for line in lines:
+                data = line.encode('utf-8')
+                digest.update(data)
+                outstream.write(data)
+        etag = digest.hexdigest()[:32]
+        path = os.path.join(EXPORT_DIR, '%s.%s.tsv' % (key, etag))
+        os.replace(temp, path)
+    except Exception:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+    for old in glob.glob(os.path.join(EXPORT_DIR, key + '.*.tsv')):
+        if old != path:
+            remove(old)
+    evict()
+    return path, etag
+
+
+def remove(path):
+    ''' Remove a cached file (it may already have been removed by another
+        worker)
+        Keyword arguments:
+          path: file path
+    '''
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def evict():
+    ''' Remove least recently used exports until the cache fits in MAX_BYTES
+    '''
+    with LOCK:
+        files = []
+        for entry in os.scandir(EXPORT_DIR):
+            if not entry.name.endswith('.tsv'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_atime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= MAX_BYTES:
+                break
+            remove(path)
+            total -= size
+
+
+def get_export(kind, params, scope, generator):
+    ''' Get an export, generating it if there isn't a fresh cached copy
+        Keyword arguments:
+          kind: export kind
+          params: dictionary of query parameters
+          scope: permission scope
+          generator: function returning a line generator for the export
+        Returns:
+          (path, ETag)
+    '''
+    key = export_key(kind, params, scope)
+    found = lookup(key)
+    if found:
+        return found
+    return store(key, generator())
@@ -18,6 +18,7 @@ class Focused_merge:
         self.unit = 'multibody'
         self.optional_properties = ['note', 'group', 'source', 'neuroglancer_grayscale', 'neuroglancer_segmentation']
         self.allowable_filters = []
+        self.task_list_key = 'task list'
         # self.no_assignment = True 
         self.required_task_props = ['supervoxel ID 1', 'supervoxel ID 2', 'task type', 'supervoxel point 1', 'supervoxel point 2', 'body point 1', 'body point 2']
         self.task_insert_props = ['supervoxel ID 1', 'supervoxel ID 2', 'task type', 'supervoxel point 1', 'supervoxel point 2', 'body point 1', 'body point 2']
@@ -0,0 +1,229 @@
+''' jobs.py
+    Durable background jobs. Jobs are rows in the job table; worker threads
+    in each responder process claim queued jobs, run them with their own
+    database connection, and record progress, results and failures.
+'''
+
+import json
+import os
+import platform
+import threading
+import time
+from flask import g
+from assignment_utilities import InvalidUsage
+from db_pool import connect
+
+READ = {
+    'JOB': "SELECT * FROM job WHERE id=%s",
+    'CLAIM': "SELECT id,job_type,payload,user,attempts,max_attempts FROM job WHERE "
+             + "status='queued' AND job_type IN (%s) ORDER BY id LIMIT 1 "
+             + "FOR UPDATE SKIP LOCKED",
+}
+WRITE = {
+    'INSERT_JOB': "INSERT INTO job (job_type,payload,total,user,max_attempts) "
+                  + "VALUES (%s,%s,%s,%s,%s)",
+    'START_JOB': "UPDATE job SET status='running',attempts=attempts+1,start_date=NOW(),"
+                 + "heartbeat_date=NOW(),worker=%s,error=NULL WHERE id=%s",
+    'PROGRESS': "UPDATE job SET progress=%s,heartbeat_date=NOW() WHERE id=%s",
+    'COMPLETE_JOB': "UPDATE job SET status='complete',completion_date=NOW(),rows_inserted=%s,"
+                    + "result=%s WHERE id=%s",
+    'FAIL_JOB': "UPDATE job SET status=IF(attempts<max_attempts,'queued','failed'),error=%s "
+                + "WHERE id=%s",
+    'REQUEUE_STALE': "UPDATE job SET status=IF(attempts<max_attempts,'queued','failed'),"
+                     + "error='Worker stopped responding' WHERE status='running' AND "
+                     + "heartbeat_date < NOW() - INTERVAL %s SECOND",
+    'INSERT_STREAM_JOB': "INSERT INTO job (job_type,status,payload,user,worker,start_date,"
+                         + "heartbeat_date) VALUES (%s,'streaming',%s,%s,%s,NOW(),NOW())",
+    'STREAM_PROGRESS': "UPDATE job SET progress=%s,rows_inserted=%s,heartbeat_date=NOW() "
+                       + "WHERE id=%s",
+    'END_STREAM_JOB': "UPDATE job SET status=%s,error=%s,heartbeat_date=NOW(),"
+                      + "completion_date=IF(%s='complete',NOW(),NULL) WHERE id=%s",
+    'RETRY_JOB': "UPDATE job SET status='queued',attempts=0,error=NULL WHERE id=%%s "
+                 + "AND status='failed' AND job_type IN (%s)",
+}
+
+
+def submit_job(job_type, payload, user, total=None, max_attempts=3):
+    ''' Queue a job. The job row is written on the request's connection, so
+        it becomes visible to workers when the request commits.
+        Keyword arguments:
+          job_type: job type (must have a handler)
+          payload: job parameters (JSON-serializable)
+          user: user submitting the job
+          total: number of items the job will process (for progress)
+          max_attempts: number of times to try the job
+        Returns:
+          job ID
+    '''
+    bind = (job_type, json.dumps(payload), total, user, max_attempts)
+    g.c.execute(WRITE['INSERT_JOB'], bind)
+    return g.c.lastrowid
+
+
+def retry_job(job_id, job_types):
+    ''' Requeue a failed job. Only jobs that workers run (job types with a
+        handler) can be retried; streamed uploads are resumed instead.
+        Keyword arguments:
+          job_id: job ID
+          job_types: job types with a handler
+        Returns:
+          number of rows updated
+    '''
+    g.c.execute(WRITE['RETRY_JOB'] % ','.join(['%s'] * len(job_types)),
+                [job_id] + list(job_types))
+    return g.c.rowcount
+
+
+def get_job(job_id):
+    ''' Get a job
+        Keyword arguments:
+          job_id: job ID
+        Returns:
+          job row (payload is decoded)
+    '''
+    g.c.execute(READ['JOB'], (job_id,))
+    job = g.c.fetchone()
+    if job:
+        job['payload'] = json.loads(job['payload'])
+    return job
+
+
+def start_stream_job(job_type, payload, user):
+    ''' Record a job that is run by the current request (a streaming upload)
+        rather than by the worker pool. Its progress is committed with each
+        batch, so an interrupted upload can be resumed.
+        Keyword arguments:
+          job_type: job type
+          payload: parameters needed to resume the job
+          user: user running the job
+        Returns:
+          job ID
+    '''
+    worker = "%s:%d" % (platform.node(), os.getpid())
+    g.c.execute(WRITE['INSERT_STREAM_JOB'], (job_type, json.dumps(payload), user, worker))
+    return g.c.lastrowid
+
+
+def record_stream_progress(job_id, progress, rows):
+    ''' Update a streaming job's progress (committed with the caller's batch)
+        Keyword arguments:
+          job_id: job ID
+          progress: number of input records committed
+          rows: number of rows inserted
+    '''
+    g.c.execute(WRITE['STREAM_PROGRESS'], (progress, rows, job_id))
+
+
+def end_stream_job(job_id, error=None):
+    ''' Mark a streaming job as complete or failed, and commit
+        Keyword arguments:
+          job_id: job ID
+          error: error message if the job failed
+    '''
+    status = 'failed' if error else 'complete'
+    g.c.execute(WRITE['END_STREAM_JOB'], (status, error, status, job_id))
+    g.db.commit()
+
+
+class JobQueue():
+    ''' Worker pool that runs queued jobs
+    '''
+    def __init__(self, app, handlers, workers=2, poll=2, stale_seconds=900):
+        ''' Keyword arguments:
+              app: Flask application
+              handlers: dictionary of job type -> function(payload, result, progress)
+              workers: number of worker threads
+              poll: seconds to wait when no jobs are queued
+              stale_seconds: requeue running jobs with no heartbeat for this long
+        '''
+        self.app = app
+        self.handlers = handlers
+        self.workers = workers
+        self.poll = poll
+        self.stale_seconds = stale_seconds
+        self.threads = []
+        self.running = False
+
+    def start(self):
+        ''' Start the worker threads
+        '''
+        self.running = True
+        for num in range(self.workers):
+            thread = threading.Thread(target=self._work, name='job-worker-%d' % num, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        ''' Stop the worker threads after their current jobs
+        '''
+        self.running = False
+
+    def _claim(self, conn, worker):
+        ''' Claim the oldest queued job
+            Keyword arguments:
+              conn: database connection
+              worker: worker name
+            Returns:
+              job row or None
+        '''
+        cursor = conn.cursor()
+        cursor.execute(WRITE['REQUEUE_STALE'], (self.stale_seconds,))
+        cursor.execute(READ['CLAIM'] % ','.join(['%s'] * len(self.handlers)),
+                       list(self.handlers))
+        job = cursor.fetchone()
+        if job:
+            cursor.execute(WRITE['START_JOB'], (worker, job['id']))
+        conn.commit()
+        return job
+
+    def _run(self, job, conn, status_conn):
+        ''' Run a job with its handler and record the outcome
+            Keyword arguments:
+              job: job row
+              conn: database connection for the job's work
+              status_conn: autocommit connection for progress updates
+        '''
+        def progress(done):
+            status_conn.cursor().execute(WRITE['PROGRESS'], (done, job['id']))
+
+        result = {'rest': {'row_count': 0, 'user': job['user'], 'error': False,
+                           'job_id': job['id'], 'pid': os.getpid()}}
+        with self.app.app_context():
+            g.db = conn
+            g.c = conn.cursor()
+            try:
+                self.handlers[job['job_type']](json.loads(job['payload']), result, progress)
+                conn.commit()
+                rows = result['rest'].get('tasks_inserted', 0)
+                del result['rest']['user']
+                status_conn.cursor().execute(WRITE['COMPLETE_JOB'],
+                                             (rows, json.dumps(result['rest'], default=str),
+                                              job['id']))
+            except Exception as err:
+                conn.rollback()
+                message = err.message if isinstance(err, InvalidUsage) else repr(err)
+                print("Job %s (%s) failed: %s" % (job['id'], job['job_type'], message))
+                status_conn.cursor().execute(WRITE['FAIL_JOB'], (message, job['id']))
+
+    def _work(self):
+        ''' Worker thread: claim and run jobs until stopped
+        '''
+        worker = "%s:%d:%s" % (platform.node(), os.getpid(), threading.current_thread().name)
+        conn = status_conn = None
+        while self.running:
+            try:
+                if not conn:
+                    conn = connect(self.app.config)
+                    status_conn = connect(self.app.config)
+                    status_conn.autocommit(True)
+                conn.ping(reconnect=True)
+                status_conn.ping(reconnect=True)
+                job = self._claim(conn, worker)
+                if job:
+                    self._run(job, conn, status_conn)
+                else:
+                    time.sleep(self.poll)
+            except Exception as err:
+                print("Job worker %s error: %s" % (worker, repr(err)))
+                conn = status_conn = None
+                time.sleep(self.poll)
@@ -0,0 +1,252 @@
+''' kafka_publisher.py
+    Asynchronous, batched Kafka publishing with a disk spill for broker outages
+'''
+
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from kafka import KafkaProducer
+
+
+def process_alive(pid):
+    ''' Determine if a process is running
+        Keyword arguments:
+          pid: process ID
+        Returns:
+          True if the process exists
+    '''
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class KafkaPublisher(): # pylint: disable=R0902
+    ''' Messages are put on a bounded in-memory queue and sent by a background
+        thread in batches. Messages that can't be queued or delivered are
+        appended to a spill file and replayed once the broker is reachable.
+    '''
+    def __init__(self, broker_list, queue_size=10000, linger_ms=100, batch_size=500,
+                 send_timeout=10, spill_dir='/tmp'):
+        ''' Keyword arguments:
+              broker_list: Kafka bootstrap servers
+              queue_size: maximum number of queued messages
+              linger_ms: how long to wait for a batch to fill
+              batch_size: maximum number of messages per batch
+              send_timeout: seconds to wait for a batch to be acknowledged
+              spill_dir: directory for undelivered messages
+        '''
+        self.broker_list = broker_list
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.linger = linger_ms / 1000.0
+        self.batch_size = batch_size
+        self.send_timeout = send_timeout
+        self.spill_dir = spill_dir
+        self.spill_file = os.path.join(spill_dir, 'kafka_spill.%d.jsonl' % os.getpid())
+        self.spill_lock = threading.Lock()
+        self.producer = None
+        self.running = True
+        self.stats = {'queued': 0, 'sent': 0, 'failed': 0, 'spilled': 0, 'replayed': 0,
+                      'batches': 0, 'total_latency': 0.0, 'last_error': None}
+        os.makedirs(spill_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name='kafka-publisher', daemon=True)
+        self.thread.start()
+
+    def publish(self, topic, message):
+        ''' Queue a message for delivery. This never blocks.
+            Keyword arguments:
+              topic: Kafka topic
+              message: message (dictionary)
+        '''
+        item = (topic, json.dumps(message), time.time())
+        try:
+            self.queue.put_nowait(item)
+            self.stats['queued'] += 1
+        except queue.Full:
+            self._spill([item])
+
+    def _connect(self):
+        ''' Create the producer if needed
+            Returns:
+              True if a producer is available
+        '''
+        if self.producer:
+            return True
+        try:
+            self.producer = KafkaProducer(bootstrap_servers=self.broker_list,
+                                          linger_ms=int(self.linger * 1000))
+        except Exception as err:
+            self.stats['last_error'] = repr(err)
+            return False
+        return True
+
+    def _next_batch(self):
+        ''' Collect up to batch_size messages, waiting at most linger seconds
+            after the first one arrives
+            Returns:
+              list of queued items
+        '''
+        try:
+            batch = [self.queue.get(timeout=1)]
+        except queue.Empty:
+            return []
+        deadline = time.time() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _send(self, batch):
+        ''' Send a batch and wait for it to be acknowledged
+            Keyword arguments:
+              batch: list of queued items
+            Returns:
+              True if every message was delivered
+        '''
+        if not self._connect():
+            self._spill(batch)
+            return False
+        futures = []
+        for item in batch:
+            try:
+                futures.append((item, self.producer.send(item[0], item[1].encode('utf-8'))))
+            except Exception as err:
+                self.stats['last_error'] = repr(err)
+                futures.append((item, None))
+        failed = []
+        for item, future in futures:
+            try:
+                if future is None:
+                    raise RuntimeError("Message was not sent")
+                future.get(timeout=self.send_timeout)
+                self.stats['sent'] += 1
+                self.stats['total_latency'] += time.time() - item[2]
+            except Exception as err:
+                self.stats['last_error'] = repr(err)
+                failed.append(item)
+        self.stats['batches'] += 1
+        if failed:
+            self.stats['failed'] += len(failed)
+            self._spill(failed)
+        return not failed
+
+    def _spill(self, items):
+        ''' Append undeliverable messages to this process's spill file
+            Keyword arguments:
+              items: list of queued items
+        '''
+        with self.spill_lock:
+            with open(self.spill_file, 'a') as outstream:
+                for item in items:
+                    outstream.write(json.dumps({'topic': item[0], 'message': item[1],
+                                                'time': item[2]}) + "\n")
+        self.stats['spilled'] += len(items)
+
+    def _claim_name(self):
+        ''' Get an unused name for a spill file claimed by this process. Claimed
+            files still match the spill file pattern, so if this process exits
+            mid-replay they are replayed by another publisher.
+            Returns:
+              file name
+        '''
+        seq = 0
+        while True:
+            claimed = os.path.join(self.spill_dir, 'kafka_spill.%d.claimed%d.jsonl'
+                                   % (os.getpid(), seq))
+            if not os.path.exists(claimed):
+                return claimed
+            seq += 1
+
+    def _replay(self):
+        ''' Resend spilled messages from this process or from processes that
+            have exited. A spill file is claimed by renaming it (to a name
+            containing this process's ID), so only one publisher replays it.
+        '''
+        for spill in glob.glob(os.path.join(self.spill_dir, 'kafka_spill.*.jsonl')):
+            pid = int(os.path.basename(spill).split('.')[1])
+            if pid != os.getpid() and process_alive(pid):
+                continue
+            claimed = self._claim_name()
+            with self.spill_lock:
+                try:
+                    os.rename(spill, claimed)
+                except OSError:
+                    continue
+            with open(claimed) as instream:
+                items = []
+                for line in instream:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    items.append((rec['topic'], rec['message'], rec['time']))
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                if not self._send(batch):
+                    # Whatever is left goes back to the spill file
+                    self._spill(items[start + self.batch_size:])
+                    os.remove(claimed)
+                    return
+                self.stats['replayed'] += len(batch)
+            os.remove(claimed)
+
+    def _run(self):
+        ''' Publisher thread: send batches until stopped, replaying spilled
+            messages whenever the queue is idle
+        '''
+        last_replay = 0
+        while self.running or not self.queue.empty():
+            batch = self._next_batch()
+            if batch:
+                self._send(batch)
+            elif time.time() - last_replay >= 60 and self._connect():
+                last_replay = time.time()
+                self._replay()
+
+    def close(self, timeout=30):
+        ''' Drain the queue and stop the publisher thread. Anything that can't
+            be sent before the timeout is spilled to disk.
+            Keyword arguments:
+              timeout: seconds to wait for the queue to drain
+        '''
+        self.running = False
+        self.thread.join(timeout)
+        leftover = []
+        while True:
+            try:
+                leftover.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._spill(leftover)
+        if self.producer:
+            self.producer.close(timeout=5)
+
+    def report(self):
+        ''' Return delivery metrics
+            Returns:
+              metrics dictionary
+        '''
+        metrics = dict(self.stats)
+        del metrics['total_latency']
+        metrics['queue_depth'] = self.queue.qsize()
+        metrics['average_latency'] = self.stats['total_latency'] / self.stats['sent'] \
+                                     if self.stats['sent'] else 0
+        metrics['spill_bytes'] = 0
+        for spill in glob.glob(os.path.join(self.spill_dir, 'kafka_spill.*.jsonl')):
+            try:
+                metrics['spill_bytes'] += os.path.getsize(spill)
+            except OSError:
+                pass
+        return metrics
@@ -0,0 +1,118 @@
+''' neuprint_query.py
+    Paged, concurrent NeuPrint neuron queries. A neuron query is described
+    by a JSON-serializable dictionary (so it can be passed to a background
+    job). Filters are part of the Cypher WHERE clause, and only the
+    properties needed for tasks are returned. Results are read a page
+    (SKIP/LIMIT) at a time, with several pages requested concurrently, and
+    are yielded in order as batches of tasks.
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+from assignment_utilities import call_responder
+
+# Neuron properties returned for tasks
+PROPERTIES = ['post', 'pre', 'size', 'status', 'timeStamp', 'clusterName']
+
+
+def neuron_query(projectins, ipd, source):
+    ''' Describe a neuron query
+        Keyword arguments:
+          projectins: project instance (with a where_clause method)
+          ipd: request payload
+          source: NeuPrint source
+        Returns:
+          query dictionary
+    '''
+    return {'source': source,
+            'where': projectins.where_clause(ipd),
+            'unit': projectins.unit,
+            'cypher_unit': projectins.cypher_unit}
+
+
+def neuron_cypher(query, skip=None, limit=None):
+    ''' Build the Cypher for one page of a neuron query
+        Keyword arguments:
+          query: query dictionary
+          skip: neurons to skip
+          limit: maximum neurons to return
+        Returns:
+          Cypher statement
+    '''
+    props = ', '.join(['.' + prop for prop in [query['cypher_unit']] + PROPERTIES])
+    cypher = "MATCH (n:`%s`) WHERE %s RETURN n {%s} ORDER BY n.size DESC, n.%s" \
+             % (query['source'], query['where'], props, query['cypher_unit'])
+    if skip:
+        cypher += " SKIP %d" % (skip)
+    if limit:
+        cypher += " LIMIT %d" % (limit)
+    return cypher
+
+
+def count_neurons(query):
+    ''' Count the neurons a query will return
+        Keyword arguments:
+          query: query dictionary
+        Returns:
+          neuron count
+    '''
+    cypher = "MATCH (n:`%s`) WHERE %s RETURN COUNT(n)" % (query['source'], query['where'])
+    response = call_responder('neuprint', 'custom/custom', {"cypher": cypher})
+    return response['data'][0][0] if response['data'] else 0
+
+
+def neuron_task(query, ndat):
+    ''' Convert a NeuPrint neuron to a task
+        Keyword arguments:
+          query: query dictionary
+          ndat: neuron properties
+        Returns:
+          task dictionary
+    '''
+    task = {"post": ndat['post'],
+            "pre": ndat['pre'],
+            "size": ndat['size'],
+            "status": ndat.get('status') or '',
+            "timestamp": ndat.get('timeStamp') or ''}
+    if ndat.get('clusterName'):
+        task['cluster_name'] = ndat['clusterName']
+    task[query['unit']] = ndat[query['cypher_unit']]
+    return task
+
+
+def fetch_page(query, skip, limit):
+    ''' Get one page of tasks
+        Keyword arguments:
+          query: query dictionary
+          skip: neurons to skip
+          limit: page size
+        Returns:
+          list of tasks
+    '''
+    response = call_responder('neuprint', 'custom/custom',
+                              {"cypher": neuron_cypher(query, skip, limit)})
+    return [neuron_task(query, row[0]) for row in response['data']]
+
+
+def stream_tasks(query, page_size=5000, workers=4):
+    ''' Generate batches (one per page) of tasks for a neuron query. Up to
+        "workers" pages are requested at once; pages are yielded in order.
+        Keyword arguments:
+          query: query dictionary
+          page_size: neurons per page
+          workers: concurrent requests
+    '''
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = [executor.submit(fetch_page, query, page * page_size, page_size)
+                   for page in range(workers)]
+        page = workers
+        while pending:
+            batch = pending.pop(0).result()
+            if batch:
+                yield batch
+            if len(batch) < page_size:
+                # Last page: discard requests for pages past the end
+                for future in pending:
+                    future.cancel()
+                break
+            pending.append(executor.submit(fetch_page, query, page * page_size, page_size))
+            page += 1
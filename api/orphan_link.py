@@ -12,15 +12,12 @@ class Orphan_link:
         self.optional_properties = ['roi', 'status', 'source', 'note', 'group']
         self.task_insert_props = ['cluster_name', 'post', 'pre', 'status']
 
-    def cypher(self, result, ipd, source, count_only=False):
+    def where_clause(self, ipd):
         '''
-        Given an optional ROI and status, generate the Cypher query
+        Given an optional ROI and status, generate the Cypher WHERE clause
           self: object
-          result: result dictionary
           ipd: input parameters
-          source: neuprint source
         '''
-        perfstart = datetime.now()
         assert 'roi' in ipd and ipd['roi'], \
                "Cannot generate orphan_link Cypher query: missing ROI"
         clauses = []
@@ -52,7 +49,18 @@ class Orphan_link:
         else:
             ipd['status'] = ''
         clauses.append(status_clause)
-        where_clause = ' AND '.join(clauses)
+        return ' AND '.join(clauses)
+
+    def cypher(self, result, ipd, source, count_only=False):
+        '''
+        Given an optional ROI and status, generate the Cypher query
+          self: object
+          result: result dictionary
+          ipd: input parameters
+          source: neuprint source
+        '''
+        perfstart = datetime.now()
+        where_clause = self.where_clause(ipd)
         suffix = " RETURN COUNT(n)" if count_only else " RETURN n ORDER BY n.size DESC"
         payload = {"cypher" : "MATCH (n:`" + source + "`) WHERE " + where_clause \
                    + suffix}
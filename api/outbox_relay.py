@@ -0,0 +1,132 @@
+''' outbox_relay.py
+    Publish CDC messages from the outbox table to Kafka. Messages are sent in
+    id order and marked as published only after Kafka acknowledges them, so
+    delivery is at-least-once. Several relays may run at once.
+'''
+
+import argparse
+import os
+import sys
+import time
+import colorlog
+from flask import Config
+from kafka import KafkaProducer
+from assignment_utilities import call_responder
+from db_pool import connect
+
+READ = {'UNPUBLISHED': "SELECT id,topic,message FROM outbox WHERE publish_date IS NULL "
+                       + "ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED"}
+WRITE = {'PUBLISHED': "UPDATE outbox SET publish_date=NOW() WHERE id IN (%s)",
+         'PURGE': "DELETE FROM outbox WHERE publish_date < NOW() - INTERVAL %s DAY LIMIT 10000"}
+
+
+def get_broker_list():
+    ''' Get the Kafka broker list from the configuration system
+        Returns:
+          broker list
+    '''
+    if ARG.broker:
+        return ARG.broker.split(',')
+    data = call_responder('config', 'config/servers')
+    return data['config']['Kafka']['broker_list']
+
+
+def relay_batch(conn, producer):
+    ''' Publish one batch of unpublished messages
+        Keyword arguments:
+          conn: database connection
+          producer: Kafka producer
+        Returns:
+          number of messages published
+    '''
+    cursor = conn.cursor()
+    cursor.execute(READ['UNPUBLISHED'], (ARG.batch,))
+    rows = cursor.fetchall()
+    if not rows:
+        conn.commit()
+        return 0
+    futures = [producer.send(row['topic'], row['message'].encode('utf-8')) for row in rows]
+    try:
+        for future in futures:
+            future.get(timeout=ARG.timeout)
+    except Exception as err:
+        # Nothing is marked as published, so the whole batch will be resent
+        conn.rollback()
+        raise err
+    sql = WRITE['PUBLISHED'] % ','.join(['%s'] * len(rows))
+    cursor.execute(sql, [row['id'] for row in rows])
+    conn.commit()
+    return len(rows)
+
+
+def purge_published(conn):
+    ''' Delete published messages older than the retention period
+        Keyword arguments:
+          conn: database connection
+    '''
+    cursor = conn.cursor()
+    cursor.execute(WRITE['PURGE'], (ARG.retain,))
+    conn.commit()
+    if cursor.rowcount:
+        LOGGER.info("Purged %d published messages", cursor.rowcount)
+
+
+def run_relay():
+    ''' Publish messages until interrupted
+    '''
+    config = Config(os.path.dirname(os.path.abspath(__file__)))
+    config.from_pyfile('config.cfg')
+    conn = connect(config)
+    producer = KafkaProducer(bootstrap_servers=get_broker_list())
+    last_purge = 0
+    while True:
+        try:
+            conn.ping(reconnect=True)
+            published = relay_batch(conn, producer)
+        except Exception as err:
+            LOGGER.error("Could not publish batch: %s", err)
+            time.sleep(ARG.poll)
+            continue
+        if published:
+            LOGGER.info("Published %d messages", published)
+            if ARG.once:
+                continue
+        elif ARG.once:
+            break
+        else:
+            time.sleep(ARG.poll)
+        if ARG.retain and time.time() - last_purge >= 3600:
+            purge_published(conn)
+            last_purge = time.time()
+    producer.close()
+
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description='Publish outbox CDC messages to Kafka')
+    PARSER.add_argument('--batch', dest='batch', action='store', type=int, default=500,
+                        help='Messages per batch (optional, default=500)')
+    PARSER.add_argument('--poll', dest='poll', action='store', type=float, default=1,
+                        help='Seconds to wait when the outbox is empty (optional, default=1)')
+    PARSER.add_argument('--timeout', dest='timeout', action='store', type=int, default=30,
+                        help='Seconds to wait for Kafka acknowledgement (optional, default=30)')
+    PARSER.add_argument('--retain', dest='retain', action='store', type=int, default=7,
+                        help='Days to keep published messages (optional, default=7, 0=forever)')
+    PARSER.add_argument('--broker', dest='broker', action='store',
+                        help='Kafka broker list (optional, default from configuration system)')
+    PARSER.add_argument('--once', action='store_true', dest='once',
+                        default=False, help='Exit when the outbox is empty')
+    PARSER.add_argument('--verbose', action='store_true', dest='verbose',
+                        default=False, help='Turn on verbose output')
+    ARG = PARSER.parse_args()
+    LOGGER = colorlog.getLogger()
+    LOGGER.setLevel(colorlog.colorlog.logging.INFO if ARG.verbose
+                    else colorlog.colorlog.logging.WARNING)
+    HANDLER = colorlog.StreamHandler()
+    HANDLER.setFormatter(colorlog.ColoredFormatter())
+    LOGGER.addHandler(HANDLER)
+    try:
+        run_relay()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,186 @@
+''' query_benchmark.py
+    Show the plan and latency of the hot task queries. Each query is run in
+    its old form (through task_vw) and its current form (queries that still
+    use task_vw rely on the indexes alone). Save a run with
+    --output before adding the task indexes (sql/migrations/task-indexes.sql),
+    then run again with --compare to see the difference.
+'''
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import colorlog
+from flask import Config
+from db_pool import connect
+
+# Sample rows used to bind the queries
+SAMPLE = {
+    'task': "SELECT t.id,t.project_id,p.name AS project,t.assignment_id,t.key_type_id,"
+            + "cv.name AS key_type,t.key_text,t.user,t.disposition FROM task t JOIN project p "
+            + "ON (p.id=t.project_id) JOIN cv_term cv ON (cv.id=t.key_type_id) WHERE "
+            + "t.assignment_id IS NOT NULL AND t.disposition IS NOT NULL "
+            + "ORDER BY t.id DESC LIMIT 1",
+}
+USER_TASKS = "SELECT id,project,assignment,protocol,priority,start_date,completion_date," \
+             + "disposition,SEC_TO_TIME(duration) AS duration FROM task_vw WHERE user=%s " \
+             + "AND assignment IS NOT NULL " \
+             + "ORDER BY start_date,priority,protocol,project,assignment,id"
+DISPOSITION_TASKS = "SELECT id,project,assignment,protocol,user,priority,start_date," \
+                    + "completion_date,disposition,SEC_TO_TIME(duration) AS duration FROM " \
+                    + "task_vw WHERE disposition=%s AND assignment IS NOT NULL " \
+                    + "ORDER BY start_date,priority,protocol,project,assignment,id"
+# name: (old SQL, current SQL, bind columns from the sample task)
+QUERIES = {
+    'task_by_id': ("SELECT * FROM task_vw WHERE id=%s",
+                   "SELECT t.*,pp.name AS protocol FROM task t JOIN project p ON "
+                   + "(p.id=t.project_id) LEFT OUTER JOIN cv_term pp ON (pp.id=p.protocol_id) "
+                   + "WHERE t.id=%s",
+                   ['id']),
+    'task_by_key': ("SELECT * FROM task_vw WHERE project_id=%s AND key_type=%s AND key_text=%s",
+                    "SELECT id FROM task WHERE project_id=%s AND key_type_id=%s AND key_text=%s",
+                    [['project_id', 'key_type', 'key_text'],
+                     ['project_id', 'key_type_id', 'key_text']]),
+    'project_incomplete': ("SELECT COUNT(1) AS c FROM task_vw WHERE project=%s AND "
+                           + "completion_date IS NULL",
+                           "SELECT CAST(IFNULL(SUM(num),0) AS SIGNED) AS c FROM "
+                           + "project_task_count ptc JOIN project p ON (p.id=ptc.project_id) "
+                           + "WHERE p.name=%s AND completed=0",
+                           ['project']),
+    'unassigned_tasks': ("SELECT id FROM task_vw WHERE project=%s AND assignment_id IS NULL "
+                         + "ORDER BY id LIMIT 100",
+                         "SELECT id FROM task WHERE project_id=%s AND assignment_id IS NULL "
+                         + "ORDER BY id LIMIT 100",
+                         [['project'], ['project_id']]),
+    'incomplete_assignment_tasks': ("SELECT id FROM task_vw WHERE assignment_id=%s AND "
+                                    + "completion_date IS NULL",
+                                    "SELECT id FROM task WHERE assignment_id=%s AND "
+                                    + "completion_date IS NULL",
+                                    ['assignment_id']),
+    'user_tasks': (USER_TASKS, USER_TASKS, ['user']),
+    'disposition_tasks': (DISPOSITION_TASKS, DISPOSITION_TASKS, ['disposition']),
+}
+
+
+def get_binds(columns, sample):
+    ''' Get the old and current bind values for a query
+        Keyword arguments:
+          columns: list of sample columns, or [old columns, current columns]
+          sample: sample task row
+        Returns:
+          old bind tuple, current bind tuple
+    '''
+    if isinstance(columns[0], list):
+        return tuple(sample[col] for col in columns[0]), tuple(sample[col] for col in columns[1])
+    bind = tuple(sample[col] for col in columns)
+    return bind, bind
+
+
+def explain(cursor, sql, bind):
+    ''' Get a query plan
+        Keyword arguments:
+          cursor: database cursor
+          sql: SQL statement
+          bind: bind values
+        Returns:
+          list of plan rows (table, access type, key, estimated rows)
+    '''
+    cursor.execute("EXPLAIN " + sql, bind)
+    return [[row['table'], row['type'], row['key'], row['rows']] for row in cursor.fetchall()]
+
+
+def time_query(cursor, sql, bind):
+    ''' Time a query
+        Keyword arguments:
+          cursor: database cursor
+          sql: SQL statement
+          bind: bind values
+        Returns:
+          dictionary of median and 95th percentile latency (ms)
+    '''
+    cursor.execute(sql, bind)
+    cursor.fetchall()
+    times = []
+    for _ in range(ARG.iterations):
+        start = time.perf_counter()
+        cursor.execute(sql, bind)
+        cursor.fetchall()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {'median': statistics.median(times),
+            'p95': times[min(len(times) - 1, int(len(times) * 0.95))]}
+
+
+def run_benchmark(conn):
+    ''' Explain and time every query
+        Keyword arguments:
+          conn: database connection
+        Returns:
+          dictionary of results
+    '''
+    cursor = conn.cursor()
+    cursor.execute(SAMPLE['task'])
+    sample = cursor.fetchone()
+    if not sample:
+        LOGGER.critical("There are no assigned tasks to use as a sample")
+        sys.exit(-1)
+    LOGGER.info("Sample task: %s", sample['id'])
+    results = dict()
+    for name, (old_sql, new_sql, columns) in QUERIES.items():
+        old_bind, new_bind = get_binds(columns, sample)
+        results[name] = dict()
+        for version, sql, bind in (('old', old_sql, old_bind), ('current', new_sql, new_bind)):
+            results[name][version] = {'plan': explain(cursor, sql, bind)}
+            results[name][version].update(time_query(cursor, sql, bind))
+    return results
+
+
+def report(results, previous=None):
+    ''' Print plans and latencies
+        Keyword arguments:
+          results: results from this run
+          previous: results from a saved run
+    '''
+    for name, versions in results.items():
+        print(name)
+        for version, res in versions.items():
+            line = "  %-8s median %8.3f ms  p95 %8.3f ms" % (version, res['median'], res['p95'])
+            if previous and name in previous:
+                line += "  (saved: median %8.3f ms)" % previous[name][version]['median']
+            print(line)
+            for table, access, key, rows in res['plan']:
+                print("    %-12s %-8s %-32s rows=%s" % (table, access, key, rows))
+
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description='Benchmark hot task queries')
+    PARSER.add_argument('--iterations', dest='iterations', action='store', type=int,
+                        default=50, help='Executions per query (optional, default=50)')
+    PARSER.add_argument('--output', dest='output', action='store',
+                        help='Save results to a JSON file')
+    PARSER.add_argument('--compare', dest='compare', action='store',
+                        help='Compare with results saved by --output')
+    PARSER.add_argument('--verbose', action='store_true', dest='verbose',
+                        default=False, help='Turn on verbose output')
+    ARG = PARSER.parse_args()
+    LOGGER = colorlog.getLogger()
+    LOGGER.setLevel(colorlog.colorlog.logging.INFO if ARG.verbose
+                    else colorlog.colorlog.logging.WARNING)
+    HANDLER = colorlog.StreamHandler()
+    HANDLER.setFormatter(colorlog.ColoredFormatter())
+    LOGGER.addHandler(HANDLER)
+    CONFIG = Config(os.path.dirname(os.path.abspath(__file__)))
+    CONFIG.from_pyfile('config.cfg')
+    RESULTS = run_benchmark(connect(CONFIG))
+    PREVIOUS = None
+    if ARG.compare:
+        with open(ARG.compare) as instream:
+            PREVIOUS = json.load(instream)
+    report(RESULTS, PREVIOUS)
+    if ARG.output:
+        with open(ARG.output, 'w') as outstream:
+            json.dump(RESULTS, outstream, indent=2)
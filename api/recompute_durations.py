@@ -0,0 +1,162 @@
+''' recompute_durations.py
+    Recompute working_duration for completed tasks and assignments (after a
+    change to the working hours or holidays, for example). Rows are read in
+    batches by ID, durations are computed for the whole batch at once, and
+    changed values are written with one UPDATE per batch, committing after
+    each batch so the live service isn't blocked.
+'''
+
+import argparse
+import os
+import sys
+import time
+import colorlog
+from flask import Config
+import numpy as np
+from business_hours import working_durations
+from db_pool import connect
+
+LOGGER = colorlog.getLogger()
+READ = {
+    'PROJECT': "SELECT id FROM project WHERE name=%s",
+    'ROWS': "SELECT id,start_date,completion_date,working_duration FROM %s WHERE id>%%s "
+            + "AND start_date IS NOT NULL AND completion_date IS NOT NULL%s "
+            + "ORDER BY id LIMIT %%s",
+}
+WRITE = {
+    'DURATION': "UPDATE %s SET working_duration=CASE id %s END WHERE id IN (%s)",
+}
+
+
+def build_filter(since, project_id):
+    ''' Build the filter for the rows to recompute
+        Keyword arguments:
+          since: earliest completion date (YYYY-MM-DD)
+          project_id: project ID
+        Returns:
+          SQL clause, bind list
+    '''
+    clause = ''
+    bind = []
+    if since:
+        clause += " AND completion_date>=%s"
+        bind.append(since)
+    if project_id:
+        clause += " AND project_id=%s"
+        bind.append(project_id)
+    return clause, bind
+
+
+def update_durations(cursor, table, changes):
+    ''' Write changed durations with a single statement
+        Keyword arguments:
+          cursor: database cursor
+          table: task or assignment
+          changes: list of (ID, working duration)
+    '''
+    cases = ' '.join(["WHEN %s THEN %s"] * len(changes))
+    bind = [val for change in changes for val in change]
+    bind.extend([change[0] for change in changes])
+    cursor.execute(WRITE['DURATION'] % (table, cases, ','.join(['%s'] * len(changes))), bind)
+
+
+def recompute_table(conn, table, clause, bind):
+    ''' Recompute working durations for a table
+        Keyword arguments:
+          conn: database connection
+          table: task or assignment
+          clause: SQL filter clause
+          bind: filter bind values
+        Returns:
+          rows read, rows changed
+    '''
+    cursor = conn.cursor()
+    sql = READ['ROWS'] % (table, clause)
+    last_id = 0
+    read = changed = 0
+    while True:
+        cursor.execute(sql, [last_id] + bind + [ARG.batch])
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        read += len(rows)
+        # Same conversion as complete_task/complete_assignment
+        starts = np.array([int(row['start_date'].timestamp()) for row in rows], dtype=np.int64)
+        ends = np.array([int(row['completion_date'].timestamp()) for row in rows],
+                        dtype=np.int64)
+        durations = working_durations(starts, ends)
+        changes = [(row['id'], int(duration)) for row, duration in zip(rows, durations)
+                   if row['working_duration'] != duration]
+        changed += len(changes)
+        if ARG.dry_run:
+            old = {row['id']: row['working_duration'] for row in rows}
+            for tid, duration in changes:
+                print("%s\t%s\t%s\t%s" % (table, tid, old[tid], duration))
+        elif changes:
+            update_durations(cursor, table, changes)
+            conn.commit()
+            if ARG.pause:
+                time.sleep(ARG.pause)
+        LOGGER.info("%s: %d read, %d changed", table, read, changed)
+    return read, changed
+
+
+def recompute_durations(conn):
+    ''' Recompute working durations for tasks and assignments
+        Keyword arguments:
+          conn: database connection
+    '''
+    project_id = None
+    if ARG.project:
+        cursor = conn.cursor()
+        cursor.execute(READ['PROJECT'], (ARG.project,))
+        row = cursor.fetchone()
+        if not row:
+            LOGGER.critical("Project %s was not found", ARG.project)
+            sys.exit(-1)
+        project_id = row['id']
+    clause, bind = build_filter(ARG.since, project_id)
+    if ARG.dry_run:
+        print("table\tid\tworking_duration\tnew_working_duration")
+    for table in ARG.table:
+        start = time.time()
+        read, changed = recompute_table(conn, table, clause, bind)
+        print("%s: %d rows read, %d %s in %.1f sec" % (table, read, changed,
+                                                      'would change' if ARG.dry_run
+                                                      else 'changed', time.time() - start),
+              file=sys.stderr)
+
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description='Recompute working durations')
+    PARSER.add_argument('--table', dest='table', action='append', choices=['task', 'assignment'],
+                        help='Table to recompute (optional, default is both)')
+    PARSER.add_argument('--since', dest='since', action='store',
+                        help='Only rows completed on or after this date (YYYY-MM-DD)')
+    PARSER.add_argument('--project', dest='project', action='store',
+                        help='Only rows for this project')
+    PARSER.add_argument('--batch', dest='batch', action='store', type=int, default=5000,
+                        help='Rows per batch (optional, default=5000)')
+    PARSER.add_argument('--pause', dest='pause', action='store', type=float, default=0,
+                        help='Seconds to pause between batches (optional, default=0)')
+    PARSER.add_argument('--dry-run', action='store_true', dest='dry_run',
+                        default=False, help='Print changes (TSV) without writing them')
+    PARSER.add_argument('--verbose', action='store_true', dest='verbose',
+                        default=False, help='Turn on verbose output')
+    ARG = PARSER.parse_args()
+    if not ARG.table:
+        ARG.table = ['task', 'assignment']
+    LOGGER.setLevel(colorlog.colorlog.logging.INFO if ARG.verbose
+                    else colorlog.colorlog.logging.WARNING)
+    HANDLER = colorlog.StreamHandler()
+    HANDLER.setFormatter(colorlog.ColoredFormatter())
+    LOGGER.addHandler(HANDLER)
+    CONFIG = Config(os.path.dirname(os.path.abspath(__file__)))
+    CONFIG.from_pyfile('config.cfg')
+    try:
+        recompute_durations(connect(CONFIG))
+    except KeyboardInterrupt:
+        sys.exit(0)
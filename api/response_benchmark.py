@@ -0,0 +1,107 @@
+''' response_benchmark.py
+    Measure the size and serialization time of the response to a bulk task
+    upload (/tasks/<protocol>/<project>) at each verbosity level, including
+    the uploaded tasks the endpoint returns. Uploads are synthetic: a "tasks"
+    dictionary keyed by body ID, as sent by the task upload clients. No
+    database or server is needed.
+'''
+
+import argparse
+import json
+import statistics
+import time
+import response_shaping
+
+LEVELS = {0: 'minimal', 1: 'summary', 2: 'full'}
+
+
+def build_upload(count):
+    ''' Build a synthetic task upload
+        Keyword arguments:
+          count: number of tasks
+        Returns:
+          payload dictionary, raw request body
+    '''
+    payload = {"tasks": {str(1000000000 + idx): {"post": idx % 500, "pre": idx % 50,
+                                                 "size": 100000 + idx,
+                                                 "status": "Roughly traced",
+                                                 "cluster_name": "cluster_%d" % (idx % 20)}
+                         for idx in range(count)},
+               "note": "benchmark upload"}
+    return payload, json.dumps(payload).encode('utf-8')
+
+
+def build_result(payload, count):
+    ''' Build the result dictionary for an upload, as the endpoint would
+        Keyword arguments:
+          payload: payload dictionary
+          count: number of tasks
+        Returns:
+          result dictionary
+    '''
+    values = ','.join(["('%s',1,NULL,2,'%s','benchmark')" % (key, key)
+                       for key in payload['tasks']])
+    # The endpoint returns each task's ID and stored properties
+    tasks = {key: dict(task, id=idx + 1)
+             for idx, (key, task) in enumerate(payload['tasks'].items())}
+    return {'rest': {'requester': '127.0.0.1',
+                     'url': 'http://localhost/tasks/orphan_link/benchmark',
+                     'endpoint': 'new_tasks_for_project',
+                     'error': False,
+                     'elapsed_time': '',
+                     'row_count': count * 6,
+                     'pid': 0,
+                     'json': payload,
+                     'sql_statement': "INSERT INTO task (name,project_id,assignment_id,"
+                                      + "key_type_id,key_text,user) VALUES " + values,
+                     'inserted_id': 1,
+                     'tasks_inserted': count},
+            'tasks': tasks}
+
+
+def measure(payload, raw, count, level):
+    ''' Shape and serialize a response
+        Keyword arguments:
+          payload: payload dictionary
+          raw: raw request body
+          count: number of tasks
+          level: verbosity level
+        Returns:
+          response bytes, median time (ms)
+    '''
+    times = []
+    size = 0
+    for _ in range(ARG.iterations):
+        result = build_result(payload, count)
+        start = time.perf_counter()
+        response_shaping.shape_rest(result['rest'], level, raw)
+        response_shaping.shape_tasks(result, level)
+        size = len(json.dumps(result).encode('utf-8'))
+        times.append((time.perf_counter() - start) * 1000)
+    return size, statistics.median(times)
+
+
+def run_benchmark():
+    ''' Measure each upload size at each verbosity level
+    '''
+    print("%8s  %-8s %12s %10s" % ('tasks', 'level', 'bytes', 'ms'))
+    for count in ARG.tasks:
+        payload, raw = build_upload(count)
+        print("%8d  %-8s %12d" % (count, 'upload', len(raw)))
+        for level, name in LEVELS.items():
+            size, elapsed = measure(payload, raw, count, level)
+            print("%8d  %-8s %12d %10.3f" % (count, name, size, elapsed))
+
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description='Benchmark bulk upload responses')
+    PARSER.add_argument('--tasks', dest='tasks', action='append', type=int,
+                        help='Tasks per upload (optional, default is 100, 1000 and 10000)')
+    PARSER.add_argument('--iterations', dest='iterations', action='store', type=int,
+                        default=20, help='Serializations per measurement (optional, default=20)')
+    ARG = PARSER.parse_args()
+    if not ARG.tasks:
+        ARG.tasks = [100, 1000, 10000]
+    run_benchmark()
@@ -0,0 +1,111 @@
+''' response_shaping.py
+    Shape the parts of a response that echo the request. The "rest" block can
+    echo the request payload ("json" or "form") and the SQL that was run
+    ("sql_statement"), and task uploads return the uploaded tasks ("tasks").
+    The _verbose query parameter sets how much of that is returned:
+      0: none of it
+      1: (default) values up to ECHO_BYTES as is, larger values as a summary
+         (size, SHA-256 and item counts); uploaded tasks as key -> task ID
+      2: everything
+'''
+
+import hashlib
+import json
+
+DEFAULT_LEVEL = 1
+ECHO_BYTES = 4096
+# Keys in "rest" that echo the request
+PAYLOAD_KEYS = ['json', 'form']
+ECHO_KEYS = PAYLOAD_KEYS + ['sql_statement']
+
+
+def get_level(value, default=None):
+    ''' Convert a _verbose value to a verbosity level
+        Keyword arguments:
+          value: _verbose value (None if not specified)
+          default: level to use if value is not specified (default is DEFAULT_LEVEL)
+        Returns:
+          verbosity level
+    '''
+    if value is None or value == '':
+        return DEFAULT_LEVEL if default is None else default
+    if str(value) not in ('0', '1', '2'):
+        raise ValueError("_verbose must be 0, 1 or 2")
+    return int(value)
+
+
+def summarize(value, raw=None):
+    ''' Summarize a value
+        Keyword arguments:
+          value: value to summarize
+          raw: serialized value (bytes), if it is already available
+        Returns:
+          summary dictionary
+    '''
+    if raw is None:
+        if isinstance(value, str):
+            raw = value.encode('utf-8')
+        else:
+            raw = json.dumps(value, sort_keys=True, default=str).encode('utf-8')
+    summary = {'summarized': True,
+               'bytes': len(raw),
+               'sha256': hashlib.sha256(raw).hexdigest()}
+    if isinstance(value, dict):
+        summary['items'] = {key: len(val) if isinstance(val, (dict, list)) else 1
+                            for key, val in value.items()}
+    elif isinstance(value, list):
+        summary['items'] = len(value)
+    return summary
+
+
+def shape_rest(rest, level, raw=None):
+    ''' Remove or summarize echoed values in a response's "rest" block
+        Keyword arguments:
+          rest: rest dictionary (changed in place)
+          level: verbosity level
+          raw: raw request body (bytes)
+        Returns:
+          rest dictionary
+    '''
+    if level >= 2:
+        return rest
+    for key in ECHO_KEYS:
+        if key not in rest:
+            continue
+        if not level:
+            del rest[key]
+            continue
+        body = raw if key in PAYLOAD_KEYS and raw else None
+        if body is not None:
+            size = len(body)
+        elif isinstance(rest[key], str):
+            size = len(rest[key])
+        else:
+            body = json.dumps(rest[key], sort_keys=True, default=str).encode('utf-8')
+            size = len(body)
+        if size > ECHO_BYTES:
+            rest[key] = summarize(rest[key], body)
+    return rest
+
+
+def shape_tasks(result, level):
+    ''' Remove or reduce the uploaded tasks in a response
+        Keyword arguments:
+          result: result dictionary (changed in place)
+          level: verbosity level
+        Returns:
+          result dictionary
+    '''
+    if level >= 2 or 'tasks' not in result:
+        return result
+    tasks = result['tasks']
+    if not level:
+        del result['tasks']
+    elif isinstance(tasks, dict) and all(isinstance(task, dict) and 'id' in task
+                                         for task in tasks.values()):
+        result['tasks'] = {key: task['id'] for key, task in tasks.items()}
+    else:
+        body = json.dumps(tasks, sort_keys=True, default=str).encode('utf-8')
+        if len(body) > ECHO_BYTES:
+            result['tasks'] = summarize(tasks, body)
+    return result
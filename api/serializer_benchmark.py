@@ -0,0 +1,92 @@
+''' serializer_benchmark.py
+    Compare response serialization time for large results: jsonify's path
+    (json.dumps with CustomJSONEncoder) against the fast path
+    (serializers.serialize) with each available backend. Results are
+    synthetic task_vw rows; no database or server is needed.
+'''
+
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+import serializers
+from serializers import CustomJSONEncoder
+
+START = datetime(2019, 6, 3, 8, 15, 0)
+
+
+def build_rows(count):
+    ''' Build synthetic task rows
+        Keyword arguments:
+          count: number of rows
+        Returns:
+          list of row dictionaries
+    '''
+    rows = []
+    for idx in range(count):
+        start = START + timedelta(minutes=idx)
+        done = idx % 3
+        rows.append({'id': idx + 1, 'name': 'task_%d' % (idx), 'project': 'benchmark',
+                     'project_id': 1, 'protocol': 'orphan_link', 'priority': 10,
+                     'assignment': 'benchmark_%d' % (idx // 100), 'assignment_id': idx // 100,
+                     'key_type': 'body_id', 'key_text': str(1000000000 + idx),
+                     'user': 'proofreader%d' % (idx % 25), 'disposition': 'Complete' if done
+                                                                            else None,
+                     'create_date': START,
+                     'start_date': start,
+                     'completion_date': start + timedelta(hours=2) if done else None,
+                     'duration': timedelta(hours=2) if done else None,
+                     'working_duration': 7200 if done else None})
+    return rows
+
+
+def time_serializer(name, rows):
+    ''' Time one serializer
+        Keyword arguments:
+          name: encoder (jsonify) or fast path backend
+          rows: rows to serialize
+        Returns:
+          median seconds, output bytes
+    '''
+    times = []
+    size = 0
+    for _ in range(ARG.iterations):
+        result = {'rest': {'row_count': len(rows)}, 'data': [dict(row) for row in rows]}
+        start = time.perf_counter()
+        if name == 'jsonify':
+            output = json.dumps(result, cls=CustomJSONEncoder, separators=(',', ':'))
+        else:
+            output = serializers.serialize(result, name)
+        times.append(time.perf_counter() - start)
+        size = len(output)
+    return statistics.median(times), size
+
+
+def run_benchmark():
+    ''' Time each serializer for each result size
+    '''
+    names = ['jsonify'] + [name for name in serializers.BACKENDS
+                           if name != 'orjson' or serializers.orjson]
+    print("%9s  %-8s %10s %12s %8s" % ('rows', 'path', 'seconds', 'bytes', 'speedup'))
+    for count in ARG.rows:
+        rows = build_rows(count)
+        base = None
+        for name in names:
+            elapsed, size = time_serializer(name, rows)
+            base = base or elapsed
+            print("%9d  %-8s %10.3f %12d %7.1fx" % (count, name, elapsed, size, base / elapsed))
+
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description='Benchmark response serialization')
+    PARSER.add_argument('--rows', dest='rows', action='append', type=int,
+                        help='Rows per result (optional, default is 10000, 100000 and 1000000)')
+    PARSER.add_argument('--iterations', dest='iterations', action='store', type=int,
+                        default=3, help='Serializations per measurement (optional, default=3)')
+    ARG = PARSER.parse_args()
+    if not ARG.rows:
+        ARG.rows = [10000, 100000, 1000000]
+    run_benchmark()
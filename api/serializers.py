@@ -0,0 +1,175 @@
+''' serializers.py
+    JSON serialization for responses. CustomJSONEncoder is the encoder used
+    by jsonify. serialize() is the fast path: lists of rows (as returned by
+    DictCursor) are converted a column at a time, with the converter for
+    each column chosen once, and the result is encoded natively by orjson
+    (or by the standard library's C encoder if orjson isn't installed).
+    Dates, times and durations are formatted exactly as CustomJSONEncoder
+    formats them.
+'''
+
+from datetime import date, datetime, timedelta
+import json
+from flask.json import JSONEncoder
+try:
+    import orjson
+except ImportError: # pragma: no cover
+    orjson = None
+
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+MONTHS = [None, 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov',
+          'Dec']
+
+
+# *****************************************************************************
+# * Classes                                                                   *
+# *****************************************************************************
+class CustomJSONEncoder(JSONEncoder):
+    ''' Define a custom JSON encoder
+    '''
+    def default(self, obj):   # pylint: disable=E0202, W0221
+        try:
+            if isinstance(obj, datetime):
+                return obj.strftime('%a, %-d %b %Y %H:%M:%S')
+            if isinstance(obj, timedelta):
+                seconds = obj.total_seconds()
+                hours = seconds // 3600
+                minutes = (seconds % 3600) // 60
+                seconds = seconds % 60
+                return "%02d:%02d:%.2f" % (hours, minutes, seconds)
+            iterable = iter(obj)
+        except TypeError:
+            pass
+        else:
+            return list(iterable)
+        return JSONEncoder.default(self, obj)
+
+
+ENCODER = CustomJSONEncoder()
+
+
+# *****************************************************************************
+# * Converters                                                                *
+# *****************************************************************************
+def format_datetime(obj):
+    ''' Format a datetime (as strftime('%a, %-d %b %Y %H:%M:%S'))
+        Keyword arguments:
+          obj: datetime
+        Returns:
+          formatted datetime
+    '''
+    return "%s, %d %s %d %02d:%02d:%02d" % (DAYS[obj.weekday()], obj.day, MONTHS[obj.month],
+                                            obj.year, obj.hour, obj.minute, obj.second)
+
+
+def format_date(obj):
+    ''' Format a date (as an HTTP date, like Flask's encoder)
+        Keyword arguments:
+          obj: date
+        Returns:
+          formatted date
+    '''
+    return "%s, %02d %s %04d 00:00:00 GMT" % (DAYS[obj.weekday()], obj.day, MONTHS[obj.month],
+                                              obj.year)
+
+
+def format_timedelta(obj):
+    ''' Format a timedelta (as hours:minutes:seconds)
+        Keyword arguments:
+          obj: timedelta
+        Returns:
+          formatted timedelta
+    '''
+    seconds = obj.total_seconds()
+    return "%02d:%02d:%.2f" % (seconds // 3600, (seconds % 3600) // 60, seconds % 60)
+
+
+CONVERTERS = {datetime: format_datetime, date: format_date, timedelta: format_timedelta}
+
+
+def default(obj):
+    ''' Convert an object the native encoders can't handle
+        Keyword arguments:
+          obj: object
+        Returns:
+          JSON-serializable value
+    '''
+    converter = CONVERTERS.get(type(obj))
+    if converter:
+        return converter(obj)
+    return ENCODER.default(obj)
+
+
+def convert_rows(rows):
+    ''' Convert the dates, times and durations in a list of rows (in place).
+        Each column's converter is chosen from its first non-NULL value.
+        Keyword arguments:
+          rows: list of row dictionaries
+    '''
+    for column in rows[0]:
+        value = next((row[column] for row in rows if row.get(column) is not None), None)
+        vtype = type(value)
+        converter = CONVERTERS.get(vtype)
+        if not converter:
+            continue
+        for row in rows:
+            value = row.get(column)
+            if type(value) is vtype: # pylint: disable=C0123
+                row[column] = converter(value)
+
+
+def prepare(result):
+    ''' Convert the lists of rows in a result dictionary (in place)
+        Keyword arguments:
+          result: result dictionary
+        Returns:
+          result dictionary
+    '''
+    for value in result.values():
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            convert_rows(value)
+        elif isinstance(value, dict):
+            for inner in value.values():
+                if isinstance(inner, list) and inner and isinstance(inner[0], dict):
+                    convert_rows(inner)
+    return result
+
+
+# *****************************************************************************
+# * Serializers                                                               *
+# *****************************************************************************
+def dumps_orjson(obj):
+    ''' Serialize with orjson
+        Keyword arguments:
+          obj: object to serialize
+        Returns:
+          JSON (bytes)
+    '''
+    # pylint: disable=E1101
+    return orjson.dumps(obj, default=default,
+                        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+
+
+def dumps_json(obj):
+    ''' Serialize with the standard library encoder
+        Keyword arguments:
+          obj: object to serialize
+        Returns:
+          JSON (bytes)
+    '''
+    return json.dumps(obj, default=default, separators=(',', ':')).encode('utf-8')
+
+
+BACKENDS = {'orjson': dumps_orjson, 'json': dumps_json}
+BACKEND = 'orjson' if orjson else 'json'
+
+
+def serialize(result, backend=None):
+    ''' Serialize a result dictionary using the fast path
+        Keyword arguments:
+          result: result dictionary (lists of rows are converted in place)
+          backend: orjson or json (default is BACKEND)
+        Returns:
+          JSON (bytes)
+    '''
+    return BACKENDS[backend or BACKEND](prepare(result))
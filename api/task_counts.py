@@ -0,0 +1,158 @@
+''' task_counts.py
+    Maintain the project_task_count table: the number of tasks in each
+    project by (assigned, disposition, completed). Counts are adjusted in the
+    same transaction as the task changes; run this file to check the table
+    against the task table (and optionally repair it).
+'''
+
+import argparse
+import os
+import sys
+import colorlog
+from flask import Config
+from db_pool import connect
+
+LOGGER = colorlog.getLogger()
+READ = {
+    'ACTUAL': "SELECT project_id,assignment_id IS NOT NULL AS assigned,IFNULL(disposition,'') "
+              + "AS disposition,completion_date IS NOT NULL AS completed,COUNT(1) AS num FROM "
+              + "task WHERE project_id=%s GROUP BY 1,2,3,4",
+    'COUNTED': "SELECT project_id,assigned,disposition,completed,num FROM project_task_count "
+               + "WHERE project_id=%s AND num<>0",
+    'PROJECTS': "SELECT id,name FROM project ORDER BY id",
+}
+WRITE = {
+    'ADJUST': "INSERT INTO project_task_count (project_id,assigned,disposition,completed,num) "
+              + "VALUES (%s,%s,%s,%s,%s) ON DUPLICATE KEY UPDATE num=num+VALUES(num)",
+    'DELETE_PROJECT': "DELETE FROM project_task_count WHERE project_id=%s",
+    'REBUILD_PROJECT': "INSERT INTO project_task_count (project_id,assigned,disposition,"
+                       + "completed,num) SELECT project_id,assignment_id IS NOT NULL,"
+                       + "IFNULL(disposition,''),completion_date IS NOT NULL,COUNT(1) FROM task "
+                       + "WHERE project_id=%s GROUP BY 1,2,3,4",
+}
+
+
+def task_state(project_id, assignment_id=None, disposition=None, completion_date=None):
+    ''' Get the counter key for a task
+        Keyword arguments:
+          project_id: project ID
+          assignment_id: assignment ID
+          disposition: task disposition
+          completion_date: task completion date
+        Returns:
+          (project ID, assigned, disposition, completed)
+    '''
+    return (project_id, 1 if assignment_id else 0, disposition or '',
+            1 if completion_date else 0)
+
+
+def adjust_task_counts(cursor, deltas):
+    ''' Apply changes to the task counters. The caller commits, so the
+        counters change with the tasks.
+        Keyword arguments:
+          cursor: database cursor
+          deltas: dictionary of counter key (from task_state) -> change
+    '''
+    bind = [key + (delta,) for key, delta in deltas.items() if delta]
+    if bind:
+        cursor.executemany(WRITE['ADJUST'], bind)
+
+
+def move_tasks(cursor, tasks, **changes):
+    ''' Adjust the counters for tasks whose state is changing
+        Keyword arguments:
+          cursor: database cursor
+          tasks: task rows before the change (with project_id, assignment_id,
+                 disposition and completion_date)
+          changes: new values for assignment_id, disposition or completion_date
+    '''
+    deltas = dict()
+    for task in tasks:
+        old = {key: task.get(key) for key in ('assignment_id', 'disposition', 'completion_date')}
+        new = dict(old)
+        new.update(changes)
+        old_key = task_state(task['project_id'], **old)
+        new_key = task_state(task['project_id'], **new)
+        if old_key != new_key:
+            deltas[old_key] = deltas.get(old_key, 0) - 1
+            deltas[new_key] = deltas.get(new_key, 0) + 1
+    adjust_task_counts(cursor, deltas)
+
+
+def rebuild_project_counts(cursor, project_id):
+    ''' Recount a project's tasks
+        Keyword arguments:
+          cursor: database cursor
+          project_id: project ID
+    '''
+    cursor.execute(WRITE['DELETE_PROJECT'], (project_id,))
+    cursor.execute(WRITE['REBUILD_PROJECT'], (project_id,))
+
+
+def check_project_counts(cursor, project_id):
+    ''' Compare a project's counters with its tasks
+        Keyword arguments:
+          cursor: database cursor
+          project_id: project ID
+        Returns:
+          list of (counter key, counted, actual) for counters that differ
+    '''
+    cursor.execute(READ['ACTUAL'], (project_id,))
+    actual = {(row['project_id'], row['assigned'], row['disposition'], row['completed']):
+              row['num'] for row in cursor.fetchall()}
+    cursor.execute(READ['COUNTED'], (project_id,))
+    counted = {(row['project_id'], row['assigned'], row['disposition'], row['completed']):
+               row['num'] for row in cursor.fetchall()}
+    return [(key, counted.get(key, 0), actual.get(key, 0))
+            for key in sorted(set(actual) | set(counted))
+            if counted.get(key, 0) != actual.get(key, 0)]
+
+
+def check_all_projects(conn, repair=False):
+    ''' Check (and optionally repair) the counters for every project
+        Keyword arguments:
+          conn: database connection
+          repair: recount projects with incorrect counters
+        Returns:
+          number of projects with incorrect counters
+    '''
+    cursor = conn.cursor()
+    cursor.execute(READ['PROJECTS'])
+    bad = 0
+    for project in cursor.fetchall():
+        errors = check_project_counts(cursor, project['id'])
+        if errors:
+            bad += 1
+            for key, counted, actual in errors:
+                LOGGER.warning("%s assigned=%s disposition='%s' completed=%s: counted %s, "
+                               + "actual %s", project['name'], key[1], key[2], key[3], counted,
+                               actual)
+            if repair:
+                rebuild_project_counts(cursor, project['id'])
+                LOGGER.warning("Recounted %s", project['name'])
+        conn.commit()
+    return bad
+
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description='Check the project_task_count table')
+    PARSER.add_argument('--repair', action='store_true', dest='repair',
+                        default=False, help='Recount projects with incorrect counts')
+    PARSER.add_argument('--verbose', action='store_true', dest='verbose',
+                        default=False, help='Turn on verbose output')
+    ARG = PARSER.parse_args()
+    LOGGER.setLevel(colorlog.colorlog.logging.INFO if ARG.verbose
+                    else colorlog.colorlog.logging.WARNING)
+    HANDLER = colorlog.StreamHandler()
+    HANDLER.setFormatter(colorlog.ColoredFormatter())
+    LOGGER.addHandler(HANDLER)
+    CONFIG = Config(os.path.dirname(os.path.abspath(__file__)))
+    CONFIG.from_pyfile('config.cfg')
+    try:
+        BAD = check_all_projects(connect(CONFIG), ARG.repair)
+    except KeyboardInterrupt:
+        sys.exit(0)
+    print("Projects with incorrect counts: %d" % BAD)
+    sys.exit(1 if BAD and not ARG.repair else 0)
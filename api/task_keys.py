@@ -0,0 +1,151 @@
+''' task_keys.py
+    Search index for task keys. Keys are split into the IDs they contain
+    (body IDs for body_id, multibody and body_xyz keys, coordinates for xyz
+    and body_xyz keys), and each ID is stored in task_key_index so that key
+    searches are equality lookups.
+'''
+
+import re
+
+# Separators between the IDs in a composite key (multibody keys use "_",
+# focused merge keys use "+")
+SEPARATORS = re.compile(r'[_+]')
+# Separators accepted between the parts of a coordinate search
+COORDINATE_SEPARATORS = re.compile(r'[_,\s]+')
+SEARCH = "SELECT t.id,pp.name AS protocol,p.name AS project,a.name AS assignment," \
+         + "ktype.display_name AS key_type_display,t.key_text FROM %s " \
+         + "JOIN project p ON (p.id=t.project_id) " \
+         + "JOIN cv_term ktype ON (ktype.id=t.key_type_id) " \
+         + "LEFT OUTER JOIN cv_term pp ON (pp.id=p.protocol_id) " \
+         + "LEFT OUTER JOIN assignment a ON (a.id=t.assignment_id) WHERE %s"
+READ = {
+    'SEARCH_ID': SEARCH % ("task t", "t.id=%s"),
+    # Tasks whose keys contain all of the given IDs (the condition is filled in
+    # by search_sql)
+    'SEARCH_KEY': SEARCH % ("task t", "t.id IN (SELECT task_id FROM task_key_index WHERE %s "
+                            + "GROUP BY task_id HAVING COUNT(1)=%d)"),
+    # Tasks with exactly the given key text (uses the key type/key text index)
+    'SEARCH_TEXT': SEARCH % ("task t", "t.key_type_id IN (SELECT id FROM cv_term_vw "
+                             + "WHERE cv='key') AND t.key_text=%s"),
+    'BATCH_SEARCH': "SELECT tki.value,t.id,pp.name AS protocol,p.name AS project,"
+                    + "a.name AS assignment,t.disposition FROM task_key_index tki "
+                    + "JOIN task t ON (t.id=tki.task_id) JOIN project p ON (p.id=t.project_id) "
+                    + "LEFT OUTER JOIN cv_term pp ON (pp.id=p.protocol_id) "
+                    + "LEFT OUTER JOIN assignment a ON (a.id=t.assignment_id) "
+                    + "WHERE tki.kind=%%s AND tki.value IN (%s)",
+}
+WRITE = {
+    'INDEX_KEY': "INSERT IGNORE INTO task_key_index (kind,value,task_id) VALUES (%s,%s,%s)",
+}
+
+
+def key_components(key_type, key_text):
+    ''' Split a task key into the IDs it contains
+        Keyword arguments:
+          key_type: key type
+          key_text: key text
+        Returns:
+          list of (kind, value), where kind is body or xyz
+    '''
+    key_text = str(key_text)
+    if key_type == 'xyz':
+        return [('xyz', key_text)]
+    parts = [part for part in SEPARATORS.split(key_text) if part]
+    if key_type == 'body_xyz' and len(parts) > 1:
+        return [('body', parts[0]), ('xyz', '_'.join(parts[1:]))]
+    return [('body', part) for part in sorted(set(parts))]
+
+
+def search_value(kind, text):
+    ''' Normalize search text for a lookup
+        Keyword arguments:
+          kind: body or xyz
+          text: search text
+        Returns:
+          value to look up
+    '''
+    text = str(text).strip()
+    if kind == 'xyz':
+        return '_'.join([part for part in COORDINATE_SEPARATORS.split(text) if part])
+    return text
+
+
+def search_components(kind, text):
+    ''' Split search text into the IDs a matching task's key must contain. A
+        full multibody key is split into its body IDs, and a full body_xyz key
+        searched as coordinates is split into its body ID and coordinates.
+        Keyword arguments:
+          kind: body or xyz
+          text: search text
+        Returns:
+          list of (kind, value)
+    '''
+    value = search_value(kind, text)
+    if not value:
+        return []
+    if kind == 'xyz':
+        parts = value.split('_')
+        if len(parts) > 3:
+            return [('body', parts[0]), ('xyz', '_'.join(parts[1:]))]
+        return [('xyz', value)]
+    return [('body', part) for part in sorted(set(SEPARATORS.split(value))) if part]
+
+
+def search_sql(kind, text):
+    ''' Build the query for a single key search. Tasks match if their keys
+        contain all of the IDs in the search text, or if their key text is
+        exactly the search text.
+        Keyword arguments:
+          kind: body or xyz
+          text: search text
+        Returns:
+          SQL statement, bind tuple
+    '''
+    text = str(text).strip()
+    components = search_components(kind, text)
+    if not components:
+        return READ['SEARCH_TEXT'], (text, )
+    match = ' OR '.join(['(kind=%s AND value=%s)'] * len(components))
+    sql = READ['SEARCH_KEY'] % (match, len(components)) + " UNION " + READ['SEARCH_TEXT']
+    bind = tuple([item for component in components for item in component])
+    return sql, bind + (text, )
+
+
+def index_task_keys(cursor, key_type, tasks):
+    ''' Add tasks to the search index (the caller commits)
+        Keyword arguments:
+          cursor: database cursor
+          key_type: key type
+          tasks: iterable of (task ID, key text)
+        Returns:
+          number of index rows written
+    '''
+    rows = [(kind, value, task_id) for task_id, key_text in tasks
+            for kind, value in key_components(key_type, key_text)]
+    if rows:
+        cursor.executemany(WRITE['INDEX_KEY'], rows)
+    return len(rows)
+
+
+def search_keys(cursor, kind, values, incomplete=False, chunk=1000):
+    ''' Find the tasks for a list of body IDs or coordinates, one query per
+        chunk of values
+        Keyword arguments:
+          cursor: database cursor
+          kind: body or xyz
+          values: list of search values (normalized with search_value)
+          incomplete: only return tasks that haven't been completed
+          chunk: values per query
+        Returns:
+          dictionary of value -> list of tasks
+    '''
+    found = dict()
+    for start in range(0, len(values), chunk):
+        part = values[start:start + chunk]
+        sql = READ['BATCH_SEARCH'] % ','.join(['%s'] * len(part))
+        if incomplete:
+            sql += " AND t.completion_date IS NULL"
+        cursor.execute(sql + " ORDER BY tki.value,t.id", [kind] + part)
+        for row in cursor.fetchall():
+            found.setdefault(row.pop('value'), []).append(row)
+    return found
@@ -5,185 +5,264 @@
 
 from datetime import datetime
 from flask import g
+from assignment_stats import refresh_assignment_stats
 from assignment_utilities import InvalidUsage, sql_error
+from cv_term_cache import get_cv_term_id, get_key_type_id
+from task_keys import index_task_keys
+from task_counts import adjust_task_counts, task_state
 
+# Number of keys per set-based lookup
+CHUNK_SIZE = 1000
+# VALUES lists contain only placeholders so that executemany sends multi-row inserts
+READ = {
+    'EXISTING_KEYS': "SELECT id,key_text,project_id,assignment_id,user FROM task WHERE "
+                     + "key_type_id=%%s AND project_id=%%s AND key_text IN (%s)",
+}
 WRITE = {
     'INSERT_TASK': "INSERT INTO task (name,project_id,assignment_id,key_type_id,key_text,"
-                   + "user) VALUES (%s,%s,%s,getCvTermId('key',%s,NULL),%s,%s)",
+                   + "user) VALUES (%s,%s,%s,%s,%s,%s)",
     'TASK_AUDIT': "INSERT INTO task_audit (task_id,project_id,assignment_id,key_type_id,key_text,"
-                  + "disposition,user) VALUES (%s,%s,%s,getCvTermId('key',%s,NULL),%s,%s,%s)",
+                  + "disposition,user) VALUES (%s,%s,%s,%s,%s,%s,%s)",
     'TASK_PROP' : "INSERT INTO task_property (task_id,type_id,value) VALUES "
-                  + "(%s,getCvTermId('task',%s,NULL),%s) ON DUPLICATE KEY UPDATE value=%s"
+                  + "(%s,%s,%s) ON DUPLICATE KEY UPDATE value=VALUES(value)"
 }
 
 
-def generate_tasks(result, key_type, task_insert_props, existing_project):
-    ''' Generate and persist a list of tasks for a project
+def get_property_type_ids(props):
+    ''' Resolve task property names to CV term IDs
+        Keyword arguments:
+          props: list of task property names
+        Returns:
+          dictionary of property name -> CV term ID
+    '''
+    type_id = dict()
+    for prop in props:
+        type_id[prop] = get_cv_term_id('task', prop)
+        if not type_id[prop]:
+            raise InvalidUsage("%s is not a valid task property" % prop)
+    return type_id
+
+
+def find_tasks_by_key(project_id, key_type_id, keys):
+    ''' Find tasks in a project for a list of keys, using one query per chunk
+        Keyword arguments:
+          project_id: project ID
+          key_type_id: key type CV term ID
+          keys: list of keys
+        Returns:
+          dictionary of key -> task row
+    '''
+    found = dict()
+    for start in range(0, len(keys), CHUNK_SIZE):
+        chunk = keys[start:start + CHUNK_SIZE]
+        sql = READ['EXISTING_KEYS'] % ','.join(['%s'] * len(chunk))
+        try:
+            g.c.execute(sql, [key_type_id, project_id] + chunk)
+            rows = g.c.fetchall()
+        except Exception as err:
+            raise InvalidUsage(sql_error(err), 500)
+        for row in rows:
+            found[row['key_text']] = row
+    return found
+
+
+def add_count(result, key, count):
+    ''' Add to a count in the result
+        Keyword arguments:
+          result: result dictionary
+          key: count name
+          count: number to add
+    '''
+    if count:
+        result['rest'][key] = result['rest'].get(key, 0) + count
+
+
+def generate_tasks(result, key_type, task_insert_props, progress=None):
+    ''' Generate and persist a list (or one batch) of tasks for a project.
+        Tasks that already exist in the project have their properties
+        updated. Counts in result['rest'] accumulate across batches.
         Keyword arguments:
           result: result dictionary
           key_type: key type
           task_insert_props: project properties to persist
-          existing_project: indicates if this is a new or existing project
+          progress: optional function called with the number of tasks processed
     '''
     perfstart = datetime.now()
-    ignored = inserted = 0
-    existing_task = dict()
-    existing_task_id = dict()
     project_id = result['rest']['inserted_id']
-    if existing_project:
-        # Find existing tasks and put them in the existing_task dictionary
-        try:
-            g.c.execute("SELECT id,assignment_id,key_text FROM task WHERE project_id=%s", (project_id))
-            existing = g.c.fetchall()
-            for extask in existing:
-                existing_task[extask['key_text']] = extask['assignment_id']
-                existing_task_id[extask['key_text']] = extask['id']
-        except Exception as err:
-            raise InvalidUsage(sql_error(err), 500)
-    insert_list = []
+    key_type_id = get_key_type_id(key_type)
+    type_id = get_property_type_ids(task_insert_props)
     query_task = dict()
-    inserted_key = dict()
     for task in result['tasks']:
-        key = str(task[key_type])
-        query_task[key] = task
-        if key in existing_task:
-            ignored += 1
-        else:
-            name = "%d.%s" % (result['rest']['inserted_id'], key)
-            bind = (name, result['rest']['inserted_id'], None, key_type,
-                    key, result['rest']['user'],)
-            insert_list.append(bind)
-            inserted_key[key] = 1
+        query_task[str(task[key_type])] = task
+    keys = list(query_task)
+    existing_task = find_tasks_by_key(project_id, key_type_id, keys)
+    insert_list = []
+    for key in keys:
+        if key not in existing_task:
+            name = "%d.%s" % (project_id, key)
+            insert_list.append((name, project_id, None, key_type_id, key,
+                                result['rest']['user'],))
+    inserted = 0
     if insert_list:
         try:
             g.c.executemany(WRITE['INSERT_TASK'], insert_list)
             result['rest']['row_count'] += g.c.rowcount
             inserted = g.c.rowcount
+            adjust_task_counts(g.c, {task_state(project_id): inserted})
         except Exception as err:
             raise InvalidUsage(sql_error(err), 500)
     # Insert/update task properties
-    existing_task = dict()
-    try:
-        g.c.execute("SELECT id,key_text FROM task WHERE project_id=%s", (project_id))
-        existing = g.c.fetchall()
-        for extask in existing:
-            existing_task[extask['key_text']] = extask['id']
-    except Exception as err:
-        raise InvalidUsage(sql_error(err), 500)
-    # existing_task now contains key -> task ID
     insert_list = []
     audit_list = []
+    index_list = []
     proprecs = {'insert': 0, 'update': 0}
-    for key in existing_task:
-        if key in query_task:
-            operation = 'update'
-            if key in inserted_key:
-                bind = (existing_task[key], project_id, None, key_type, key,
-                        'Created', result['rest']['user'])
-                audit_list.append(bind)
-                operation = 'insert'
-            for prop in task_insert_props:
-                if prop in query_task[key]:
-                    value = query_task[key][prop]
-                    bind = (existing_task[key], prop, value, value)
-                    insert_list.append(bind)
-                    proprecs[operation] += 1
-    if insert_list:
-        print("Task properties to insert/update: %s" % len(insert_list))
-        try:
+    for key, etask in (find_tasks_by_key(project_id, key_type_id, keys).items()
+                       if inserted else existing_task.items()):
+        operation = 'update'
+        if key not in existing_task:
+            audit_list.append((etask['id'], project_id, None, key_type_id, key,
+                               'Created', result['rest']['user']))
+            index_list.append((etask['id'], key))
+            operation = 'insert'
+        for prop in task_insert_props:
+            if prop in query_task[key]:
+                insert_list.append((etask['id'], type_id[prop], query_task[key][prop]))
+                proprecs[operation] += 1
+    try:
+        if insert_list:
+            print("Task properties to insert/update: %s" % len(insert_list))
             g.c.executemany(WRITE['TASK_PROP'], insert_list)
             result['rest']['row_count'] += g.c.rowcount
-        except Exception as err:
-            raise InvalidUsage(sql_error(err), 500)
-        try:
+        if audit_list:
             g.c.executemany(WRITE['TASK_AUDIT'], audit_list)
             result['rest']['row_count'] += g.c.rowcount
-        except Exception as err:
-            raise InvalidUsage(sql_error(err), 500)
+        index_task_keys(g.c, key_type, index_list)
+    except Exception as err:
+        raise InvalidUsage(sql_error(err), 500)
     result['rest']['elapsed_task_generation'] = str(datetime.now() - perfstart)
-    if ignored:
-        result['rest']['tasks_skipped'] = ignored
-    if inserted:
-        result['rest']['tasks_inserted'] = inserted
-    if proprecs['insert']:
-        result['rest']['task_properties_inserted'] = proprecs['insert']
-    if proprecs['update']:
-        result['rest']['task_properties_to_update'] = proprecs['update']
+    add_count(result, 'tasks_skipped', len(existing_task))
+    add_count(result, 'tasks_inserted', inserted)
+    add_count(result, 'task_properties_inserted', proprecs['insert'])
+    add_count(result, 'task_properties_to_update', proprecs['update'])
+    if progress:
+        progress(len(result['tasks']))
     g.db.commit()
 
 
-def create_tasks_from_json(ipd, project_id, key_type, task_insert_props, assignment_id, result, this_user):
-    ''' Create and persist a list of task from JSON input
+def generate_task_batches(result, key_type, task_insert_props, batches, progress=None):
+    ''' Generate and persist tasks for a project from batches of tasks. Each
+        batch is committed when it has been inserted.
+        Keyword arguments:
+          result: result dictionary
+          key_type: key type
+          task_insert_props: project properties to persist
+          batches: iterable of task lists
+          progress: optional function called with the number of tasks processed
+    '''
+    perfstart = datetime.now()
+    done = 0
+    for batch in batches:
+        result['tasks'] = batch
+        generate_tasks(result, key_type, task_insert_props)
+        done += len(batch)
+        if progress:
+            progress(done)
+    result['tasks'] = []
+    result['rest']['tasks_processed'] = done
+    result['rest']['elapsed_task_generation'] = str(datetime.now() - perfstart)
+
+
+def insert_json_tasks(ipd, keys, project_id, key_type, type_id, assignment_id, result,
+                      this_user):
+    ''' Insert one chunk of tasks (with their properties, audit rows and
+        search index entries)
         Keyword arguments:
           ipd: input parameters
+          keys: list of task keys to insert
           project_id: project ID
           key_type: key type
-          task_insert_props: project properties to persist
+          type_id: dictionary of task property name -> CV term ID
           assignment_id: assignment ID
           result: result dictionary
-          this_user: user to assign tasks ti
+          this_user: user to assign tasks to
     '''
+    key_type_id = get_key_type_id(key_type)
     insert_list = []
-    # Insert tasks
-    for key in ipd['tasks']:
-        try:
-            g.c.execute("SELECT * FROM task_vw WHERE project_id=%s AND key_type=%s AND key_text=%s", (project_id, key_type, key))
-            task = g.c.fetchone()
-        except Exception as err:
-            raise InvalidUsage(sql_error(err), 500)
-        if task:
-            raise InvalidUsage("Task exists for %s %s in project %s" \
-                               % (key_type, key, project_id))
+    for key in keys:
         if 'name' in ipd['tasks'][key]:
             name = ipd['tasks'][key]['name']
         else:
             name = "%d.%s" % (project_id, key)
-        bind = (name, project_id, assignment_id, key_type, key, this_user)
-        insert_list.append(bind)
-    if insert_list:
-        try:
-            g.c.executemany(WRITE['INSERT_TASK'], insert_list)
-            result['rest']['row_count'] += g.c.rowcount
-        except Exception as err:
-            raise InvalidUsage(sql_error(err), 500)
-    result['rest']['tasks_inserted'] = len(insert_list)
-    # Select tasks to get IDs and build list of properties to insert
-    result['tasks'] = dict()
-    insertprop_list = []
+        insert_list.append((name, project_id, assignment_id, key_type_id, key, this_user))
     try:
-        g.c.execute("SELECT * FROM task WHERE project_id=%s", (project_id))
-        existing = g.c.fetchall()
+        g.c.executemany(WRITE['INSERT_TASK'], insert_list)
+        result['rest']['row_count'] += g.c.rowcount
+        adjust_task_counts(g.c, {task_state(project_id, assignment_id): len(insert_list)})
     except Exception as err:
         raise InvalidUsage(sql_error(err), 500)
+    # Select the new tasks to get IDs and build list of properties to insert
+    insertprop_list = []
     audit_list = []
-    for etask in existing:
-        key = etask['key_text']
-        # Skip this one if it wasn't just inserted
-        if key not in ipd['tasks']:
-            continue
+    index_list = []
+    for key, etask in find_tasks_by_key(project_id, key_type_id, keys).items():
         result['tasks'].update({key: {"id": etask['id']}})
-        bind = (etask['id'], etask['project_id'], etask['assignment_id'], key_type,
-                etask['key_text'], 'Created', etask['user'])
-        audit_list.append(bind)
+        index_list.append((etask['id'], key))
+        audit_list.append((etask['id'], etask['project_id'], etask['assignment_id'], key_type_id,
+                           etask['key_text'], 'Created', etask['user']))
         # Task properties
-        for parm in task_insert_props:
+        for parm in type_id:
             if parm in ipd['tasks'][key]:
-                bind = (etask['id'], parm, ipd['tasks'][key][parm], ipd['tasks'][key][parm])
-                insertprop_list.append(bind)
+                insertprop_list.append((etask['id'], type_id[parm], ipd['tasks'][key][parm]))
                 result['tasks'][key][parm] = ipd['tasks'][key][parm]
-    if insertprop_list:
-        print("Task properties to insert: %s" % len(insertprop_list))
-        try:
+    try:
+        if insertprop_list:
             g.c.executemany(WRITE['TASK_PROP'], insertprop_list)
             result['rest']['row_count'] += g.c.rowcount
-        except Exception as err:
-            raise InvalidUsage(sql_error(err), 500)
-    # Update task_audit
-    if audit_list:
-        print("Task audit entries to insert: %s" % len(audit_list))
+        # Update task_audit
+        g.c.executemany(WRITE['TASK_AUDIT'], audit_list)
+        result['rest']['row_count'] += g.c.rowcount
+        index_task_keys(g.c, key_type, index_list)
+    except Exception as err:
+        raise InvalidUsage(sql_error(err), 500)
+
+
+def create_tasks_from_json(ipd, project_id, key_type, task_insert_props, assignment_id, result,
+                           this_user, progress=None, commit=True):
+    ''' Create and persist a list of task from JSON input. Tasks are inserted
+        in chunks with set-based existence checks and ID lookups, and CV
+        terms are resolved once per call. All chunks are committed together.
+        Keyword arguments:
+          ipd: input parameters
+          project_id: project ID
+          key_type: key type
+          task_insert_props: project properties to persist
+          assignment_id: assignment ID
+          result: result dictionary
+          this_user: user to assign tasks ti
+          progress: optional function called with the number of tasks processed
+          commit: commit when done (otherwise the caller commits)
+    '''
+    key_type_id = get_key_type_id(key_type)
+    type_id = get_property_type_ids(task_insert_props)
+    keys = [str(key) for key in ipd['tasks']]
+    result['tasks'] = dict()
+    for start in range(0, len(keys), CHUNK_SIZE):
+        chunk = keys[start:start + CHUNK_SIZE]
+        existing = find_tasks_by_key(project_id, key_type_id, chunk)
+        if existing:
+            key = next(iter(existing))
+            raise InvalidUsage("Task exists for %s %s in project %s" \
+                               % (key_type, key, project_id))
+        insert_json_tasks(ipd, chunk, project_id, key_type, type_id, assignment_id, result,
+                          this_user)
+        if progress:
+            progress(start + len(chunk))
+    if assignment_id:
         try:
-            g.c.executemany(WRITE['TASK_AUDIT'], audit_list)
-            result['rest']['row_count'] += g.c.rowcount
+            refresh_assignment_stats(g.c, [assignment_id])
         except Exception as err:
             raise InvalidUsage(sql_error(err), 500)
-    g.db.commit()
+    result['rest']['tasks_inserted'] = len(keys)
+    print("Tasks inserted: %s" % len(keys))
+    if commit:
+        g.db.commit()
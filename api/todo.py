@@ -16,6 +16,7 @@ class Todo:
         self.unit = 'xyz'
         self.optional_properties = ['note', 'group', 'source']
         self.allowable_filters = []
+        self.task_list_key = 'points'
         # self.no_assignment = True
         self.allowable_todo_types = ['diagnostic', 'irrelevant', 'merge', 'no_soma', 'to split',
                                      'svsplit', 'trace_to_soma']
@@ -187,6 +187,11 @@ CREATE TABLE `task` (
   `working_duration` int(10) unsigned DEFAULT NULL,
   PRIMARY KEY (`id`),
   KEY `task_type_key_uk_ind` (`key_type_id`,`key_text`) USING BTREE,
+  KEY `task_project_assignment_ind` (`project_id`,`assignment_id`) USING BTREE,
+  KEY `task_assignment_completion_ind` (`assignment_id`,`completion_date`) USING BTREE,
+  KEY `task_project_key_ind` (`project_id`,`key_type_id`,`key_text`) USING BTREE,
+  KEY `task_user_start_ind` (`user`,`start_date`) USING BTREE,
+  KEY `task_disposition_ind` (`disposition`) USING BTREE,
   CONSTRAINT `task_project_id_fk` FOREIGN KEY (`project_id`) REFERENCES `project` (`id`) ON DELETE NO ACTION ON UPDATE NO ACTION,
   CONSTRAINT `task_assignment_id_fk` FOREIGN KEY (`assignment_id`) REFERENCES `assignment` (`id`) ON DELETE NO ACTION ON UPDATE NO ACTION,
   CONSTRAINT `task_key_type_id_fk` FOREIGN KEY (`key_type_id`) REFERENCES `cv_term` (`id`) ON DELETE NO ACTION ON UPDATE NO ACTION
@@ -211,6 +216,19 @@ CREATE TABLE `task_property` (
 ) ENGINE=InnoDB AUTO_INCREMENT=64766 DEFAULT CHARSET=latin1;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+DROP TABLE IF EXISTS `task_key_index`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `task_key_index` (
+  `kind` varchar(8) CHARACTER SET latin1 COLLATE latin1_general_cs NOT NULL,
+  `value` varchar(128) CHARACTER SET latin1 COLLATE latin1_general_cs NOT NULL,
+  `task_id` int(10) unsigned NOT NULL,
+  PRIMARY KEY (`kind`,`value`,`task_id`),
+  KEY `task_key_index_task_id_fk_ind` (`task_id`) USING BTREE,
+  CONSTRAINT `task_key_index_task_id_fk` FOREIGN KEY (`task_id`) REFERENCES `task` (`id`) ON DELETE CASCADE ON UPDATE NO ACTION
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 DROP TABLE IF EXISTS `task_audit`;
 /*!40101 SET @saved_cs_client     = @@character_set_client */;
 /*!40101 SET character_set_client = utf8 */;
@@ -264,4 +282,73 @@ CREATE TABLE `user_permission` (
 ) ENGINE=InnoDB AUTO_INCREMENT=1001 DEFAULT CHARSET=latin1;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+DROP TABLE IF EXISTS `outbox`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `outbox` (
+  `id` bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+  `topic` varchar(128) CHARACTER SET latin1 COLLATE latin1_general_cs NOT NULL,
+  `message` mediumtext NOT NULL,
+  `create_date` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `publish_date` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `outbox_publish_date_ind` (`publish_date`,`id`) USING BTREE
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+DROP TABLE IF EXISTS `job`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `job` (
+  `id` int(10) unsigned NOT NULL AUTO_INCREMENT,
+  `job_type` varchar(64) CHARACTER SET latin1 COLLATE latin1_general_cs NOT NULL,
+  `status` varchar(32) CHARACTER SET latin1 COLLATE latin1_general_cs NOT NULL DEFAULT 'queued',
+  `payload` longtext NOT NULL,
+  `total` int(10) unsigned DEFAULT NULL,
+  `progress` int(10) unsigned NOT NULL DEFAULT 0,
+  `rows_inserted` int(10) unsigned NOT NULL DEFAULT 0,
+  `attempts` tinyint(3) unsigned NOT NULL DEFAULT 0,
+  `max_attempts` tinyint(3) unsigned NOT NULL DEFAULT 3,
+  `error` text,
+  `result` text,
+  `user` varchar(128) CHARACTER SET latin1 COLLATE latin1_general_cs NOT NULL,
+  `worker` varchar(255) DEFAULT NULL,
+  `create_date` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `start_date` timestamp NULL DEFAULT NULL,
+  `heartbeat_date` timestamp NULL DEFAULT NULL,
+  `completion_date` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `job_status_ind` (`status`,`id`) USING BTREE
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+DROP TABLE IF EXISTS `assignment_stats`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `assignment_stats` (
+  `assignment_id` int(10) unsigned NOT NULL,
+  `tasks` int(10) unsigned NOT NULL DEFAULT 0,
+  `started` int(10) unsigned NOT NULL DEFAULT 0,
+  `completed` int(10) unsigned NOT NULL DEFAULT 0,
+  `task_disposition` varchar(1024) CHARACTER SET latin1 COLLATE latin1_general_cs DEFAULT NULL,
+  `update_date` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`assignment_id`),
+  CONSTRAINT `assignment_stats_assignment_id_fk` FOREIGN KEY (`assignment_id`) REFERENCES `assignment` (`id`) ON DELETE CASCADE ON UPDATE NO ACTION
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+DROP TABLE IF EXISTS `project_task_count`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `project_task_count` (
+  `project_id` int(10) unsigned NOT NULL,
+  `assigned` tinyint(1) NOT NULL DEFAULT 0,
+  `disposition` varchar(128) CHARACTER SET latin1 COLLATE latin1_general_cs NOT NULL DEFAULT '',
+  `completed` tinyint(1) NOT NULL DEFAULT 0,
+  `num` int(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`project_id`,`assigned`,`disposition`,`completed`),
+  CONSTRAINT `project_task_count_project_id_fk` FOREIGN KEY (`project_id`) REFERENCES `project` (`id`) ON DELETE CASCADE ON UPDATE NO ACTION
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 SET FOREIGN_KEY_CHECKS=0;
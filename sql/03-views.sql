@@ -442,11 +442,10 @@ SELECT
     a.start_date AS start_date,
     a.completion_date AS completion_date,
     a.protocol,
-    GROUP_CONCAT(DISTINCT IFNULL(t.disposition,'NULL')) AS task_disposition,
-    COUNT(t.id) AS tasks
+    s.task_disposition AS task_disposition,
+    s.tasks AS tasks
 FROM assignment_vw a
-JOIN task t ON (t.assignment_id=a.id)
+JOIN assignment_stats s ON (s.assignment_id=a.id AND s.tasks > 0)
 JOIN user u ON (a.user=u.name)
-GROUP BY a.user,a.project,a.name
 ORDER BY proofreader,project,assignment
 ;
@@ -0,0 +1,41 @@
+-- Per-assignment task statistics (see api/assignment_stats.py). New databases
+-- get this table from 02-schema.sql (files in this directory aren't run when
+-- the database is created); run this file once against an existing database,
+-- before starting the new version. It creates and fills the table and
+-- replaces project_stats_vw, which now reads it.
+CREATE TABLE IF NOT EXISTS `assignment_stats` (
+  `assignment_id` int(10) unsigned NOT NULL,
+  `tasks` int(10) unsigned NOT NULL DEFAULT 0,
+  `started` int(10) unsigned NOT NULL DEFAULT 0,
+  `completed` int(10) unsigned NOT NULL DEFAULT 0,
+  `task_disposition` varchar(1024) CHARACTER SET latin1 COLLATE latin1_general_cs DEFAULT NULL,
+  `update_date` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`assignment_id`),
+  CONSTRAINT `assignment_stats_assignment_id_fk` FOREIGN KEY (`assignment_id`) REFERENCES `assignment` (`id`) ON DELETE CASCADE ON UPDATE NO ACTION
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+
+DELETE FROM assignment_stats;
+INSERT INTO assignment_stats (assignment_id,tasks,started,completed,task_disposition)
+SELECT assignment_id,COUNT(1),COUNT(start_date),COUNT(completion_date),
+       GROUP_CONCAT(DISTINCT IFNULL(disposition,'NULL'))
+FROM task
+WHERE assignment_id IS NOT NULL
+GROUP BY assignment_id;
+
+CREATE OR REPLACE VIEW project_stats_vw AS
+SELECT
+    a.user AS user,
+    CONCAT(u.last,', ',u.first) AS proofreader,
+    a.project,
+    a.name AS assignment,
+    a.create_date AS create_date,
+    a.start_date AS start_date,
+    a.completion_date AS completion_date,
+    a.protocol,
+    s.task_disposition AS task_disposition,
+    s.tasks AS tasks
+FROM assignment_vw a
+JOIN assignment_stats s ON (s.assignment_id=a.id AND s.tasks > 0)
+JOIN user u ON (a.user=u.name)
+ORDER BY proofreader,project,assignment
+;
@@ -0,0 +1,25 @@
+-- Durable background jobs (see api/jobs.py). New databases get this table
+-- from 02-schema.sql (files in this directory aren't run when the database
+-- is created); run this file once against an existing database before
+-- starting the new version (job workers poll this table).
+CREATE TABLE IF NOT EXISTS `job` (
+  `id` int(10) unsigned NOT NULL AUTO_INCREMENT,
+  `job_type` varchar(64) CHARACTER SET latin1 COLLATE latin1_general_cs NOT NULL,
+  `status` varchar(32) CHARACTER SET latin1 COLLATE latin1_general_cs NOT NULL DEFAULT 'queued',
+  `payload` longtext NOT NULL,
+  `total` int(10) unsigned DEFAULT NULL,
+  `progress` int(10) unsigned NOT NULL DEFAULT 0,
+  `rows_inserted` int(10) unsigned NOT NULL DEFAULT 0,
+  `attempts` tinyint(3) unsigned NOT NULL DEFAULT 0,
+  `max_attempts` tinyint(3) unsigned NOT NULL DEFAULT 3,
+  `error` text,
+  `result` text,
+  `user` varchar(128) CHARACTER SET latin1 COLLATE latin1_general_cs NOT NULL,
+  `worker` varchar(255) DEFAULT NULL,
+  `create_date` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `start_date` timestamp NULL DEFAULT NULL,
+  `heartbeat_date` timestamp NULL DEFAULT NULL,
+  `completion_date` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `job_status_ind` (`status`,`id`) USING BTREE
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
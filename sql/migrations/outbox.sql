@@ -0,0 +1,13 @@
+-- Change data capture outbox (see api/outbox_relay.py). New databases get
+-- this table from 02-schema.sql (files in this directory aren't run when the
+-- database is created); run this file once against an existing database
+-- before setting ENABLE_CDC.
+CREATE TABLE IF NOT EXISTS `outbox` (
+  `id` bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+  `topic` varchar(128) CHARACTER SET latin1 COLLATE latin1_general_cs NOT NULL,
+  `message` mediumtext NOT NULL,
+  `create_date` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `publish_date` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `outbox_publish_date_ind` (`publish_date`,`id`) USING BTREE
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
@@ -0,0 +1,21 @@
+-- Task counters per project (see api/task_counts.py). New databases get this
+-- table from 02-schema.sql (files in this directory aren't run when the
+-- database is created); run this file once against an existing database,
+-- before starting the new version. It creates the table and counts the
+-- existing tasks. Afterwards, "python task_counts.py" checks the counters.
+CREATE TABLE IF NOT EXISTS `project_task_count` (
+  `project_id` int(10) unsigned NOT NULL,
+  `assigned` tinyint(1) NOT NULL DEFAULT 0,
+  `disposition` varchar(128) CHARACTER SET latin1 COLLATE latin1_general_cs NOT NULL DEFAULT '',
+  `completed` tinyint(1) NOT NULL DEFAULT 0,
+  `num` int(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`project_id`,`assigned`,`disposition`,`completed`),
+  CONSTRAINT `project_task_count_project_id_fk` FOREIGN KEY (`project_id`) REFERENCES `project` (`id`) ON DELETE CASCADE ON UPDATE NO ACTION
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+
+DELETE FROM project_task_count;
+INSERT INTO project_task_count (project_id,assigned,disposition,completed,num)
+SELECT project_id,assignment_id IS NOT NULL,IFNULL(disposition,''),completion_date IS NOT NULL,
+       COUNT(1)
+FROM task
+GROUP BY project_id,assignment_id IS NOT NULL,IFNULL(disposition,''),completion_date IS NOT NULL;
@@ -0,0 +1,10 @@
+-- Composite indexes for task lookups. New databases get these from 02-schema.sql
+-- (files in this directory aren't run when the database is created); run this
+-- file once against an existing database.
+ALTER TABLE task
+  ADD KEY `task_project_assignment_ind` (`project_id`,`assignment_id`) USING BTREE,
+  ADD KEY `task_assignment_completion_ind` (`assignment_id`,`completion_date`) USING BTREE,
+  ADD KEY `task_project_key_ind` (`project_id`,`key_type_id`,`key_text`) USING BTREE,
+  ADD KEY `task_user_start_ind` (`user`,`start_date`) USING BTREE,
+  ADD KEY `task_disposition_ind` (`disposition`) USING BTREE,
+  ALGORITHM=INPLACE, LOCK=NONE;
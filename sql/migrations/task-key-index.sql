@@ -0,0 +1,12 @@
+-- Search index for task keys (see api/task_keys.py). New databases get this
+-- table from 02-schema.sql (files in this directory aren't run when the
+-- database is created); run this file once against an existing database,
+-- then fill the table with api/backfill_task_keys.py.
+CREATE TABLE `task_key_index` (
+  `kind` varchar(8) CHARACTER SET latin1 COLLATE latin1_general_cs NOT NULL,
+  `value` varchar(128) CHARACTER SET latin1 COLLATE latin1_general_cs NOT NULL,
+  `task_id` int(10) unsigned NOT NULL,
+  PRIMARY KEY (`kind`,`value`,`task_id`),
+  KEY `task_key_index_task_id_fk_ind` (`task_id`) USING BTREE,
+  CONSTRAINT `task_key_index_task_id_fk` FOREIGN KEY (`task_id`) REFERENCES `task` (`id`) ON DELETE CASCADE ON UPDATE NO ACTION
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
@@ -1,15 +1,37 @@
-''' Upload a JSON file to create tasks in assignment-manager
+''' Upload a JSON file (or a directory of JSON files) to create tasks in
+    assignment-manager
 '''
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import glob
 import sys
 import json
 import os
+import threading
+import time
 import requests
 import colorlog
 
 # Configuration
 CONFIG = {'config': {'url': 'http://config.int.janelia.org/'}}
+# Bulk uploads
+LOCAL = threading.local()
+CHECKPOINT_LOCK = threading.Lock()
+# Task creation isn't idempotent. These statuses mean the upload wasn't
+# processed, so it can be retried
+RETRY_STATUS = (429, 503)
+# These may come after the upload was committed: check before retrying
+UNCERTAIN_STATUS = (500, 502, 504)
+
+
+class UploadError(Exception):
+    ''' Upload failure
+    '''
+    def __init__(self, message, retry=False, uncertain=False):
+        Exception.__init__(self, message)
+        self.retry = retry
+        self.uncertain = uncertain
 
 def call_responder(server, endpoint, post=''):
     ''' Call a responder
@@ -41,6 +63,220 @@ def call_responder(server, endpoint, post=''):
     sys.exit(-1)
 
 
+def get_session():
+    ''' Get this thread's HTTP session (connections are kept alive between
+        uploads)
+        Returns:
+          requests session
+    '''
+    if not hasattr(LOCAL, 'session'):
+        LOCAL.session = requests.Session()
+        LOCAL.session.headers.update({"Content-Type": "application/json",
+                                      "Authorization": "Bearer " + ARGS.bearer})
+    return LOCAL.session
+
+
+def get_endpoint(file):
+    ''' Get the REST endpoint for a file
+        Keyword arguments:
+          file: filename
+        Returns:
+          endpoint
+    '''
+    if ARGS.assign:
+        assignment = os.path.splitext(os.path.basename(file))
+        return '/'.join(['tasks', ARGS.protocol, ARGS.project, assignment[0]])
+    return '/'.join(['tasks', ARGS.protocol, ARGS.project])
+
+
+def post_file(file, body):
+    ''' Upload one file's content
+        Keyword arguments:
+          file: filename
+          body: encoded JSON content
+        Returns:
+          response JSON
+    '''
+    url = CONFIG['assignment-manager']['url'] + get_endpoint(file)
+    try:
+        req = get_session().post(url, data=body, timeout=ARGS.timeout)
+    except requests.exceptions.ConnectTimeout as err:
+        # Never connected, so nothing was sent
+        raise UploadError(str(err), retry=True)
+    except requests.exceptions.RequestException as err:
+        # The server may have received (and committed) the upload
+        raise UploadError(str(err), uncertain=True)
+    if req.status_code in (200, 201):
+        return req.json()
+    try:
+        message = req.json()['rest']['message']
+    except: # pylint: disable=W0702
+        message = req.text
+    raise UploadError('%s: %s' % (req.status_code, message),
+                      retry=req.status_code in RETRY_STATUS,
+                      uncertain=req.status_code in UNCERTAIN_STATUS)
+
+
+def task_exists(key):
+    ''' Check whether a task exists in the project
+        Keyword arguments:
+          key: task key
+        Returns:
+          True if it exists
+    '''
+    url = CONFIG['assignment-manager']['url'] + 'tasks'
+    req = get_session().get(url, params={'project': ARGS.project, 'key_text': key,
+                                         '_columns': 'id', '_verbose': 0},
+                            timeout=ARGS.timeout)
+    if req.status_code == 404:
+        return False
+    req.raise_for_status()
+    return True
+
+
+def upload_committed(file, body):
+    ''' Check whether an upload was committed despite an error. With --assign,
+        the file's assignment is looked for; otherwise, the file's first and
+        last tasks.
+        Keyword arguments:
+          file: filename
+          body: encoded JSON content
+        Returns:
+          True if it was committed, False if it wasn't, None if it can't be told
+    '''
+    try:
+        if ARGS.assign:
+            url = CONFIG['assignment-manager']['url'] + 'assignments'
+            name = os.path.splitext(os.path.basename(file))[0]
+            req = get_session().get(url, params={'project': ARGS.project, 'name': name,
+                                                 '_columns': 'id', '_verbose': 0},
+                                    timeout=ARGS.timeout)
+            if req.status_code == 404:
+                return False
+            req.raise_for_status()
+            return True
+        tasks = json.loads(body.decode('utf-8')).get('tasks')
+        if not isinstance(tasks, dict) or not tasks:
+            return None
+        keys = list(tasks)
+        found = [task_exists(key) for key in set([keys[0], keys[-1]])]
+    except (requests.exceptions.RequestException, ValueError, AttributeError):
+        return None
+    if all(found):
+        return True
+    return False if not any(found) else None
+
+
+def upload_file(file):
+    ''' Upload a file, retrying transient failures with exponential backoff.
+        After an error that may have followed a commit (a read timeout or a
+        500/502/504), the upload is only retried if it wasn't committed.
+        Keyword arguments:
+          file: filename
+        Returns:
+          file, size in bytes, tasks inserted, job ID
+    '''
+    with open(file, 'rb') as content_file:
+        body = content_file.read()
+    try:
+        json.loads(body.decode('utf-8'))
+    except ValueError:
+        raise UploadError('File contains invalid JSON')
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            response = post_file(file, body)
+            break
+        except UploadError as err:
+            if err.uncertain:
+                committed = upload_committed(file, body)
+                if committed:
+                    LOGGER.warning("%s: %s - but the upload was committed", file, err)
+                    return (file, len(body), 0, None)
+                if committed is None:
+                    raise UploadError("%s (couldn't tell if the upload was committed: check "
+                                      % err + "project %s before uploading again)"
+                                      % ARGS.project)
+            elif not err.retry:
+                raise
+            if attempt > ARGS.retries:
+                raise
+            delay = ARGS.backoff * 2 ** (attempt - 1)
+            LOGGER.warning("%s (attempt %d): %s - retrying in %.1fs", file, attempt, err, delay)
+            time.sleep(delay)
+    if response['rest']['error']:
+        raise UploadError(response['rest']['error'])
+    return (file, len(body), max(response['rest'].get('tasks_inserted', 0), 0),
+            response['rest'].get('job_id'))
+
+
+def read_checkpoint():
+    ''' Read the names of files that have already been uploaded
+        Returns:
+          set of filenames
+    '''
+    if not os.path.exists(ARGS.checkpoint):
+        return set()
+    with open(ARGS.checkpoint, 'r') as instream:
+        return set(line.strip() for line in instream if line.strip())
+
+
+def write_checkpoint(file):
+    ''' Record an uploaded file
+        Keyword arguments:
+          file: filename
+    '''
+    with CHECKPOINT_LOCK:
+        with open(ARGS.checkpoint, 'a') as outstream:
+            outstream.write(os.path.abspath(file) + "\n")
+
+
+def process_directory(directory):
+    ''' Upload every JSON file in a directory in parallel. Files recorded in
+        the checkpoint file are skipped, so an interrupted run can be rerun.
+        Keyword arguments:
+          directory: directory name
+    '''
+    files = sorted(glob.glob(os.path.join(directory, '*.json')))
+    done = read_checkpoint()
+    pending = [file for file in files if os.path.abspath(file) not in done]
+    LOGGER.warning("%d files found, %d already uploaded, %d to upload", len(files),
+                   len(files) - len(pending), len(pending))
+    if ARGS.test:
+        return
+    count = {'files': 0, 'bytes': 0, 'tasks': 0, 'jobs': 0, 'failed': 0}
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=ARGS.workers) as executor:
+        futures = {executor.submit(upload_file, file): file for file in pending}
+        for future in as_completed(futures):
+            try:
+                file, size, tasks, job_id = future.result()
+            except Exception as err: # pylint: disable=W0703
+                LOGGER.error("%s: %s", futures[future], err)
+                count['failed'] += 1
+                continue
+            write_checkpoint(file)
+            count['files'] += 1
+            count['bytes'] += size
+            count['tasks'] += tasks
+            if job_id:
+                count['jobs'] += 1
+                LOGGER.info("%s: tasks queued as job %s", file, job_id)
+            else:
+                LOGGER.info("%s: tasks inserted: %d", file, tasks)
+    elapsed = max(time.time() - start, 0.001)
+    print("Files uploaded:     %d" % count['files'])
+    print("Files failed:       %d" % count['failed'])
+    print("Jobs queued:        %d" % count['jobs'])
+    print("Tasks inserted:     %d" % count['tasks'])
+    print("Elapsed time:       %.1fs" % elapsed)
+    print("Tasks/sec:          %.1f" % (count['tasks'] / elapsed))
+    print("Bytes/sec:          %.1f" % (count['bytes'] / elapsed))
+    if count['failed']:
+        sys.exit(-1)
+
+
 def process_file(file):
     ''' Process and upload a JSON file
         Keyword arguments:
@@ -53,11 +289,7 @@ def process_file(file):
     except IOError:
         LOGGER.critical("Could not read file %s", file)
         sys.exit(-1)
-    if ARGS.assign:
-        assignment = os.path.splitext(file)
-        endpoint = '/'.join(['tasks', ARGS.protocol, ARGS.project, assignment[0]])
-    else:
-        endpoint = '/'.join(['tasks', ARGS.protocol, ARGS.project])
+    endpoint = get_endpoint(file)
     #CONFIG['assignment-manager'] = {"url": "http://svirskasr-wm2.janelia.org/"} #PLUG
     try:
         content = json.loads(content)
@@ -67,6 +299,8 @@ def process_file(file):
     response = call_responder('assignment-manager', endpoint, content)
     if response['rest']['error']:
         LOGGER.critical(response['rest']['error'])
+    elif 'job_id' in response['rest']:
+        LOGGER.info("Tasks queued as job %s", response['rest']['job_id'])
     else:
         LOGGER.info("Tasks inserted: %s", response['rest']['tasks_inserted'])
 
@@ -84,8 +318,23 @@ if __name__ == '__main__':
                         default=False, help='Create assignment (use file name)')
     PARSER.add_argument('--bearer', dest='bearer', action='store',
                         help='JWT token')
-    PARSER.add_argument('--file', dest='file', action='store', required=True,
+    SOURCE = PARSER.add_mutually_exclusive_group(required=True)
+    SOURCE.add_argument('--file', dest='file', action='store',
                         help='JSON file')
+    SOURCE.add_argument('--dir', dest='dir', action='store',
+                        help='Directory of JSON files (bulk upload)')
+    PARSER.add_argument('--workers', dest='workers', action='store', type=int, default=4,
+                        help='Parallel uploads for --dir (optional, default=4)')
+    PARSER.add_argument('--retries', dest='retries', action='store', type=int, default=3,
+                        help='Retries per file for --dir (optional, default=3)')
+    PARSER.add_argument('--backoff', dest='backoff', action='store', type=float, default=2,
+                        help='Initial retry delay in seconds (optional, default=2)')
+    PARSER.add_argument('--timeout', dest='timeout', action='store', type=int, default=300,
+                        help='Request timeout in seconds (optional, default=300)')
+    PARSER.add_argument('--checkpoint', dest='checkpoint', action='store',
+                        default='upload_json.checkpoint',
+                        help='File of uploaded files for --dir '
+                             + '(optional, default=upload_json.checkpoint)')
     PARSER.add_argument('--verbose', action='store_true', dest='verbose',
                         default=False, help='Turn on verbose output')
     PARSER.add_argument('--debug', action='store_true', dest='debug',
@@ -115,4 +364,7 @@ if __name__ == '__main__':
     LOGGER.addHandler(HANDLER)
     DATA = call_responder('config', 'config/rest_services')
     CONFIG = DATA['config']
-    process_file(ARGS.file)
+    if ARGS.dir:
+        process_directory(ARGS.dir)
+    else:
+        process_file(ARGS.file)